@@ -0,0 +1,152 @@
+# Driver to write the search results of a frequency range (fmin, fmax), one 1Hz band per worker process
+import argparse
+import importlib
+import time
+import types
+from multiprocessing import Pool
+from tqdm import tqdm
+from . import resultManager as rm
+from ..genParam import frequencyRange as fr
+from ..utils import setup_parameter as setup
+
+def loadTarget(name):
+    # target modules live in cw_manager/target, e.g. 'CassA'
+    return importlib.import_module('cw_manager.target.{0}'.format(name))
+
+def _targetRef(target):
+    # modules cannot be pickled, so workers re-import the target by name
+    if isinstance(target, types.ModuleType):
+        return target.__name__.split('.')[-1]
+    return target
+
+def _writeBand(args):
+    target, obsDay, cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, cluster, workInLocalDir, incremental = args
+    if isinstance(target, str):
+        target = loadTarget(target)
+    t0 = time.time()
+    try:
+        outlierFilePath = rm.resultManager(target, obsDay)._writeSearchResult(
+            cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, cluster, workInLocalDir, incremental=incremental)
+    except Exception as e:
+        return freq, None, '{0}: {1}'.format(type(e).__name__, e), time.time()-t0
+    return freq, outlierFilePath, None, time.time()-t0
+
+def writeSearchResultRange(target, obsDay, cohDay, fmin, fmax, mean2F_th, numTopList=1000, stage='search', freqDerivOrder=2,
+                           cluster=False, df1dot=1.5e-9, df2dot=1e-19, workInLocalDir=False, num_cpus=1, force=False, incremental=False):
+    """
+    Writes the outlier file of every 1Hz band in [fmin, fmax) and the info summary of the range.
+
+    Parameters:
+    - target: module
+        The search target.
+
+    - obsDay: int
+        The number of observation days.
+
+    - cohDay: int
+        The number of coherent observation days for the search.
+
+    - fmin, fmax: int
+        The 1Hz bands fmin, fmin+1, ..., fmax-1 are processed.
+
+    - mean2F_th: float
+        The threshold value of the mean 2F statistic.
+
+    - numTopList: int, optional (default=1000)
+        Maximum number of top outliers to keep for each job.
+
+    - stage: str, optional (default='search')
+        The stage of the analysis.
+
+    - freqDerivOrder: int, optional (default=2)
+        The frequency derivative order used in the search.
+
+    - cluster: bool, optional (default=False)
+        If True, also write the clustered outlier file of each band.
+
+    - df1dot, df2dot: float, optional (default=1.5e-9, 1e-19)
+        The f1dot and f2dot segment widths used to split each band into jobs.
+
+    - workInLocalDir: bool, optional (default=False)
+        If True, read and write files in the local directory.
+
+    - num_cpus: int, optional (default=1)
+        Number of bands processed at the same time.
+
+    - force: bool, optional (default=False)
+        If False, bands whose outlier file is newer than all their Weave output files are skipped.
+
+    - incremental: bool, optional (default=False)
+        If True, only the new or changed Weave output files of a band are read, see bandManifest.
+
+    Returns:
+    - summaryFilePath: str
+        The info summary file of the range (see utils.getNonSaturatedBand).
+
+    - failed: dict
+        Error message of each band that could not be processed.
+    """
+    manager = rm.resultManager(target, obsDay)
+    nJobs = {freq: fr.getNJobs(freq, setup.fBand, target.tau, df1dot=df1dot, df2dot=df2dot) for freq in range(fmin, fmax)}
+
+    todo = []
+    for freq in range(fmin, fmax):
+        if not force and manager.isUpToDate(cohDay, freq, nJobs[freq], stage, freqDerivOrder, cluster, workInLocalDir):
+            continue
+        todo.append(freq)
+    print('{0} of {1} bands to process ({2} up to date)'.format(len(todo), fmax-fmin, fmax-fmin-len(todo)))
+
+    # largest bands first, so the last tasks in the pool are the short ones
+    todo.sort(key=lambda freq: -nJobs[freq])
+    targetRef = _targetRef(target)
+    args = [(targetRef, obsDay, cohDay, freq, mean2F_th, nJobs[freq], numTopList, stage, freqDerivOrder, cluster, workInLocalDir, incremental) for freq in todo]
+
+    if num_cpus is None or num_cpus <= 1 or len(args) <= 1:
+        results = [_writeBand(a) for a in tqdm(args)]
+    else:
+        with Pool(processes=num_cpus) as pool:
+            results = list(tqdm(pool.imap_unordered(_writeBand, args, chunksize=1), total=len(args)))
+
+    failed = {}
+    for freq, outlierFilePath, error, dt in sorted(results):
+        if error is not None:
+            failed[freq] = error
+            print('Failed {0} Hz: {1}'.format(freq, error))
+        else:
+            print('Finish writing search result for {0} Hz ({1:.1f}s)'.format(freq, dt))
+
+    summaryFilePath = manager.writeInfoSummary(cohDay, fmin, fmax, stage, freqDerivOrder, workInLocalDir)
+    print('Info summary written to {0}'.format(summaryFilePath))
+    return summaryFilePath, failed
+
+def main(argv=None):
+    # same arguments as condorManager.analyzeResultArgs, plus the threshold and the number of processes
+    parser = argparse.ArgumentParser(description='Write the search outliers of every 1Hz band in [fmin, fmax).')
+    parser.add_argument('--targetList', nargs='+', required=True, help='target module names in cw_manager.target')
+    parser.add_argument('--obsDay', type=int, required=True)
+    parser.add_argument('--cohDay', type=int, required=True)
+    parser.add_argument('--stage', type=str, default='search')
+    parser.add_argument('--fmin', type=int, required=True)
+    parser.add_argument('--fmax', type=int, required=True)
+    parser.add_argument('--freqDerivOrder', type=int, default=2)
+    parser.add_argument('--numTopList', type=int, default=1000)
+    parser.add_argument('--df1dot', type=float, default=1.5e-9)
+    parser.add_argument('--df2dot', type=float, default=1e-19)
+    parser.add_argument('--cluster', type=int, default=0)
+    parser.add_argument('--mean2F_th', type=float, required=True)
+    parser.add_argument('--num_cpus', type=int, default=1)
+    parser.add_argument('--workInLocalDir', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help='rewrite bands that are already up to date')
+    parser.add_argument('--incremental', action='store_true', help='only read new or changed job outputs of each band')
+    args = parser.parse_args(argv)
+
+    nFailed = 0
+    for name in args.targetList:
+        _, failed = writeSearchResultRange(loadTarget(name), args.obsDay, args.cohDay, args.fmin, args.fmax, args.mean2F_th,
+                                           args.numTopList, args.stage, args.freqDerivOrder, bool(args.cluster), args.df1dot,
+                                           args.df2dot, bool(args.workInLocalDir), args.num_cpus, args.force, args.incremental)
+        nFailed += len(failed)
+    return 1 if nFailed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+# Manifest sidecar of a band outlier file: which Weave output files were ingested, and their state at that time
+import json
+import hashlib
+import os
+from pathlib import Path
+
+def fileHash(filePath, blockSize=1<<20):
+    h = hashlib.md5()
+    with open(filePath, 'rb') as file:
+        for block in iter(lambda: file.read(blockSize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def fileStat(filePath):
+    stat = os.stat(filePath)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+class bandManifest():
+    """
+    Record of the Weave output files ingested into a band outlier file.
+
+    Each job entry keeps the mtime, size and md5 hash of the Weave file, its number of outliers, saturation
+    flag and template spacing, so an unchanged job can be reused from the existing outlier HDU without reading
+    its Weave file again. The settings (threshold, toplist limit, ...) and the state of the outlier file itself
+    are also recorded; the manifest is only valid if both still match.
+    """
+    def __init__(self, filePath, settings):
+        self.filePath = filePath
+        self.settings = settings
+        self.jobs = {}
+        self.outlierFile = None
+
+    @classmethod
+    def load(cls, filePath, settings, outlierFilePath):
+        """
+        Returns the manifest stored in filePath, or an empty manifest if it is missing, was written with other
+        settings, or does not describe the current outlier file.
+        """
+        manifest = cls(filePath, settings)
+        if not Path(filePath).exists() or not Path(outlierFilePath).exists():
+            return manifest
+        try:
+            with open(filePath) as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            return manifest
+        if content.get('settings') != settings or content.get('outlierFile') != fileStat(outlierFilePath):
+            return manifest
+        manifest.jobs = {int(k): v for k, v in content['jobs'].items()}
+        manifest.outlierFile = content['outlierFile']
+        return manifest
+
+    def isValid(self):
+        return self.outlierFile is not None
+
+    def isUnchanged(self, jobIndex, weaveFilePath):
+        # the hash is only computed when mtime or size differ (e.g. a file copied back with a new mtime)
+        entry = self.jobs.get(jobIndex)
+        if entry is None or not Path(weaveFilePath).exists():
+            return False
+        stat = fileStat(weaveFilePath)
+        if stat['mtime'] == entry['mtime'] and stat['size'] == entry['size']:
+            return True
+        if stat['size'] == entry['size'] and fileHash(weaveFilePath) == entry['hash']:
+            entry.update(stat)
+            return True
+        return False
+
+    def update(self, jobIndex, weaveFilePath, outliers, saturated, spacing):
+        entry = fileStat(weaveFilePath)
+        entry['hash'] = fileHash(weaveFilePath)
+        entry['outliers'] = int(outliers)
+        entry['saturated'] = int(saturated)
+        entry['spacing'] = {name: float(value) for name, value in spacing.items()}
+        self.jobs[int(jobIndex)] = entry
+
+    def save(self, outlierFilePath):
+        # written to a temporary file and renamed, so an interrupted run never leaves a truncated manifest
+        content = {'settings': self.settings, 'outlierFile': fileStat(outlierFilePath),
+                   'jobs': {str(k): self.jobs[k] for k in sorted(self.jobs)}}
+        tmpFilePath = str(self.filePath) + '.tmp'
+        with open(tmpFilePath, 'w') as file:
+            json.dump(content, file, indent=1)
+        os.replace(tmpFilePath, self.filePath)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Stand-in for lalpulsar_Weave to run the local follow-up/injection pipeline offline (see weaveExecutor).
+# It takes the Weave options used by pipelineTools and writes an output file with the layout read by
+# readFile.weaveFile: the template counts and PROGARG ranges in the primary header, a toplist sorted by
+# mean2F in HDU 1 and, with --injections, the injection table in HDU 2.
+#
+# Usage: point the pipeline at it with
+#   export CW_MANAGER_WEAVE=<path>/fakeWeave.py
+# Optional environment variables:
+#   FAKE_WEAVE_RUNTIME    seconds of CPU burnt by each run (default 0)
+#   FAKE_WEAVE_FAIL_RATE  probability that a run exits with status 1 without output (default 0)
+#   FAKE_WEAVE_SEED       seed of the toplist values (default: from the output file name)
+import argparse
+import os
+import sys
+import time
+import zlib
+import numpy as np
+from astropy.io import fits
+
+freqParamName = ['freq', 'f1dot', 'f2dot', 'f3dot', 'f4dot']
+
+def parseRange(value):
+    # Weave range 'start/band'
+    start, band = value.split('/')
+    return float(start), float(band)
+
+def parseInjection(value):
+    # '{Alpha=..;Delta=..;...}' as written by pipelineTools.injectionJob
+    items = value.strip().strip('{}').split(';')
+    return dict((key, float(v)) for key, v in (item.split('=') for item in items if item))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fake lalpulsar_Weave for offline tests.')
+    parser.add_argument('--output-file', required=True)
+    parser.add_argument('--toplist-limit', type=int, default=1000)
+    parser.add_argument('--alpha', type=float, default=0.0)
+    parser.add_argument('--delta', type=float, default=0.0)
+    parser.add_argument('--injections', default=None)
+    for name in freqParamName:
+        parser.add_argument('--' + name, default=None)
+    # the other Weave options (SFTs, setup file, mismatches, ...) are accepted and ignored
+    args, _ = parser.parse_known_args(argv)
+
+    runtime = float(os.environ.get('FAKE_WEAVE_RUNTIME', 0))
+    t0 = time.process_time()
+    while time.process_time() - t0 < runtime:
+        pass
+    seed = os.environ.get('FAKE_WEAVE_SEED')
+    seed = zlib.crc32(args.output_file.encode()) if seed is None else int(seed)
+    rng = np.random.default_rng(seed)
+    print('fakeWeave: {0}'.format(args.output_file), flush=True)
+    # failures are not seeded, so a retried job can succeed
+    if np.random.default_rng().uniform() < float(os.environ.get('FAKE_WEAVE_FAIL_RATE', 0)):
+        print('fakeWeave: simulated failure', file=sys.stderr)
+        return 1
+
+    ranges = [(name, parseRange(getattr(args, name))) for name in freqParamName if getattr(args, name) is not None]
+    n = max(1, args.toplist_limit)
+    header = fits.Header()
+    # 10 templates per dimension; as in Weave, NU<k>DOT counts the templates of f1dot..fkdot and NU0DOT all of them
+    for i, (name, (start, band)) in enumerate(ranges):
+        header['HIERARCH NSEMITMPL NU{0}DOT'.format(i)] = 10**(len(ranges) if i == 0 else i)
+        header['HIERARCH PROGARG {0}'.format(name.upper())] = '{0!r},{1!r}'.format(start, start+band)
+
+    columns = [fits.Column(name='alpha', format='D', array=args.alpha*np.ones(n)),
+               fits.Column(name='delta', format='D', array=args.delta*np.ones(n))]
+    for name, (start, band) in ranges:
+        columns.append(fits.Column(name=name, format='D', array=rng.uniform(start, start+band, n)))
+    # mean 2F of noise, with the loudest template of an injection run much higher
+    mean2F = np.sort(4 + rng.exponential(1.0, n))[::-1]
+    if args.injections is not None:
+        mean2F[0] += 50
+    columns.append(fits.Column(name='mean2F', format='D', array=mean2F))
+    hdus = [fits.PrimaryHDU(header=header), fits.BinTableHDU.from_columns(columns, name='mean2F_toplist')]
+    if args.injections is not None:
+        inj = parseInjection(args.injections)
+        inj['refTime_s'] = inj.pop('refTime')
+        hdus.append(fits.BinTableHDU.from_columns([fits.Column(name=k, format='D', array=[v]) for k, v in inj.items()], name='injections'))
+
+    # written under a temporary name, so an interrupted run leaves no partial output file
+    tmpFile = args.output_file + '.tmp'
+    fits.HDUList(hdus).writeto(tmpFile, overwrite=True)
+    os.replace(tmpFile, args.output_file)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,94 +3,64 @@ import numpy as np
 from ..utils import filePath as fp
 from ..utils import setup_parameter as setup
 from ..utils import utils as utils
+from ..utils import clusterEngine as ce
 from pathlib import Path
-import warnings
-import subprocess
-import time
-from multiprocessing import Pool, cpu_count    
 from itertools import islice
+from . import weaveExecutor as we
+from . import resultCleaner as rc
+from . import runJournal as rj
 
 
-def delete_files(resultFileList):
-    # delete files to release disk storage
-    for f in resultFileList:
-        command = 'rm {}'.format(f)
-        _ = subprocess.run(command, shell=True, capture_output=True, text=True)
-    print('Deleted {} weave result files to release disk storage.\n'.format(len(resultFileList)))
- 
+def delete_files(resultFileList, keepFirst=0):
+    # delete files to release disk storage (in-process, see resultCleaner)
+    with rc.resultCleaner(keepFirst=keepFirst) as cleaner:
+        cleaner.submit(resultFileList)
 
-# Function to process each search job in parallel
-def searchJob(params, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay):
-    
-    # Weave main program path
-    weave_exe = fp.weaveExecutableFilePath()
-    
-    resultFile, param = params
-    utils.makeDir([resultFile])
-    print(resultFile)
-    if Path(resultFile).exists():
-        print('Exists:{}'.format(resultFile))
-        return resultFile
-    
-    command = '{} --output-file={} --sft-files=\"{}\" --setup-file={} --semi-max-mismatch={} --coh-max-mismatch={} --toplist-limit={} --extra-statistics={} --alpha={} --delta={}'.format(
-        weave_exe, resultFile, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec)
-    if nc == obsDay:
-        command = '{} --output-file={} --sft-files=\"{}\" --setup-file={} --semi-max-mismatch={} --toplist-limit={} --extra-statistics={} --alpha={} --delta={}'.format(
-            weave_exe, resultFile, sftFiles, metric, semiMM, numTopList, extraStats, ra, dec)
+
+def journalOf(target, freq, taskName, stage, workInLocalDir):
+    # journal of the local Weave jobs of a task, next to their result files
+    journalFilePath = fp.runJournalFilePath(target, freq, taskName, stage)
+    if workInLocalDir:
+        journalFilePath = Path(journalFilePath).name
+    return rj.runJournal(journalFilePath)
+
+def weaveArgv(resultFile, param, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay):
+    # Weave command of one job as an argv list (no shell, so no quoting of the SFT list or injections)
+    if not isinstance(sftFiles, str):
+        sftFiles = ';'.join(sftFiles)
+    argv = [fp.localWeaveExecutableFilePath(), '--output-file={}'.format(resultFile), '--sft-files={}'.format(sftFiles),
+            '--setup-file={}'.format(metric), '--semi-max-mismatch={}'.format(semiMM)]
+    if nc != obsDay:
+        argv.append('--coh-max-mismatch={}'.format(cohMM))
+    argv += ['--toplist-limit={}'.format(numTopList), '--extra-statistics={}'.format(extraStats),
+             '--alpha={}'.format(ra), '--delta={}'.format(dec)]
 
     newFreqParamName, newFreqDerivParamName = utils.phaseParamName(nf)
     for _f, _df in zip(newFreqParamName, newFreqDerivParamName):
-        command += ' --{}={}/{}'.format(_f, param[_f], param[_df])
-
-    # Run the command
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        argv.append('--{}={}/{}'.format(_f, param[_f], param[_df]))
+    return argv
 
-    # Print the standard output and errors for debugging
-    #print(result.stdout)
-    #print(result.stderr)
-    return resultFile
+# Weave job of a search (follow-up) row, to be run by weaveExecutor
+def searchJob(params, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay):
+    resultFile, param = params
+    utils.makeDir([resultFile])
+    argv = weaveArgv(resultFile, param, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay)
+    return we.weaveJob(resultFile, argv)
 
 
-# Function to process each injection job in parallel
+# Weave job of an injection, to be run by weaveExecutor
 def injectionJob(params, inj, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay):
-
-    # Weave main program path
-    weave_exe = fp.weaveExecutableFilePath()
-    
     resultFile, param = params
     utils.makeDir([resultFile])
-    #print(resultFile)
-    if Path(resultFile).exists():
-        print('Exists:{}'.format(resultFile))
-        return resultFile
-    
-    command = '{} --output-file={} --sft-files=\"{}\" --setup-file={} --semi-max-mismatch={} --coh-max-mismatch={} --toplist-limit={} --extra-statistics={} --alpha={} --delta={}'.format(
-        weave_exe, resultFile, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec)
-    if nc == obsDay:
-        command = '{} --output-file={} --sft-files=\"{}\" --setup-file={} --semi-max-mismatch={} --toplist-limit={} --extra-statistics={} --alpha={} --delta={}'.format(
-            weave_exe, resultFile, sftFiles, metric, semiMM, numTopList, extraStats, ra, dec)
-
-    newFreqParamName, newFreqDerivParamName = utils.phaseParamName(nf)
-    for _f, _df in zip(newFreqParamName, newFreqDerivParamName):
-        command += ' --{}={}/{}'.format(_f, param[_f], param[_df])
-           
-    injection_command = ' --injections=\"{{Alpha={};Delta={};refTime={};aPlus={};aCross={};psi={};Freq={};f1dot={};f2dot={};f3dot={};f4dot={}}}\"'.format(
+    argv = weaveArgv(resultFile, param, sftFiles, metric, semiMM, cohMM, numTopList, extraStats, ra, dec, nc, nf, obsDay)
+    argv.append('--injections={{Alpha={};Delta={};refTime={};aPlus={};aCross={};psi={};Freq={};f1dot={};f2dot={};f3dot={};f4dot={}}}'.format(
     inj['Alpha'], inj['Delta'], inj['refTime'], 
     inj['aPlus'], inj['aCross'], inj['psi'], 
     inj['Freq'], inj['f1dot'], inj['f2dot'], 
-    inj['f3dot'], inj['f4dot'])
-    
-    command += injection_command
-    print(command)
-    # Run the command
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    inj['f3dot'], inj['f4dot']))
+    return we.weaveJob(resultFile, argv)
 
-    # Print the standard output and errors for debugging
-    print(result.stdout)
-    print(result.stderr)
-    return resultFile
-
-def determineEfficiency(sftFiles, setup, cohDay, obsDay, sp, inj_params, rm, target, taskName, freq, nInj, freqDerivOrder, stage, numTopList, extraStats, num_cpus, cluster, workInLocalDir, saveIntermediate=False, skyUncertainty=1e-5):
+def determineEfficiency(sftFiles, setup, cohDay, obsDay, sp, inj_params, rm, target, taskName, freq, nInj, freqDerivOrder, stage, numTopList, extraStats, num_cpus, cluster, workInLocalDir, saveIntermediate=False, skyUncertainty=1e-5, retries=1, keepFirst=0):
     
     #sp, ip = im._genParam(h0=h0est, freq=freq, nInj=nInj, injFreqDerivOrder=4, freqDerivOrder=freqDerivOrder, skyUncertainty=skyUncertainty, workInLocalDir=workInLocalDir, cluster=cluster)
 
@@ -108,25 +78,32 @@ def determineEfficiency(sftFiles, setup, cohDay, obsDay, sp, inj_params, rm, tar
     if workInLocalDir:  
         metric = Path(metric).name
 
-    with Pool(processes=num_cpus) as pool:
-        results = pool.starmap(injectionJob, [(params, inj, sftFiles, metric, setup.semiMM, setup.cohMM, numTopList, extraStats, target.alpha, target.delta, cohDay, freqDerivOrder, obsDay) for params, inj in zip(search_params, inj_params)])
+    jobs = [injectionJob(params, inj, sftFiles, metric, setup.semiMM, setup.cohMM, numTopList, extraStats, target.alpha, target.delta, cohDay, freqDerivOrder, obsDay) for params, inj in zip(search_params, inj_params)]
     # Collect the results
-    injResultFileList.extend(results)
+    injResultFileList.extend([job.resultFile for job in jobs])
 
-    taskName = utils.taskName(rm.target, 'search', cohDay, freqDerivOrder, int(freq))
-    outlierFilePath = fp.outlierFilePath(rm.target, int(freq), taskName, 'search', cluster=cluster)
+    searchTaskName = utils.taskName(rm.target, 'search', cohDay, freqDerivOrder, int(freq))
+    outlierFilePath = fp.outlierFilePath(rm.target, int(freq), searchTaskName, 'search', cluster=cluster)
     if workInLocalDir:
         outlierFilePath = Path(outlierFilePath).name
     mean2F_th = fits.getheader(outlierFilePath)['HIERARCH mean2F_th']
-    
-    outlierFilePath = rm.writeInjectionResult1Hz(mean2F_th, nInj, cohDay, freq, numTopList=numTopList, stage=stage, freqDerivOrder=freqDerivOrder, cluster=cluster, workInLocalDir=workInLocalDir)
 
-    if not saveIntermediate:
-        # delete files to release disk storage
-        for _f in injResultFileList:
-            command = 'rm {}'.format(_f)
-            _ = subprocess.run(command, shell=True, capture_output=True, text=True)
-        print('Deleted weave result files to release disk storage.\n')
+    def analyzeResult(batchIndex, start, jobs):
+        return rm.writeInjectionResult1Hz(mean2F_th, nInj, cohDay, freq, numTopList=numTopList, stage=stage, freqDerivOrder=freqDerivOrder, cluster=cluster, workInLocalDir=workInLocalDir)
+
+    def releaseResult(jobs):
+        if not saveIntermediate:
+            # delete files to release disk storage
+            cleaner.submit([job.resultFile for job in jobs])
+
+    # the results are analyzed all together, once; the journal lets an interrupted run resume without redoing
+    # the finished jobs, or anything once the analysis is recorded. The injections (h0, ...) are in the job
+    # arguments and the threshold in the settings, so a call with other values is a new run.
+    settings = rj.digest(mean2F_th, nInj, numTopList, stage, freqDerivOrder, cluster)
+    journal = journalOf(target, freq, taskName, stage, workInLocalDir)
+    with journal, rc.resultCleaner(keepFirst=keepFirst, journal=journal) as cleaner:
+        outlierFilePath, = we.weaveExecutor(num_cpus, retries=retries, journal=journal).runBatches(jobs, analyzeResult, batchSize=len(jobs), release=releaseResult, settings=settings)
+    journal.roll()
 
     nout = fits.getdata(outlierFilePath,1).size
     p = nout / nInj
@@ -136,7 +113,7 @@ def determineEfficiency(sftFiles, setup, cohDay, obsDay, sp, inj_params, rm, tar
 def injectionFollowUp(fm, rm, target, obsDay, freq, sftFiles, 
                       old_cohDay, old_freqDerivOrder, old_stage, new_cohDay, 
                       new_freqDerivOrder, new_stage, nInj, numTopList, extraStats, num_cpus, setup, 
-                      cluster, workInLocalDir, saveIntermediate=False):
+                      cluster, workInLocalDir, saveIntermediate=False, retries=1):
     print('Doing injection follow-up...')    
     
     sp, ip = fm.genFollowUpParamFromInjection1Hz(old_cohDay, freq, stage=old_stage, oldFreqDerivOrder=old_freqDerivOrder, newFreqDerivOrder=new_freqDerivOrder, cluster=cluster, workInLocalDir=workInLocalDir)
@@ -164,28 +141,35 @@ def injectionFollowUp(fm, rm, target, obsDay, freq, sftFiles,
 
     print("Generated params, running Weave...")
 
-    # Use multiprocessing to process the jobs in parallel
-    with Pool(processes=num_cpus) as pool:
-        results = pool.starmap(injectionJob, [(params, inj, sftFiles, metric, setup.semiMM, setup.cohMM, 1000, extraStats, target.alpha, target.delta, new_cohDay, new_freqDerivOrder, obsDay) for params, inj in zip(search_params, inj_params)])
+    # Run the jobs on num_cpus cores
+    jobs = [injectionJob(params, inj, sftFiles, metric, setup.semiMM, setup.cohMM, 1000, extraStats, target.alpha, target.delta, new_cohDay, new_freqDerivOrder, obsDay) for params, inj in zip(search_params, inj_params)]
      
     # Collect the results
-    injResultFileList.extend(results)
+    injResultFileList.extend([job.resultFile for job in jobs])
 
-    print('Analyzing injection result.')
-    # analyze the result
-    
     # Get old mean2F for the follow-up outlier seleciton
-    taskName = utils.taskName(rm.target, old_stage, old_cohDay, old_freqDerivOrder, freq)
-    outlierFilePath = fp.outlierFilePath(rm.target, freq, taskName, old_stage, cluster=cluster)
+    oldTaskName = utils.taskName(rm.target, old_stage, old_cohDay, old_freqDerivOrder, freq)
+    outlierFilePath = fp.outlierFilePath(rm.target, freq, oldTaskName, old_stage, cluster=cluster)
     if workInLocalDir:
         outlierFilePath = Path(outlierFilePath).name
         
     data = fits.getdata(outlierFilePath, 1) 
     old_mean2F = data['mean2F']
     ratio = 0
-    outlierFilePath = rm.writeFollowUpResult(old_mean2F, new_cohDay, freq, numTopList=numTopList, 
-                                             new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, 
-                                             ratio=ratio, workInLocalDir=workInLocalDir, inj=True, cluster=cluster)
+
+    def analyzeResult(batchIndex, start, jobs):
+        print('Analyzing injection result.')
+        # analyze the result
+        return rm.writeFollowUpResult(new_cohDay, freq, old_mean2F, numTopList=numTopList, 
+                                      new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, 
+                                      ratio=ratio, workInLocalDir=workInLocalDir, inj=True, cluster=cluster)
+
+    # the results are analyzed all together, once (see determineEfficiency)
+    settings = rj.digest(np.asarray(old_mean2F), ratio, numTopList, cluster)
+    journal = journalOf(target, freq, taskName, new_stage, workInLocalDir)
+    with journal:
+        outlierFilePath, = we.weaveExecutor(num_cpus, retries=retries, journal=journal).runBatches(jobs, analyzeResult, batchSize=len(jobs), settings=settings)
+    journal.roll()
     
     return outlierFilePath, injResultFileList
 
@@ -203,7 +187,7 @@ def realFollowUp(rm, sp, target, obsDay, freq, sftFiles,
                  old_mean2F, mean2F_ratio, 
                  new_cohDay, new_freqDerivOrder, new_stage, 
                  numTopList, extraStats, num_cpus, setup, 
-                 cluster, workInLocalDir, saveIntermediate=False):
+                 cluster, workInLocalDir, saveIntermediate=False, retries=1, diskBudget=None, chunk_size=None, keepFirst=0):
     print('Doing real follow-up...')
      
     #searchResultFileList = []
@@ -219,44 +203,70 @@ def realFollowUp(rm, sp, target, obsDay, freq, sftFiles,
     else:
         search_params = [(fp.weaveOutputFilePath(target, freq, taskName, jobIndex, new_stage), params) for jobIndex, params in enumerate(sp[str(freq)].data, 1)]
        
-    # divide it into chunks to not to overload the disk storage
-    chunk_size = 100  # Define chunk size
-    # Calculate the number of chunks before the for loop
+    # the jobs are analyzed and deleted in chunks while the next jobs run; unless chunk_size is given, a chunk holds
+    # at most 4*num_cpus jobs and less when the disk budget (bytes, half the free space by default) is reached
+    # first, see weaveExecutor.runBatches
     totalJobCounts = len(search_params)
-    chunk_count = int(np.ceil(totalJobCounts / chunk_size))
 
     print("Generated params, running Weave...")
-    # Use multiprocessing to process each chunk of jobs in parallel
-    with Pool(processes=num_cpus) as pool:
-        for chunk_index, chunk in enumerate(chunked_iterable(search_params, chunk_size)):
-            print(f"Processing chunk {chunk_index+1} out of {chunk_count}...")
-            results = pool.starmap(searchJob, [
-                (params, sftFiles, metric, setup.semiMM, setup.cohMM, 1000, extraStats, 
-                 target.alpha, target.delta, new_cohDay, new_freqDerivOrder, obsDay)
-                for params in chunk
-            ])
-            
-            if chunk_count != 1:
-                # Analyze the results immediately after each chunk
-                outlierFilePath = rm.writeFollowUpResult(
-                    old_mean2F, new_cohDay, freq, numTopList=numTopList, 
-                    new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, ratio=mean2F_ratio, 
-                    workInLocalDir=workInLocalDir, inj=False, cluster=cluster,
-                    chunk_count=chunk_count, chunk_index=chunk_index, chunk_size=chunk_size
-                )
-            else:
-                # Analyze the results for the only chunk
-                outlierFilePath = rm.writeFollowUpResult(
-                    old_mean2F, new_cohDay, freq, numTopList=numTopList, 
-                    new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, ratio=mean2F_ratio, 
-                    workInLocalDir=workInLocalDir, inj=False, cluster=cluster
-                )
-   
-            # Delete the files to free up disk storage
-            if not saveIntermediate:
-                delete_files(results)
-        if chunk_count != 1:
-            outlierFilePath = rm.ensembleOutlierChunk(totalJobCounts, chunk_size, chunk_count, new_cohDay, freq, new_stage, new_freqDerivOrder, cluster, workInLocalDir)
+    # The outliers of every chunk are clustered together at the end, so a cluster straddling two chunks is kept once
+    clusterer = None
+    if cluster:
+        fn, dfn = utils.phaseParamName(new_freqDerivOrder)
+        clusterer = ce.streamingClusterer(fn, dfn, setup.cluster_nSpacing)
+
+    jobs = [searchJob(params, sftFiles, metric, setup.semiMM, setup.cohMM, 1000, extraStats, 
+                      target.alpha, target.delta, new_cohDay, new_freqDerivOrder, obsDay) for params in search_params]
+
+    # The journal records the jobs and the analyzed chunks, so an interrupted run goes on after the last chunk
+    # analyzed with the same thresholds; the state of the clusterer is saved with every chunk for the same purpose
+    journal = journalOf(target, freq, taskName, new_stage, workInLocalDir)
+    executor = we.weaveExecutor(num_cpus, retries=retries, journal=journal)
+    settings = rj.digest(np.asarray(old_mean2F), mean2F_ratio, numTopList, cluster)
+    def clustererStatePath(chunk_index):
+        return journal.filePath.replace('_journal.jsonl', '_clusterer_chunk{}.npy'.format(chunk_index))
+    resumedChunks = len(executor.resumedBatches(jobs, settings))
+    if clusterer is not None and resumedChunks > 0:
+        clusterer.load([clustererStatePath(chunk_index) for chunk_index in range(resumedChunks)])
+
+    def analyzeChunk(chunk_index, start, jobs):
+        # runs in the analysis worker while the cores go on with the next jobs
+        print(f"Analyzing chunk {chunk_index+1} (jobs {start+1}-{start+len(jobs)} out of {totalJobCounts})...")
+        if len(jobs) != totalJobCounts:
+            # Analyze the results immediately after each chunk
+            outlierFilePath = rm.writeFollowUpResult(
+                new_cohDay, freq, old_mean2F, numTopList=numTopList, 
+                new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, ratio=mean2F_ratio, 
+                workInLocalDir=workInLocalDir, inj=False, cluster=cluster,
+                chunk_index=chunk_index, chunk_size=len(jobs), chunk_start=start, clusterer=clusterer
+            )
+        else:
+            # Analyze the results for the only chunk
+            outlierFilePath = rm.writeFollowUpResult(
+                new_cohDay, freq, old_mean2F, numTopList=numTopList, 
+                new_stage=new_stage, new_freqDerivOrder=new_freqDerivOrder, ratio=mean2F_ratio, 
+                workInLocalDir=workInLocalDir, inj=False, cluster=cluster
+            )
+        if clusterer is not None:
+            clusterer.save(clustererStatePath(chunk_index))
+        return outlierFilePath
+
+    def releaseChunk(jobs):
+        # Delete the files to free up disk storage, in the background while the next chunk is analyzed
+        if not saveIntermediate:
+            cleaner.submit([job.resultFile for job in jobs])
+
+    # Run the jobs on num_cpus cores, each chunk being analyzed while the next jobs run
+    with journal, rc.resultCleaner(keepFirst=keepFirst, journal=journal) as cleaner:
+        results = executor.runBatches(jobs, analyzeChunk, diskBudget=diskBudget, batchSize=chunk_size, release=releaseChunk, settings=settings)
+    outlierFilePath = results[-1]
+    chunk_count = len(results)
+    if chunk_count != 1:
+        outlierFilePath = rm.ensembleOutlierChunk(totalJobCounts, chunk_size, chunk_count, new_cohDay, freq, new_stage, new_freqDerivOrder, cluster, workInLocalDir, clusterer=clusterer)
+    # the run is complete: the next call of the task starts anew
+    journal.roll()
+    for filePath in Path(journal.filePath).resolve().parent.glob(Path(clustererStatePath('*')).name):
+        filePath.unlink()
     return outlierFilePath
 
 def determineMean2FRatio(percentile, target, freq, 
@@ -1,4 +1,6 @@
 import re
+from astropy.io import fits
+from ..utils import utils as utils
 
 match_number = re.compile('-?\ *[0-9]+\.?[0-9]*(?:[Ee]\ *-?\ *[0-9]+)?')
 
@@ -77,3 +79,51 @@ def isMismatchExist(filePath):
     
 
 
+
+# Reader for a Weave output file: the file is opened once and the toplist, the injection table
+# and the template spacing are all served from the same handle.
+class weaveFile():
+    def __init__(self, filePath, freqDerivOrder=2, memmap=False):
+        """
+        Parameters:
+        - filePath: str
+            Path to the Weave output file.
+
+        - freqDerivOrder: int, optional (default=2)
+            The frequency derivative order used to parse the template spacing.
+
+        - memmap: bool, optional (default=False)
+            If True, the tables are memory-mapped, so slicing the toplist only reads the needed rows.
+        """
+        self.filePath = filePath
+        self.freqDerivOrder = freqDerivOrder
+        self.hdul = fits.open(filePath, memmap=memmap)
+        self._spacing = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.hdul.close()
+
+    @property
+    def header(self):
+        return self.hdul[0].header
+
+    @property
+    def spacing(self):
+        # parsed once from the primary header
+        if self._spacing is None:
+            self._spacing = utils.spacingFromHeader(self.header, self.freqDerivOrder)
+        return self._spacing
+
+    @property
+    def toplist(self):
+        return self.hdul[1].data
+
+    @property
+    def injection(self):
+        return self.hdul[2].data
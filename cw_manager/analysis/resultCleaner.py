@@ -0,0 +1,115 @@
+# Deletion of the Weave result files once they are analyzed (see pipelineTools). The files are unlinked in-process
+# by a small thread pool, instead of one rm shell per file, so a chunk can be deleted while the next jobs and the
+# analysis go on. The bytes reclaimed are reported, and the first files can be kept for debugging.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+def unlinkFile(filePath):
+    """
+    Deletes a file and returns the bytes reclaimed, None if it does not exist (e.g. a failed job).
+    """
+    try:
+        size = os.stat(filePath).st_size
+        os.unlink(filePath)
+    except FileNotFoundError:
+        return None
+    return size
+
+class resultCleaner():
+    """
+    Deletes files in a thread pool (os.unlink releases the GIL and mostly waits on the file system).
+    submit returns at once so the deletion runs alongside the computation; wait/close block until it is done.
+    """
+    def __init__(self, num_threads=4, keepFirst=0, journal=None):
+        """
+        Parameters:
+        - num_threads: int, optional (default=4)
+            Number of files deleted at the same time.
+
+        - keepFirst: int, optional (default=0)
+            Number of files kept for debugging: the first keepFirst files submitted to this cleaner are not deleted.
+
+        - journal: runJournal.runJournal, optional (default=None)
+            If given, every deleted file is recorded in it as a deleted job.
+        """
+        self.pool = ThreadPoolExecutor(max_workers=max(1, int(num_threads)))
+        self.keepFirst = keepFirst
+        self.journal = journal
+        self.kept = []
+        self.futures = []
+        self.nDeleted = 0
+        self.bytesReclaimed = 0
+        self.errors = []
+
+    def submit(self, fileList):
+        """
+        Queues the deletion of the files, except those kept by the retention policy, and returns immediately.
+
+        Parameters:
+        - fileList: list of str
+        """
+        for f in fileList:
+            if len(self.kept) < self.keepFirst:
+                self.kept.append(str(f))
+            else:
+                self.futures.append(self.pool.submit(self.unlink, f))
+
+    def unlink(self, filePath):
+        size = unlinkFile(filePath)
+        if size is not None and self.journal is not None:
+            self.journal.record(filePath, 'deleted', size=size)
+        return size
+
+    def wait(self):
+        """
+        Waits for the submitted deletions and returns the number of files deleted and the bytes reclaimed by them.
+        """
+        nDeleted, bytesReclaimed = 0, 0
+        futures, self.futures = self.futures, []
+        for future in futures:
+            try:
+                size = future.result()
+            except OSError as e:
+                self.errors.append(e)
+                print('Could not delete {0}: {1}'.format(e.filename, e.strerror))
+                continue
+            if size is None:
+                continue
+            nDeleted += 1
+            bytesReclaimed += size
+        self.nDeleted += nDeleted
+        self.bytesReclaimed += bytesReclaimed
+        return nDeleted, bytesReclaimed
+
+    def delete(self, fileList):
+        """
+        Deletes the files and waits for it.
+
+        Returns:
+        - nDeleted: int
+
+        - bytesReclaimed: int
+        """
+        self.submit(fileList)
+        nDeleted, bytesReclaimed = self.wait()
+        report(nDeleted, bytesReclaimed, len(self.kept))
+        return nDeleted, bytesReclaimed
+
+    def close(self):
+        # waits for the last deletions, reports the totals and stops the threads
+        self.wait()
+        self.pool.shutdown()
+        report(self.nDeleted, self.bytesReclaimed, len(self.kept))
+        return self.nDeleted, self.bytesReclaimed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def report(nDeleted, bytesReclaimed, nKept=0):
+    print('Deleted {0} weave result files ({1:.2f} MB) to release disk storage.'.format(nDeleted, bytesReclaimed/1024**2))
+    if nKept:
+        print('Kept the first {0} weave result files for debugging.'.format(nKept))
+    print('')
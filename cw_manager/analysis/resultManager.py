@@ -1,5 +1,7 @@
 from . import readFile as rf
 from . import tools as tools
+from . import weaveIngest as wi
+from . import bandManifest as bm
 from astropy.io import fits
 from astropy.table import Table, vstack
 import numpy as np
@@ -84,21 +86,7 @@ class resultManager():
             Specifies the frequency derivative order, which determines the parameters for spacing and phase calculations used in the output table.
         """
         
-        # Read and limit the data to the top entries
-        data = data[:toplistLimit]
-        # Mask data with mean 2F values greater than the threshold
-        mask = data['mean2F'] > mean2F_th
-        data = Table(data[mask])       
-        data.add_column(mean2F_th*np.ones(len(data)), name='mean2F threshold')
-    
-        # Get frequency spacing based on the frequency derivative order   
-        #spacing = utils.getSpacing(dataFilePath, freqDerivOrder)
-        _, name = utils.phaseParamName(freqDerivOrder)
-        #print(spacing) 
-        # Add spacing parameters as columns in the table
-        for i in range(len(name)):
-            data.add_column(spacing[name[i]]*np.ones(len(data)), name=name[i]) 
-        return data
+        return wi.outlierTable(data, spacing, mean2F_th, toplistLimit, freqDerivOrder)
 
     # Generates a table of injection data from a FITS file and matches it with search results
     def makeInjectionTable(self, injParam, searchParam, freqDerivOrder):   
@@ -114,27 +102,20 @@ class resultManager():
             The order of frequency derivative to consider (e.g., 1 for first derivative, 2 for second derivative).
             This parameter is used to determine which frequency derivative columns (like df1, df2) are extracted and matched to the injection data.
         """
-        injParam = Table(injParam)   
-        
-        # Calculate h0 from aPlus and aCross, adding it as a new column
-        aplus, across = injParam['aPlus'], injParam['aCross']
-        h0 = 0.5*(2.*aplus+2.*np.sqrt(aplus**2-across**2) )
-        injParam.add_column(h0*np.ones(len(injParam)), name='h0')
-        
-        # Rename the reference time column for consistency
-        injParam.rename_column('refTime_s', 'refTime')   
-        
-        # Get names for the frequency derivative parameters based on the order
-        fn, dfn = utils.phaseParamName(freqDerivOrder)
-          
-        # Mask for identifying injections that match within a specific frequency range
-        mask = np.full(searchParam['freq'].shape, True)
-        searchParam = Table(searchParam[mask])[:1] # only follow up the loudest one which covering the injection to save the cost 
-
-        return searchParam, injParam
+        return wi.injectionTable(injParam, searchParam)
     
+    # List of Weave output files for the given jobs in a 1Hz band
+    def _weaveFilePathList(self, freq, taskName, jobIndexList, stage, workInLocalDir=False):
+        weaveFilePathList = []
+        for jobIndex in jobIndexList:
+            weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, jobIndex, stage)
+            if workInLocalDir:
+                weaveFilePath = Path(weaveFilePath).name
+            weaveFilePathList.append(weaveFilePath)
+        return weaveFilePathList
+
     # Write results from each 1Hz frequency band of the search stage output
-    def _writeSearchResult(self, cohDay, freq, mean2F_th, nJobs, numTopListLimit=1000, stage='search', freqDerivOrder=2, cluster=False, workInLocalDir=False):
+    def _writeSearchResult(self, cohDay, freq, mean2F_th, nJobs, numTopListLimit=1000, stage='search', freqDerivOrder=2, cluster=False, workInLocalDir=False, num_cpus=1, incremental=False):
         """
         Parameters:
         - cohDay: int
@@ -163,32 +144,65 @@ class resultManager():
 
         - workInLocalDir: bool, optional (default=False)
             If True, writes output to the local directory rather than the default path. This may be used for testing or troubleshooting.
-        """      
-        
+
+        - num_cpus: int, optional (default=1)
+            Number of worker processes used to read the Weave output files. The output does not depend on it.
+
+        - incremental: bool, optional (default=False)
+            If True, jobs whose Weave output file is unchanged since the last run (see the manifest sidecar
+            written next to the outlier file) are taken from the existing outlier file instead of being read again.
+        """
+
         # Generate the task name for organizing results
         taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
-         
-        # Initialize lists to collect outlier tables and data on job completion status
-        outlierTableList = []
-        info_data = np.recarray((nJobs,), dtype=[(key, '>f8') for key in ['freq', 'jobIndex', 'outliers', 'saturated']]) 
-
-        # Loop over each job to process results
-        for i, jobIndex in enumerate(tqdm(range(1, nJobs+1))):
-            # Generate file path for each job's result, adjusting if working in local directory
-            weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, jobIndex, stage)
-            if workInLocalDir:
-                weaveFilePath = Path(weaveFilePath).name
-                
-            weave_data = fits.getdata(weaveFilePath, 1)
-            spacing = utils.getSpacing(weaveFilePath, freqDerivOrder)
-            # Generate outlier table for the job and assess if it reached the limit
-            _outlier = self.makeOutlierTable(weave_data, spacing, mean2F_th, numTopListLimit, freqDerivOrder)  
+        outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=False)
+        manifestFilePath = fp.outlierManifestFilePath(self.target, freq, taskName, stage)
+        if workInLocalDir:
+            outlierFilePath = Path(outlierFilePath).name
+            manifestFilePath = Path(manifestFilePath).name
+
+        # Initialize the outlier accumulator and data on job completion status
+        outliers = wi.outlierAccumulator(freqDerivOrder)
+        info_data = np.recarray((nJobs,), dtype=[(key, '>f8') for key in ['freq', 'jobIndex', 'outliers', 'saturated']])
+
+        # Jobs unchanged since the last run are reused from the existing outlier file; the manifest (and the hash
+        # of every Weave file it needs) is only built in incremental mode
+        weaveFilePathList = self._weaveFilePathList(freq, taskName, range(1, nJobs+1), stage, workInLocalDir)
+        manifest = None
+        reuse = [False] * nJobs
+        if incremental:
+            settings = {'mean2F_th': float(mean2F_th), 'numTopListLimit': int(numTopListLimit), 'freqDerivOrder': int(freqDerivOrder), 'nJobs': int(nJobs)}
+            manifest = bm.bandManifest.load(manifestFilePath, settings, outlierFilePath)
+            reuse = [manifest.isValid() and manifest.isUnchanged(jobIndex, f) for jobIndex, f in zip(range(1, nJobs+1), weaveFilePathList)]
+        if any(reuse):
+            print('Reusing {0} of {1} jobs from {2}'.format(sum(reuse), nJobs, outlierFilePath))
+            oldOutlier = fits.getdata(outlierFilePath, 1)
+            oldOutlier = np.zeros(0) if oldOutlier is None else np.array(oldOutlier).view(np.ndarray)
+            # rows of the old outlier HDU are in job order, manifest counts give the offset of each job
+            offset = np.cumsum([0] + [manifest.jobs[jobIndex]['outliers'] for jobIndex in range(1, nJobs+1)])
+            _, spacingName = utils.phaseParamName(freqDerivOrder)
+            toplistName = [name for name in (oldOutlier.dtype.names or []) if name not in ['mean2F threshold'] + spacingName]
+
+        # Read the result of every new or changed job (in parallel if num_cpus > 1) and apply the threshold
+        changed = [i for i in range(nJobs) if not reuse[i]]
+        results = dict(zip(changed, wi.ingestJobs([weaveFilePathList[i] for i in changed], mean2F_th, numTopListLimit, freqDerivOrder, num_cpus=num_cpus)))
+        for i in range(nJobs):
+            jobIndex = i+1
+            if reuse[i]:
+                entry = manifest.jobs[jobIndex]
+                _outlier = oldOutlier[offset[i]:offset[i+1]][toplistName] if toplistName else None
+                spacing, saturated = entry['spacing'], bool(entry['saturated'])
+            else:
+                _outlier, spacing, saturated, _ = results[i]
+                if manifest is not None:
+                    manifest.update(jobIndex, weaveFilePathList[i], 0 if saturated else len(_outlier), saturated, spacing)
 
-            if len(_outlier) == numTopListLimit:
+            if saturated:
                 info_data[i] = freq, jobIndex, 0, 1  # Job saturated if top limit is reached
             else:
-                info_data[i] = freq, jobIndex, len(_outlier), 0
-                outlierTableList.append( _outlier )
+                info_data[i] = freq, jobIndex, entry['outliers'] if reuse[i] else len(_outlier), 0
+                if _outlier is not None:
+                    outliers.append(_outlier, mean2F_th, spacing)
         
         # Calculate bands that aren't saturated 
         sat = info_data['saturated'].reshape(10, int(nJobs/10)).sum(axis=1)
@@ -205,17 +219,16 @@ class resultManager():
             primary_hdu.header['HIERARCH {}'.format(name)] = value
         
         # Create table HDUs for outliers, job information, and non-saturated bands
-        outlier_hdu =  fits.BinTableHDU(data=vstack(outlierTableList), name=stage+'_outlier')
+        outlier_hdu =  outliers.toHDU(stage+'_outlier')
         info_hdu =  fits.BinTableHDU(data=info_data, name='info') 
         nsb_hdu =  fits.BinTableHDU(data=nonSatBand, name='nonSatBand')
 
         # Compile all HDUs into a FITS HDU list and write to a specified file path
         outlier_hdul = fits.HDUList([primary_hdu, outlier_hdu, info_hdu, nsb_hdu])
-        outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=False)
-        if workInLocalDir:
-            outlierFilePath = Path(outlierFilePath).name
         utils.makeDir([outlierFilePath])
         outlier_hdul.writeto(outlierFilePath, overwrite=True)  
+        if manifest is not None:
+            manifest.save(outlierFilePath)
        
         # Perform clustering if requested and save results in another FITS file
         if cluster:
@@ -257,28 +270,8 @@ class resultManager():
             return outlierFilePath 
       
     
-# # Set up time and frequency parameters for the search based on target and observation day
-# self.cohDay, self.cohTime, self.nSeg, self.obsTime, self.refTime = utils.getTimeSetup(self.target.name, self.obsDay, cohDay)    
-
-# # Calculate the number of jobs required based on frequency derivatives and bandwidth
-# nf1dots = fr.getNf1dot(freq, self.setup.fBand, self.target.tau, df1dot=df1dot)
-# nf2dots = fr.getNf2dot(freq, self.setup.fBand, self.target.tau, df2dot=df2dot)
-# nJobs = int(nf1dots*nf2dots/self.setup.fBand)
-
-# # Determine or calculate the mean 2F threshold value
-
-# print('calculating mean2F threshold...')
-# mean2F_th = self.calMean2F_threshold(cohDay, freq, nJobs)           
-# print('mean2F threshold = ', mean2F_th)
-
-# # Write search results for the specified frequency
-# outlierFilePath = self._writeSearchResult(freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, cluster, workInLocalDir)
-# print('Finish writing search result for {0} Hz'.format(freq))
-# return outlierFilePath
-
-   
-    # Workflow for writing search results across a frequency range (fmin, fmax)
-    def writeSearchResult(self, cohDay, freq, mean2F_th, numTopList=1000, stage='search', freqDerivOrder=2, cluster=False, workInLocalDir=False):
+    # Workflow for writing search results of a 1Hz band, see bandDriver.writeSearchResultRange for a frequency range (fmin, fmax)
+    def writeSearchResult(self, cohDay, freq, mean2F_th, numTopList=1000, stage='search', freqDerivOrder=2, cluster=False, workInLocalDir=False, num_cpus=1, df1dot=1.5e-9, df2dot=1e-19):
         """
         Parameters:
         - cohDay: int
@@ -304,17 +297,86 @@ class resultManager():
 
         - workInLocalDir: bool, optional (default=False)
             If True, stores output files in the local directory. This option might be useful for local testing.
+
+        - num_cpus: int, optional (default=1)
+            Number of worker processes used to read the Weave output files.
+
+        - df1dot, df2dot: float, optional (default=1.5e-9, 1e-19)
+            The f1dot and f2dot segment widths used to split the band into jobs (same as in initSearchParams.genParam).
         """ 
-        
+        # Number of jobs in this band, same partition as the search parameter table
+        nJobs = fr.getNJobs(freq, self.setup.fBand, self.target.tau, df1dot=df1dot, df2dot=df2dot)
+
         # Write search results for the specified frequency
-        outlierFilePath = self._writeSearchResult(cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, cluster, workInLocalDir)
+        outlierFilePath = self._writeSearchResult(cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, cluster, workInLocalDir, num_cpus)
         print('Finish writing search result for {0} Hz'.format(freq))
         return outlierFilePath
     
     
     
+    # True if the outlier file of the band is newer than all its Weave output files
+    def isUpToDate(self, cohDay, freq, nJobs, stage='search', freqDerivOrder=2, cluster=False, workInLocalDir=False):
+        taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+        outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=cluster)
+        if workInLocalDir:
+            outlierFilePath = Path(outlierFilePath).name
+        if not Path(outlierFilePath).exists():
+            return False
+        mtime = Path(outlierFilePath).stat().st_mtime
+        for weaveFilePath in self._weaveFilePathList(freq, taskName, range(1, nJobs+1), stage, workInLocalDir):
+            if not Path(weaveFilePath).exists() or Path(weaveFilePath).stat().st_mtime > mtime:
+                return False
+        return True
+
+    # Summary of the number of outliers and saturated jobs in each sub-band, read by utils.getNonSaturatedBand
+    def writeInfoSummary(self, cohDay, fmin, fmax, stage='search', freqDerivOrder=2, workInLocalDir=False):
+        """
+        Parameters:
+        - cohDay: int
+            The number of coherent observation days for the search.
+
+        - fmin, fmax: int
+            The 1Hz bands fmin, fmin+1, ..., fmax-1 are summarised. Bands without an outlier file are skipped.
+
+        - stage: str, optional (default='search')
+            The stage of the analysis.
+
+        - freqDerivOrder: int, optional (default=2)
+            The frequency derivative order used in the search.
+
+        - workInLocalDir: bool, optional (default=False)
+            If True, read and write files in the local directory.
+
+        Returns:
+        - summaryFilePath: str
+            Text file with one row per sub-band: freq, number of outliers, number of saturated jobs.
+        """
+        nSubBand = int(round(1.0/self.setup.fBand))
+        rows = []
+        for freq in range(fmin, fmax):
+            taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+            outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=False)
+            if workInLocalDir:
+                outlierFilePath = Path(outlierFilePath).name
+            if not Path(outlierFilePath).exists():
+                print('No outlier file for {0} Hz, skipped in the summary'.format(freq))
+                continue
+            info = fits.getdata(outlierFilePath, 'info')
+            # jobs are ordered by sub-band, as in the non-saturated band HDU
+            outliers = info['outliers'].reshape(nSubBand, -1).sum(axis=1)
+            saturated = info['saturated'].reshape(nSubBand, -1).sum(axis=1)
+            for i in range(nSubBand):
+                rows.append([round(freq + i*self.setup.fBand, 6), outliers[i], saturated[i]])
+
+        summaryFilePath = fp.infoSummaryFilePath(self.target, fmin, fmax, stage)
+        if workInLocalDir:
+            summaryFilePath = Path(summaryFilePath).name
+        utils.makeDir([summaryFilePath])
+        np.savetxt(summaryFilePath, np.array(rows).reshape(-1, 3), fmt=['%.6g', '%d', '%d'], header='freq(Hz) outliers saturated')
+        return summaryFilePath
+
     # Write results from each 1Hz frequency band of the search stage output
-    def _writeSearchResultFromSaturatedBand(self, cohDay, freq, mean2F_th, jobIndex, numTopListLimit=1, stage='search', freqDerivOrder=2, workInLocalDir=False):
+    def _writeSearchResultFromSaturatedBand(self, cohDay, freq, mean2F_th, jobIndex, numTopListLimit=1, stage='search', freqDerivOrder=2, workInLocalDir=False, num_cpus=1):
         """
         Parameters:
         - cohDay: int
@@ -346,26 +408,20 @@ class resultManager():
 
         - workInLocalDir: bool, optional (default=False)
             If True, writes output to the local directory rather than the default path. This may be used for testing or troubleshooting.
+
+        - num_cpus: int, optional (default=1)
+            Number of worker processes used to read the Weave output files.
         """      
         
         # Generate the task name for organizing results
         taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
          
-        # Initialize lists to collect outlier tables and data on job completion status
-        outlierTableList = []
-    
-        # Loop over each job to process results
-        for idx in tqdm(jobIndex):
-            # Generate file path for each job's result, adjusting if working in local directory
-            weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, idx, stage)
-            if workInLocalDir:
-                weaveFilePath = Path(weaveFilePath).name
-                
-            weave_data = fits.getdata(weaveFilePath, 1)
-            spacing = utils.getSpacing(weaveFilePath, freqDerivOrder)
-            # Generate outlier table for the job and assess if it reached the limit
-            _outlier = self.makeOutlierTable(weave_data, spacing, mean2F_th, numTopListLimit, freqDerivOrder)  
-            outlierTableList.append( _outlier )
+        # Read the saturated jobs' results (in parallel if num_cpus > 1)
+        weaveFilePathList = self._weaveFilePathList(freq, taskName, jobIndex, stage, workInLocalDir)
+        results = wi.ingestJobs(weaveFilePathList, mean2F_th, numTopListLimit, freqDerivOrder, num_cpus=num_cpus)
+        outliers = wi.outlierAccumulator(freqDerivOrder)
+        for _outlier, spacing, _, _ in results:
+            outliers.append(_outlier, mean2F_th, spacing)
            
         # Set up a FITS file with outliers, non-saturated bands, and search settings
         primary_hdu = fits.PrimaryHDU()
@@ -374,10 +430,7 @@ class resultManager():
         
 
         # Create table HDUs for outliers, job information, and non-saturated bands
-        if len(outlierTableList) == 0:
-            outlier_hdu =  fits.BinTableHDU(name=stage+'SatBand_outlier')
-        else:
-            outlier_hdu =  fits.BinTableHDU(data=vstack(outlierTableList), name=stage+'SatBand_outlier')
+        outlier_hdu =  outliers.toHDU(stage+'SatBand_outlier')
         
         # Compile all HDUs into a FITS HDU list and write to a specified file path
         outlier_hdul = fits.HDUList([primary_hdu, outlier_hdu])
@@ -391,7 +444,7 @@ class resultManager():
         return outlierFilePath 
    
     # Workflow for writing search results across a frequency range (fmin, fmax)
-    def writeSearchResultFromSaturatedBand(self, cohDay, freq, mean2F_th, jobIndex, numTopList=1, stage='search', freqDerivOrder=2, workInLocalDir=False):
+    def writeSearchResultFromSaturatedBand(self, cohDay, freq, mean2F_th, jobIndex, numTopList=1, stage='search', freqDerivOrder=2, workInLocalDir=False, num_cpus=1):
         """
         Parameters:
         - cohDay: int
@@ -417,15 +470,96 @@ class resultManager():
 
         - workInLocalDir: bool, optional (default=False)
             If True, stores output files in the local directory. This option might be useful for local testing.
+
+        - num_cpus: int, optional (default=1)
+            Number of worker processes used to read the Weave output files.
         """ 
-        
         # Write search results for the specified frequency
-        outlierFilePath = self._writeSearchResultFromSaturatedBand(cohDay, freq, mean2F_th, jobIndex, numTopList, stage, freqDerivOrder, workInLocalDir)
+        outlierFilePath = self._writeSearchResultFromSaturatedBand(cohDay, freq, mean2F_th, jobIndex, numTopList, stage, freqDerivOrder, workInLocalDir, num_cpus)
         print('Finish writing search result for {0} Hz'.format(freq))
         return outlierFilePath
 
+    # Streaming top-K of the loudest outliers over all saturated jobs in the bands [fmin, fmax)
+    def writeLoudestOutlierFromSaturatedBand(self, cohDay, fmin, fmax, topK, mean2F_th=None, numTopListLimit=1000, stage='search', freqDerivOrder=2, workInLocalDir=False):
+        """
+        Parameters:
+        - cohDay: int
+            The number of coherent observation days for the search.
+
+        - fmin, fmax: int
+            The 1Hz bands fmin, fmin+1, ..., fmax-1 are processed. The saturated jobs of each band are read from the info HDU of its outlier file.
+
+        - topK: int
+            Number of loudest outliers kept over all saturated jobs in the range.
+
+        - mean2F_th: float, optional (default=None)
+            The mean 2F threshold. If None, the threshold in the header of each band's outlier file is used.
+
+        - numTopListLimit: int, optional (default=1000)
+            Maximum number of toplist rows considered in each job.
+
+        - stage: str, optional (default='search')
+            The stage of the analysis.
+
+        - freqDerivOrder: int, optional (default=2)
+            The frequency derivative order used in the search.
+
+        - workInLocalDir: bool, optional (default=False)
+            If True, read and write files in the local directory.
+
+        Returns:
+        - outlierFilePath: str
+            The file with the global top-K. One file per band (same format as _writeSearchResultFromSaturatedBand)
+            is also written with the part of the top-K in that band, for the follow-up stage.
+        """
+        merger = wi.topKMerger(topK, freqDerivOrder)
+        bandThreshold = {}
+        for freq in tqdm(range(fmin, fmax)):
+            info = utils.getBinTable(self.target, freq, cohDay, freqDerivOrder, stage, 'info', False, workInLocalDir)
+            jobIndex = info['jobIndex'][info['saturated'] == 1].astype(int)
+            if mean2F_th is None:
+                bandThreshold[freq] = utils.getHeader(self.target, freq, cohDay, freqDerivOrder, stage, False, workInLocalDir)['HIERARCH mean2F_th']
+            else:
+                bandThreshold[freq] = mean2F_th
+
+            taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+            for weaveFilePath in self._weaveFilePathList(freq, taskName, jobIndex, stage, workInLocalDir):
+                wi.streamJob(merger, weaveFilePath, bandThreshold[freq], numTopListLimit, freqDerivOrder, tag=freq)
+
+        outliers, tags = merger.result()
+        data = outliers.data
+        tags = np.array(tags)
+
+        def _write(outlier_hdu, filePath, th):
+            primary_hdu = fits.PrimaryHDU()
+            if th is not None:
+                primary_hdu.header['HIERARCH mean2F_th'] = th
+            primary_hdu.header['HIERARCH cluster_nSpacing'] = ''
+            primary_hdu.header['HIERARCH topK'] = topK
+            if workInLocalDir:
+                filePath = Path(filePath).name
+            utils.makeDir([filePath])
+            fits.HDUList([primary_hdu, outlier_hdu]).writeto(filePath, overwrite=True)
+            return filePath
+
+        # one file per band, so each band's follow-up picks its share of the global top-K
+        for freq in range(fmin, fmax):
+            taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+            if data is not None and (tags == freq).any():
+                outlier_hdu = fits.BinTableHDU(data=data[tags == freq], name=stage+'SatBand_outlier')
+            else:
+                outlier_hdu = fits.BinTableHDU(name=stage+'SatBand_outlier')
+            _write(outlier_hdu, fp.outlierFromSaturatedFilePath(self.target, freq, taskName, stage), bandThreshold[freq])
+
+        rangeName = '{0}-{1}'.format(fmin, fmax)
+        taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, rangeName)
+        outlierFilePath = _write(outliers.toHDU(stage+'SatBand_outlier'),
+                                 fp.outlierFromSaturatedFilePath(self.target, rangeName, taskName, stage), mean2F_th)
+        print('Kept the {0} loudest outliers from saturated jobs in {1} Hz'.format(len(outliers), rangeName))
+        return outlierFilePath
+
     # function to write result from weave output in each 1Hz band
-    def _writeInjectionResult(self, cohDay, freq, mean2F_th, nJobs, numTopListLimit=1000, stage='search', freqDerivOrder=2, workInLocalDir=False, cluster=False):
+    def _writeInjectionResult(self, cohDay, freq, mean2F_th, nJobs, numTopListLimit=1000, stage='search', freqDerivOrder=2, workInLocalDir=False, cluster=False, num_cpus=1):
         """
         Writes the injection results from the weave output for a given frequency.
 
@@ -457,34 +591,24 @@ class resultManager():
         - cluster: bool, optional
             If True, indicate that the results should be stored for clustering. Default is False.
 
+        - num_cpus: int, optional
+            Number of worker processes used to read the Weave output files. Default is 1.
+
         Returns:
         - outlierFilePath: str
             The path to the output file containing the results.
         """
         taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
-        outlierTableList = []
+        outliers = wi.outlierAccumulator(freqDerivOrder)
         injTableList = []
         info_data =np.recarray((nJobs,), dtype=[(key, '>f8') for key in ['freq', 'jobIndex', 'outliers']]) 
   
-        weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, 1, stage)
-        if workInLocalDir:
-                weaveFilePath = Path(weaveFilePath).name
-                
-        for i, jobIndex in enumerate(range(1, nJobs+1)):
-            weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, jobIndex, stage)
-            if workInLocalDir:
-                weaveFilePath = Path(weaveFilePath).name
-            
-            weave_data = fits.getdata(weaveFilePath, 1)
-            spacing = utils.getSpacing(weaveFilePath, freqDerivOrder)
-            _outlier = self.makeOutlierTable(weave_data, spacing, mean2F_th, numTopListLimit, freqDerivOrder)  
-            injParam = fits.getdata(weaveFilePath, 2)
-            _outlier, injParam = self.makeInjectionTable(injParam, _outlier, freqDerivOrder)
-            
-            if len(_outlier) == 0:
-                outlierTableList.append( _outlier )
-            else:
-                outlierTableList.append( _outlier )
+        weaveFilePathList = self._weaveFilePathList(freq, taskName, range(1, nJobs+1), stage, workInLocalDir)
+        results = wi.ingestJobs(weaveFilePathList, mean2F_th, numTopListLimit, freqDerivOrder, inj=True, num_cpus=num_cpus)
+
+        for i, (jobIndex, (_outlier, spacing, _, injParam)) in enumerate(zip(range(1, nJobs+1), results)):
+            outliers.append(_outlier, mean2F_th, spacing)
+            if len(_outlier) != 0:
                 injTableList.append( injParam )
             info_data[i] = freq, jobIndex, len(_outlier)  
 
@@ -494,11 +618,11 @@ class resultManager():
         primary_hdu.header['HIERARCH mean2F_th'] = mean2F_th
         primary_hdu.header['HIERARCH cluster_nSpacing'] = ''
         
-        outlier_hdu =  fits.BinTableHDU(data=vstack(outlierTableList), name=stage+'_outlier')
+        outlier_hdu =  outliers.toHDU(stage+'_outlier')
         info_hdu =  fits.BinTableHDU(data=info_data, name='info') 
       
         if len(injTableList) != 0:
-            inj_hdu =  fits.BinTableHDU(data=vstack(injTableList), name='inj')
+            inj_hdu =  fits.BinTableHDU(data=np.concatenate(injTableList), name='inj')
         else:
             inj_hdu =  fits.BinTableHDU(name='inj')
             print('No outlier.')
@@ -523,13 +647,7 @@ class resultManager():
                 primary_hdu.header['HIERARCH mean2F_th'] = mean2F_th
                 primary_hdu.header['HIERARCH cluster_nSpacing'] = setup.cluster_nSpacing
                 
-                centers_idx, cluster_size, cluster_member = utils.clustering(outlier_hdu.data, freqDerivOrder) 
-                center_idx_for_each_outlier = np.full(outlier_hdu.data.size,-1)
-                processed_indices = set()
-                for ci, members in zip(centers_idx, cluster_member):
-                    idx = np.array([item for item in members if item not in processed_indices])
-                    center_idx_for_each_outlier[idx] = ci
-                    processed_indices.update(members)
+                centers_idx, cluster_size, _, center_idx_for_each_outlier = utils.clustering(outlier_hdu.data, freqDerivOrder, returnLabels=True) 
 
                 cluster_data = outlier_hdu.data[center_idx_for_each_outlier]
                 cluster_hdu = fits.BinTableHDU(data=cluster_data, name=stage+'_outlier')
@@ -556,7 +674,7 @@ class resultManager():
         return outlierFilePath 
 
     #work flow to write injection-search result in 1Hz band
-    def writeInjectionResult(self, cohDay, freq, mean2F_th, nJobs, numTopList=1000, stage='search', freqDerivOrder=2, workInLocalDir=False, cluster=False):
+    def writeInjectionResult(self, cohDay, freq, mean2F_th, nJobs, numTopList=1000, stage='search', freqDerivOrder=2, workInLocalDir=False, cluster=False, num_cpus=1):
         """
         Writes the injection results for a specified frequency in the injection-search workflow.
 
@@ -588,18 +706,21 @@ class resultManager():
         - cluster: bool, optional
             If True, indicates that clustering results should be included in the output (default is False).
 
+        - num_cpus: int, optional
+            Number of worker processes used to read the Weave output files (default is 1).
+
         Returns:
         - outlierFilePath: str
             The path to the output file containing the injection results.
         """
                
-        outlierFilePath = self._writeInjectionResult(cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, workInLocalDir, cluster)
+        outlierFilePath = self._writeInjectionResult(cohDay, freq, mean2F_th, nJobs, numTopList, stage, freqDerivOrder, workInLocalDir, cluster, num_cpus)
         print('Finish writing injection result for {0} Hz'.format(freq))
         return outlierFilePath
 
     def _writeFollowUpResult(self, cohDay, freq, mean2F_th, nJobs, numTopListLimit=1000, stage='search', freqDerivOrder=2, 
                                    workInLocalDir=True, inj=False, cluster=False,
-                                   chunk_index=0, chunk_size=1):
+                                   chunk_index=0, chunk_size=1, num_cpus=1, clusterer=None, chunk_start=None):
         """
         Writes the follow-up results for injections at a given frequency.
 
@@ -640,6 +761,15 @@ class resultManager():
         - chunk_size: int, optional
             The size of the chunks for processing. Default is 1.
 
+        - num_cpus: int, optional
+            Number of worker processes used to read the Weave output files. Default is 1.
+
+        - clusterer: clusterEngine.streamingClusterer, optional
+            If given, the outliers of this chunk are also merged into it (see ensembleOutlierChunk). Default is None.
+
+        - chunk_start: int, optional
+            Index of the first job of the chunk (counted from 0), for chunks of different sizes. Default is chunk_index*chunk_size.
+
         Returns:
         - outlierFilePath: str
             The path to the output file containing the follow-up results.
@@ -647,35 +777,23 @@ class resultManager():
         
         taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
     
-        outlierTableList = []
+        outliers = wi.outlierAccumulator(freqDerivOrder)
         injTableList = []
         info_data = np.recarray((nJobs,), dtype=[(key, '>f8') for key in ['freq', 'jobIndex', 'outliers']]) 
  
-        weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, 1, stage)
-        if workInLocalDir:
-            weaveFilePath = Path(weaveFilePath).name
-            
-        # Iterate over each job to gather follow-up results
-        for i, jobIndex in enumerate(range(chunk_index*chunk_size+1, chunk_index*chunk_size+nJobs+1)):
-            weaveFilePath = fp.weaveOutputFilePath(self.target, freq, taskName, jobIndex, stage)
-            if workInLocalDir:
-                weaveFilePath = Path(weaveFilePath).name 
-            # Create outlier table from the weave output
-            weave_data = fits.getdata(weaveFilePath, 1)
-            spacing = utils.getSpacing(weaveFilePath, freqDerivOrder)
-            _outlier = self.makeOutlierTable(weave_data, spacing, mean2F_th[i], numTopListLimit, freqDerivOrder)
-            # If injections are considered, create an injection table as well
-            if inj:
-                injParam = fits.getdata(weaveFilePath, 2)
-                _outlier, injParam = self.makeInjectionTable(injParam, _outlier, freqDerivOrder)
-                
-            # Append results to the respective lists
-            if len(_outlier) == 0:
-                outlierTableList.append( _outlier )
-            else:
-                outlierTableList.append( _outlier )
-                if inj:
-                    injTableList.append( injParam )
+        # Read every job's result, including the injection table if injections are considered
+        chunked = chunk_size != 1 or chunk_start is not None
+        if chunk_start is None:
+            chunk_start = chunk_index*chunk_size
+        jobIndexList = range(chunk_start+1, chunk_start+nJobs+1)
+        weaveFilePathList = self._weaveFilePathList(freq, taskName, jobIndexList, stage, workInLocalDir)
+        results = wi.ingestJobs(weaveFilePathList, mean2F_th, numTopListLimit, freqDerivOrder, inj=inj, num_cpus=num_cpus)
+
+        for i, (jobIndex, (_outlier, spacing, _, injParam)) in enumerate(zip(jobIndexList, results)):
+            # Append results to the accumulator and the injection list
+            outliers.append(_outlier, mean2F_th[i], spacing)
+            if len(_outlier) != 0 and inj:
+                injTableList.append( injParam )
                     
             info_data[i] = freq, jobIndex, len(_outlier)  
 
@@ -683,16 +801,16 @@ class resultManager():
         # Create a PrimaryHDU object
         primary_hdu = fits.PrimaryHDU()
                
-        if len(outlierTableList) !=0:
-            outlier_hdu =  fits.BinTableHDU(data=vstack(outlierTableList), name=stage+'_outlier')
-        else:
-            outlier_hdu =  fits.BinTableHDU(name=stage+'_outlier')
+        outlier_hdu =  outliers.toHDU(stage+'_outlier')
+        if len(outliers) == 0:
             print('No outlier.')
+        elif clusterer is not None:
+            clusterer.push(outlier_hdu.data)
         
         # if software injection is included 
         if inj:
             if len(injTableList) != 0:
-                inj_hdu =  fits.BinTableHDU(data=vstack(injTableList), name='inj')
+                inj_hdu =  fits.BinTableHDU(data=np.concatenate(injTableList), name='inj')
             else:
                 inj_hdu =  fits.BinTableHDU(name='inj')
         
@@ -705,7 +823,7 @@ class resultManager():
             outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=cluster)
         if workInLocalDir:
             outlierFilePath = Path(outlierFilePath).name
-        if chunk_size !=1:
+        if chunked:
             outlierFilePath = outlierFilePath[:-4] + '_chunk{}.fts'.format(chunk_index)
         utils.makeDir([outlierFilePath])
         
@@ -720,15 +838,8 @@ class resultManager():
         if cluster:
             if outlier_hdu.data.size > 1:
                 cluster_hdul = fits.HDUList()
-                centers_idx, cluster_size, cluster_member = utils.clustering(outlier_hdu.data, freqDerivOrder) 
+                centers_idx, cluster_size, _, center_idx_for_each_outlier = utils.clustering(outlier_hdu.data, freqDerivOrder, returnLabels=True) 
                 if inj:
-                    center_idx_for_each_outlier = np.full(outlier_hdu.data.size,-1)
-                    processed_indices = set()
-                    for ci, members in zip(centers_idx, cluster_member):
-                        idx = np.array([item for item in members if item not in processed_indices])
-                        center_idx_for_each_outlier[idx] = ci
-                        processed_indices.update(members)
-
                     cluster_data = outlier_hdu.data[center_idx_for_each_outlier]
                     cluster_hdu = fits.BinTableHDU(data=cluster_data, name=stage+'_outlier')
                 else:
@@ -750,7 +861,7 @@ class resultManager():
                 cluster_hdul = outlier_hdu    
             
             outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=cluster)
-            if chunk_size !=1:
+            if chunked:
                 outlierFilePath = outlierFilePath[:-4] + '_chunk{}.fts'.format(chunk_index)
             if workInLocalDir:
                 outlierFilePath = Path(outlierFilePath).name
@@ -760,7 +871,7 @@ class resultManager():
     def writeFollowUpResult(self, new_cohDay, freq, old_mean2F, numTopList=1000, 
                             new_stage='followUp-1', new_freqDerivOrder=2, ratio=0, 
                             workInLocalDir=True, inj=False, cluster=False,
-                            chunk_index=0, chunk_size=1, chunk_count=None):
+                            chunk_index=0, chunk_size=1, chunk_count=None, num_cpus=1, clusterer=None, chunk_start=None):
         """
         Writes the follow-up result for a given frequency based on previous analysis.
 
@@ -791,21 +902,34 @@ class resultManager():
 
         - inj: bool, optional
             If True, includes injections in the follow-up result. Default is False
+
+        - num_cpus: int, optional
+            Number of worker processes used to read the Weave output files. Default is 1.
+
+        - clusterer: clusterEngine.streamingClusterer, optional
+            Streaming clusterer shared by the chunks of a follow-up. Default is None.
+
+        - chunk_start: int, optional
+            Index of the first job of the chunk, for chunks of different sizes (chunk_size is then the size of
+            this chunk and chunk_count may be None). Default is None.
         """
     
         mean2F_th = old_mean2F * ratio
 
         print('ratio=',ratio)
-        if chunk_count is not None:
+        if chunk_start is not None:
+            mean2F_th = mean2F_th[chunk_start:chunk_start+chunk_size]
+        elif chunk_count is not None:
             mean2F_th = mean2F_th[chunk_index*chunk_size:(chunk_index+1)*chunk_size]
         nJobs = mean2F_th.size
         outlierFilePath = self._writeFollowUpResult(new_cohDay, freq, mean2F_th, nJobs, numTopList, new_stage, new_freqDerivOrder, 
-                                                    workInLocalDir, inj, cluster, chunk_index=chunk_index, chunk_size=chunk_size)
+                                                    workInLocalDir, inj, cluster, chunk_index=chunk_index, chunk_size=chunk_size, num_cpus=num_cpus, clusterer=clusterer,
+                                                    chunk_start=chunk_start)
 
         print('Finish writing followUp result for {0} Hz'.format(freq))
         return outlierFilePath
 
-    def ensembleOutlierChunk(self, totalJobCounts, chunk_size, chunk_count, cohDay, freq, stage, freqDerivOrder, cluster, workInLocalDir):
+    def ensembleOutlierChunk(self, totalJobCounts, chunk_size, chunk_count, cohDay, freq, stage, freqDerivOrder, cluster, workInLocalDir, clusterer=None):
         
         """
         Combines outlier results from multiple chunks into a single output file. Notice that injection jobs are not supported by this function.
@@ -838,6 +962,10 @@ class resultManager():
         - workInLocalDir: bool
             If True, indicates that paths should be treated as local directory paths.
 
+        - clusterer: clusterEngine.streamingClusterer, optional
+            If given (and cluster is True), the clustered file is written from the outliers of all chunks clustered
+            together, so clusters straddling chunks appear once, and the chunk files are not read again.
+
         Returns:
         - outlierFilePath: str
             The path to the output file containing the combined outlier results.
@@ -848,6 +976,24 @@ class resultManager():
         outlierFilePath = fp.outlierFilePath(self.target, freq, taskName, stage, cluster=cluster) 
         if workInLocalDir:
             outlierFilePath = Path(outlierFilePath).name
+
+        if cluster and clusterer is not None:
+            centers, cluster_size = clusterer.result()
+            print('{} outliers are grouped to {} clusters across {} chunks.'.format(clusterer.nOutliers, len(clusterer), chunk_count))
+            primary_hdu = fits.PrimaryHDU()
+            primary_hdu.header['HIERARCH cluster_nSpacing'] = clusterer.nSpacing
+            if centers is None:
+                cluster_hdu = fits.BinTableHDU(name=stage+'_outlier')
+            else:
+                cluster_hdu = fits.BinTableHDU(data=centers, name=stage+'_outlier')
+            info_data = np.recarray((cluster_size.size,), dtype=[(key, '>f8') for key in ['freq', 'clusterIndex', 'noOutliersWithin']])
+            info_data['freq'] = freq
+            info_data['clusterIndex'] = np.arange(cluster_size.size)
+            info_data['noOutliersWithin'] = cluster_size
+            info_hdu = fits.BinTableHDU(data=info_data, name='info_clustered')
+            utils.makeDir([outlierFilePath])
+            fits.HDUList([primary_hdu, cluster_hdu, info_hdu]).writeto(outlierFilePath, overwrite=True)
+            return outlierFilePath
             
         outlierTableList = []
         infoTableList = []
@@ -0,0 +1,153 @@
+# Append-only journal of the local Weave jobs of a task (see weaveExecutor and pipelineTools), so an evicted or
+# interrupted run resumes where it stopped. Each line is a JSON record of a job status change:
+#   queued -> running -> done (size and md5 of the result) or failed -> ingested (analyzed) -> deleted
+# or of a batch of jobs analyzed together. Every record carries a key, the digest of the job argv or of the analysis
+# settings and job keys of the batch, so a call of the same task with other parameters (another h0, mean2F ratio,
+# ...) is a new run and never reuses the records of the previous one. A job is only taken as done if its key matches
+# and its result still has the recorded size and hash, so a partial file left by an eviction is run again, and the
+# jobs of an analyzed batch are neither run nor counted again. Once the run completes the journal is rolled aside.
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from .bandManifest import fileHash
+
+statuses = ('queued', 'running', 'done', 'failed', 'ingested', 'deleted')
+
+def digest(*values):
+    """
+    md5 of the values (arrays by their bytes, anything else by its JSON form), to identify a job or a setting.
+    """
+    h = hashlib.md5()
+    for value in values:
+        if hasattr(value, 'tobytes'):
+            h.update(value.tobytes())
+        else:
+            h.update(json.dumps(value, sort_keys=True, default=str).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+class runJournal():
+    """
+    Status of the jobs of a run, replayed from the journal file and appended to as the run goes on.
+    Jobs are identified by their result file and their key; the records are written by one thread at a time.
+    """
+    def __init__(self, filePath):
+        """
+        Parameters:
+        - filePath: str
+            The journal file (JSON lines), created if missing.
+        """
+        self.filePath = str(filePath)
+        self.lock = threading.Lock()
+        # last record of each job, and the analyzed batches in order
+        self.jobs = {}
+        self.batches = []
+        self.replay()
+        Path(self.filePath).resolve().parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.filePath, 'a')
+
+    def replay(self):
+        if not Path(self.filePath).exists():
+            return
+        with open(self.filePath) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a line cut by the interruption, its change did not complete
+                    continue
+                if 'job' in entry:
+                    self.jobs[entry['job']] = entry
+                else:
+                    # a batch redone after an interruption replaces its earlier record
+                    self.batches = self.batches[:entry['batch']] + [entry]
+
+    def append(self, entry):
+        entry['time'] = time.time()
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            # flushed at once, so the record survives the eviction of the process
+            self.file.flush()
+
+    def record(self, job, status, **info):
+        """
+        Records a status change of a job.
+
+        Parameters:
+        - job: str
+            The result file of the job.
+
+        - status: str
+            One of statuses.
+
+        - info: optional keyword arguments stored with the record (e.g. size and hash of the result).
+        """
+        if status not in statuses:
+            raise ValueError('Unknown job status: {}'.format(status))
+        entry = dict(info, job=str(job), status=status)
+        self.append(entry)
+        self.jobs[entry['job']] = entry
+
+    def status(self, job):
+        entry = self.jobs.get(str(job))
+        return None if entry is None else entry['status']
+
+    def recordDone(self, job, key):
+        # size and hash of the finished result, checked again when the run is resumed
+        filePath = Path(job)
+        self.record(job, 'done', key=key, size=filePath.stat().st_size, hash=fileHash(filePath))
+
+    def isDone(self, job, key):
+        """
+        Returns True if the job with this key finished and its result is still the one recorded.
+        """
+        entry = self.jobs.get(str(job))
+        if entry is None or entry['status'] != 'done' or entry.get('key') != key or not Path(job).exists():
+            return False
+        return Path(job).stat().st_size == entry['size'] and fileHash(job) == entry['hash']
+
+    def recordBatch(self, batchIndex, start, jobs, result, key):
+        """
+        Records that the results of jobs (jobs start..start+len(jobs)-1 of the run) were analyzed, with the
+        value returned by the analysis, which must be JSON serializable, and the key of the batch. The batch
+        record is what makes the analysis final: the results must only be deleted after it.
+        """
+        entry = {'batch': batchIndex, 'start': start, 'end': start+len(jobs), 'key': key, 'result': result}
+        self.append(entry)
+        self.batches = self.batches[:batchIndex] + [entry]
+        for job in jobs:
+            self.record(job, 'ingested', batch=batchIndex)
+
+    def ingestedBatches(self, batchKey, nJobs):
+        """
+        Returns the analyzed batches that are a prefix of the nJobs jobs of the run, in order. A batch only
+        counts if its key is batchKey(start, end) for this run.
+        """
+        batches, end = [], 0
+        for entry in self.batches:
+            if entry['start'] != end or entry['end'] > nJobs or entry.get('key') != batchKey(entry['start'], entry['end']):
+                break
+            batches.append(entry)
+            end = entry['end']
+        return batches
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def roll(self):
+        """
+        Closes the journal of a completed run and renames it to <journal>.done, so the next run of the task starts anew.
+        """
+        self.close()
+        if Path(self.filePath).exists():
+            os.replace(self.filePath, self.filePath + '.done')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
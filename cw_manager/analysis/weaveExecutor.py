@@ -0,0 +1,352 @@
+# Local executor of the Weave jobs of the follow-up and injection stages (see pipelineTools): each job runs
+# from an argv list (no shell), at most num_cpus at a time, with its stdout/stderr streamed to log files.
+# The exit status, wall and CPU time of every job are recorded and failed jobs are run again. The jobs are
+# pipelined with the analysis of their results, under a budget of disk space for the results (runBatches), and
+# journaled so that an interrupted run resumes where it stopped (see runJournal).
+import asyncio
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .runJournal import digest
+
+class weaveJob():
+    """
+    One Weave run: the argv and the result file, and once it has run its exit status, times and log files.
+    """
+    def __init__(self, resultFile, argv, name=None):
+        """
+        Parameters:
+        - resultFile: str
+            The Weave output file (--output-file).
+
+        - argv: list
+            The command, starting with the Weave executable.
+
+        - name: str, optional (default=None)
+            Name of the log files; the name of the result file if None (Weave results end with the job index).
+        """
+        self.resultFile = str(resultFile)
+        self.argv = [str(arg) for arg in argv]
+        self.name = Path(resultFile).name if name is None else name
+        self.returncode = None
+        self.wallTime = 0.0
+        self.cpuTime = 0.0
+        self.attempts = 0
+        self.skipped = False
+        self.logFiles = (None, None)
+        self.outputSize = 0
+        # identifies the job in a journal: the same result file with other arguments is another job
+        self.key = digest(self.argv)
+
+    @property
+    def done(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        return 'weaveJob({0}, returncode={1}, attempts={2})'.format(self.name, self.returncode, self.attempts)
+
+def runProcess(argv, outFilePath, errFilePath):
+    """
+    Runs a command with its stdout/stderr written to files and waits for it with os.wait4, which also
+    gives the CPU time of the process (the asyncio child watcher reaps the process without it).
+
+    Returns:
+    - returncode: int
+        Exit status, negative for a signal, 127 if the executable could not be started.
+
+    - cpuTime: float
+        User + system time of the process [s].
+    """
+    with open(outFilePath, 'w') as out, open(errFilePath, 'w') as err:
+        try:
+            proc = subprocess.Popen(argv, stdout=out, stderr=err, stdin=subprocess.DEVNULL)
+        except OSError as e:
+            err.write('{0}: {1}\n'.format(type(e).__name__, e))
+            return 127, 0.0
+        _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_utime + usage.ru_stime
+
+class weaveExecutor():
+    """
+    Runs weaveJobs on the local node. The jobs are coroutines of one asyncio event loop, bounded by a
+    semaphore of num_cpus; each running job waits for its process in a thread of a pool of the same size.
+    A job whose result file exists is skipped, as before, so a restarted run only does the missing jobs; with a
+    journal, only a job recorded as done whose result is unchanged is skipped.
+    """
+    def __init__(self, num_cpus=1, retries=1, logDir=None, skipExisting=True, journal=None):
+        """
+        Parameters:
+        - num_cpus: int, optional (default=1)
+            Number of Weave processes at the same time.
+
+        - retries: int, optional (default=1)
+            Number of times a failed job is run again.
+
+        - logDir: str, optional (default=None)
+            Directory of the <name>.out/<name>.err log files; next to the result files if None.
+
+        - skipExisting: bool, optional (default=True)
+            If True, jobs whose result file exists are not run.
+
+        - journal: runJournal.runJournal, optional (default=None)
+            Journal of the run. If given, the status of every job is recorded, a result file is only taken as
+            finished if the journal says so (not a partial file of an evicted run), and runBatches resumes after
+            the batches already analyzed.
+        """
+        self.num_cpus = max(1, int(num_cpus))
+        self.retries = retries
+        self.logDir = logDir
+        self.skipExisting = skipExisting
+        self.journal = journal
+
+    def isFinished(self, job):
+        if self.journal is not None:
+            return self.journal.isDone(job.resultFile, job.key)
+        return self.skipExisting and Path(job.resultFile).exists()
+
+    def logFilePaths(self, job):
+        logDir = Path(job.resultFile).parent if self.logDir is None else Path(self.logDir)
+        logDir.mkdir(parents=True, exist_ok=True)
+        return str(logDir / (job.name + '.out')), str(logDir / (job.name + '.err'))
+
+    async def runJob(self, job, pool):
+        # runs a job (without waiting for a slot, see runBatchesAsync) and records the size of its result
+        if self.isFinished(job):
+            print('Exists:{}'.format(job.resultFile))
+            job.skipped, job.returncode = True, 0
+        else:
+            loop = asyncio.get_running_loop()
+            job.logFiles = self.logFilePaths(job)
+            while job.attempts <= self.retries:
+                # a partial result of a failed attempt must not be taken for a finished job
+                Path(job.resultFile).unlink(missing_ok=True)
+                job.attempts += 1
+                self.record(job, 'running', attempt=job.attempts)
+                t0 = time.time()
+                job.returncode, cpuTime = await loop.run_in_executor(pool, runProcess, job.argv, *job.logFiles)
+                job.wallTime += time.time() - t0
+                job.cpuTime += cpuTime
+                if job.done:
+                    break
+                print('{0}: exit status {1} (attempt {2}), see {3}'.format(job.name, job.returncode, job.attempts, job.logFiles[1]))
+            if not job.done:
+                Path(job.resultFile).unlink(missing_ok=True)
+                self.record(job, 'failed', returncode=job.returncode)
+            elif self.journal is not None:
+                # hashing the result is left to the pool, the event loop goes on with the other jobs
+                await loop.run_in_executor(pool, self.journal.recordDone, job.resultFile, job.key)
+        job.outputSize = os.path.getsize(job.resultFile) if job.done and Path(job.resultFile).exists() else 0
+        return job
+
+    def record(self, job, status, **info):
+        if self.journal is not None:
+            self.journal.record(job.resultFile, status, key=job.key, **info)
+
+    def queue(self, jobs):
+        # jobs new to the journal (or with other arguments than recorded) are recorded as queued
+        if self.journal is not None:
+            for job in jobs:
+                entry = self.journal.jobs.get(job.resultFile)
+                if entry is None or entry.get('key') != job.key:
+                    self.record(job, 'queued')
+
+    def batchKey(self, jobs, settings):
+        # key of the batch jobs[start:end] analyzed with settings, see runJournal
+        return lambda start, end: digest(settings, [job.key for job in jobs[start:end]])
+
+    def resumedBatches(self, jobs, settings=None):
+        """
+        Returns the journal records of the batches of these jobs already analyzed with these settings, in order
+        (empty without a journal).
+        """
+        if self.journal is None:
+            return []
+        return self.journal.ingestedBatches(self.batchKey(jobs, settings), len(jobs))
+
+    async def runBatchesAsync(self, jobs, consume, batchSize, batchJobs, budget, release, settings):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.num_cpus)
+        changed = asyncio.Condition()
+        batchKey = self.batchKey(jobs, settings)
+        # the batches analyzed by an interrupted run (same jobs and settings) are not run nor analyzed again
+        previous = self.resumedBatches(jobs, settings)
+        resumed = previous[-1]['end'] if previous else 0
+        if resumed:
+            print('Resuming after {0} jobs analyzed in {1} batches.'.format(resumed, len(previous)))
+        for job in jobs[:resumed]:
+            job.skipped, job.returncode = True, 0
+        finished = [True] * resumed + [False] * (len(jobs) - resumed)
+        # bytes of finished results not consumed yet, number of running jobs, number and total size of the results
+        # seen so far, first job not consumed yet, and whether the admission of a job is waiting for disk space
+        state = {'onDisk': 0, 'running': 0, 'nResults': 0, 'resultBytes': 0, 'consumed': resumed, 'blocked': False}
+
+        def meanSize():
+            return state['resultBytes'] / state['nResults'] if state['nResults'] else 0
+
+        def awaitedEnd():
+            # end of the batch the consumer waits for: its jobs are always admitted, otherwise nothing could be freed
+            if batchSize is None:
+                return state['consumed'] + 1
+            return state['consumed'] + batchSize
+
+        def admissible(index):
+            if index < awaitedEnd() or (state['onDisk'] == 0 and state['running'] == 0):
+                return True
+            projected = (state['running'] + 1) * meanSize()
+            return state['onDisk'] + projected <= budget.limit and projected <= budget.free()
+
+        def readyBatch():
+            # jobs of the next batch if it can be consumed now, else None
+            start = state['consumed']
+            if batchSize is not None:
+                end = min(start + batchSize, len(jobs))
+                return (start, end) if all(finished[start:end]) else None
+            end = start
+            while end < min(start + batchJobs, len(jobs)) and finished[end]:
+                end += 1
+            # the finished jobs are consumed once they are batchJobs or fill the batch budget, when a job waits for
+            # disk space, or at the end; the disk budget alone would leave small results to one batch after all the runs
+            size = sum(jobs[i].outputSize for i in range(start, end))
+            if end > start and (end - start == batchJobs or size >= budget.batch or state['blocked'] or end == len(jobs)):
+                return start, end
+            return None
+
+        async def runOne(index, job, pool):
+            try:
+                await self.runJob(job, pool)
+            finally:
+                semaphore.release()
+                async with changed:
+                    finished[index] = True
+                    state['onDisk'] += job.outputSize
+                    state['running'] -= 1
+                    if job.outputSize > 0:
+                        state['nResults'] += 1
+                        state['resultBytes'] += job.outputSize
+                    changed.notify_all()
+
+        async def schedule(pool):
+            for index, job in enumerate(jobs[resumed:], resumed):
+                await semaphore.acquire()
+                async with changed:
+                    while not admissible(index):
+                        state['blocked'] = True
+                        changed.notify_all()
+                        # the free space can also change outside of this run, so it is checked again periodically
+                        try:
+                            await asyncio.wait_for(changed.wait(), budget.pollInterval)
+                        except asyncio.TimeoutError:
+                            pass
+                    state['blocked'] = False
+                    state['running'] += 1
+                asyncio.ensure_future(runOne(index, job, pool))
+
+        def ingest(batchIndex, start, batch):
+            result = consume(batchIndex, start, batch)
+            # the results are released only once their analysis is recorded, so a resumed run never needs them
+            if self.journal is not None:
+                self.journal.recordBatch(batchIndex, start, [job.resultFile for job in batch], result, batchKey(start, start+len(batch)))
+            if release is not None:
+                release(batch)
+            return result
+
+        async def consumer(analysisPool):
+            results = [entry['result'] for entry in previous]
+            while state['consumed'] < len(jobs):
+                async with changed:
+                    await changed.wait_for(lambda: readyBatch() is not None)
+                    start, end = readyBatch()
+                batch = jobs[start:end]
+                results.append(await loop.run_in_executor(analysisPool, ingest, len(results), start, batch))
+                async with changed:
+                    state['consumed'] = end
+                    state['onDisk'] -= sum(job.outputSize for job in batch)
+                    changed.notify_all()
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.num_cpus) as pool, ThreadPoolExecutor(max_workers=1) as analysisPool:
+            _, results = await asyncio.gather(schedule(pool), consumer(analysisPool))
+        return results
+
+    def runBatches(self, jobs, consume, diskBudget=None, batchSize=None, batchJobs=None, reserve=2*1024**3, release=None, settings=None):
+        """
+        Runs the jobs with the analysis of their results overlapped with the runs: consume(batchIndex, start, jobs)
+        is called in a separate worker thread, in job order, on consecutive batches of finished jobs (jobs[start:start+len(jobs)]),
+        while the cores go on with the next jobs. consume reads the results of its batch, and release(jobs) then
+        deletes them.
+
+        The executor tracks the bytes of the results on disk and the free space of the result directory: a job is
+        admitted only while the results on disk not consumed yet, plus the projected results of the running jobs and of
+        the job (mean result size so far), stay within diskBudget and within the free space less reserve.
+
+        Parameters:
+        - jobs: list of weaveJob
+
+        - consume: callable
+            consume(batchIndex, start, jobs), its return values are returned in batch order (and recorded in the
+            journal, if any, so they must then be JSON serializable).
+
+        - diskBudget: float, optional (default=None)
+            Bytes of results allowed on disk; half the free space of the result directory if None.
+
+        - batchSize: int, optional (default=None)
+            Number of jobs of every batch. If None, a batch is consumed once it has batchJobs finished jobs or its
+            finished jobs hold a quarter of diskBudget, or earlier when a job waits for disk space, so the batches
+            adapt to the result size and disk.
+
+        - batchJobs: int, optional (default=None)
+            Maximum number of jobs of a batch if batchSize is None; 4*num_cpus if None.
+
+        - reserve: float, optional (default=2GB)
+            Bytes of free space kept on the disk of the results.
+
+        - release: callable, optional (default=None)
+            release(jobs), called after consume (and after the batch is recorded in the journal), e.g. to delete the results.
+
+        - settings: optional (default=None)
+            The parameters of consume not in the job arguments (thresholds, ratio, ...), JSON serializable or arrays.
+            A batch of the journal is only reused if it was analyzed with the same settings.
+
+        Returns:
+        - results: list
+            Return value of consume for each batch.
+        """
+        t0 = time.time()
+        resultDir = Path(jobs[0].resultFile).resolve().parent if jobs else Path('.')
+        budget = diskBudgetTracker(resultDir, diskBudget, reserve)
+        print('Disk budget of the Weave results: {0:.2f} GB'.format(budget.limit/1024**3))
+        self.queue(jobs)
+        batchJobs = 4 * self.num_cpus if batchJobs is None else max(1, int(batchJobs))
+        results = asyncio.run(self.runBatchesAsync(jobs, consume, batchSize, batchJobs, budget, release, settings))
+        report(jobs, time.time()-t0)
+        return results
+
+class diskBudgetTracker():
+    """
+    Disk budget of the results of a run (see weaveExecutor.runBatches).
+    """
+    pollInterval = 10
+
+    def __init__(self, resultDir, diskBudget=None, reserve=2*1024**3):
+        self.resultDir = resultDir
+        self.reserve = reserve
+        self.limit = shutil.disk_usage(resultDir).free / 2 if diskBudget is None else diskBudget
+        # bytes of finished results that trigger the analysis of a batch
+        self.batch = self.limit / 4
+
+    def free(self):
+        # free space left for new results
+        return shutil.disk_usage(self.resultDir).free - self.reserve
+
+def report(jobs, wallTime):
+    failed = [job for job in jobs if not job.done]
+    skipped = sum(job.skipped for job in jobs)
+    cpuTime = sum(job.cpuTime for job in jobs)
+    print('{0} Weave jobs: {1} run, {2} existed, {3} failed; {4:.1f}s wall, {5:.1f}s CPU'.format(
+        len(jobs), len(jobs)-skipped-len(failed), skipped, len(failed), wallTime, cpuTime))
+    for job in failed:
+        print('Failed: {0} (exit status {1} after {2} attempts)'.format(job.resultFile, job.returncode, job.attempts))
@@ -0,0 +1,330 @@
+from astropy.io import fits
+from astropy.table import Table
+import numpy as np
+import heapq
+from multiprocessing import Pool
+from tqdm import tqdm
+from ..utils import utils as utils
+from . import readFile as rf
+
+# Engine to read Weave output files of a 1Hz band and reduce each job to a compact outlier array.
+# The same worker function is used in the serial and the process-pool mode, so both modes give identical results.
+
+def outlierTable(data, spacing, mean2F_th, toplistLimit=1000, freqDerivOrder=2):
+    """
+    Parameters:
+    - data: FITS_rec
+        Toplist of a Weave output file (HDU 1), sorted by mean2F.
+
+    - spacing: dict
+        Template spacing of each phase parameter, see utils.getSpacing.
+
+    - mean2F_th: float
+        The threshold value for the mean 2F statistic.
+
+    - toplistLimit: int, optional (default=1000)
+        Maximum number of top outliers to be returned.
+
+    - freqDerivOrder: int, optional (default=2)
+        The frequency derivative order, which determines the spacing columns added to the table.
+    """
+    # Read and limit the data to the top entries
+    data = data[:toplistLimit]
+    # Mask data with mean 2F values greater than the threshold
+    mask = data['mean2F'] > mean2F_th
+    data = Table(data[mask])
+    data.add_column(mean2F_th*np.ones(len(data)), name='mean2F threshold')
+
+    # Add spacing parameters as columns in the table
+    _, name = utils.phaseParamName(freqDerivOrder)
+    for i in range(len(name)):
+        data.add_column(spacing[name[i]]*np.ones(len(data)), name=name[i])
+    return data
+
+def thresholdRows(data, mean2F_th, toplistLimit=1000):
+    """
+    Returns the rows of the toplist above the mean2F threshold as a plain numpy structured array.
+
+    Parameters:
+    - data: FITS_rec
+        Toplist of a Weave output file (HDU 1), sorted by mean2F.
+
+    - mean2F_th: float
+        The threshold value for the mean 2F statistic.
+
+    - toplistLimit: int, optional (default=1000)
+        Maximum number of top entries considered.
+    """
+    data = data[:toplistLimit]
+    mask = data['mean2F'] > mean2F_th
+    # Weave toplist columns are plain (unscaled) floats, so the raw record buffer can be used directly
+    return np.array(data[mask]).view(np.ndarray)
+
+class outlierAccumulator():
+    """
+    Columnar accumulator of the outliers in a band. The thresholded rows of each job are collected and
+    copied once into a single pre-allocated structured array, with the threshold and spacing columns
+    broadcast in place (instead of building and stacking one astropy Table per job).
+    """
+    def __init__(self, freqDerivOrder=2):
+        _, self.spacingName = utils.phaseParamName(freqDerivOrder)
+        self.blocks = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, rows, mean2F_th, spacing):
+        """
+        Parameters:
+        - rows: numpy structured array
+            Thresholded toplist rows of one job (see thresholdRows).
+
+        - mean2F_th: float
+            The mean 2F threshold applied to the job.
+
+        - spacing: dict
+            Template spacing of the job.
+        """
+        self.blocks.append((rows, mean2F_th, spacing))
+        self.size += len(rows)
+
+    def dtype(self):
+        rowDtype = self.blocks[0][0].dtype
+        fields = [(name, rowDtype[name]) for name in rowDtype.names]
+        fields += [('mean2F threshold', '>f8')] + [(name, '>f8') for name in self.spacingName]
+        return np.dtype(fields)
+
+    @property
+    def data(self):
+        if len(self.blocks) == 0:
+            return None
+        data = np.empty(self.size, dtype=self.dtype())
+        pos = 0
+        for rows, mean2F_th, spacing in self.blocks:
+            sl = slice(pos, pos+len(rows))
+            for name in rows.dtype.names:
+                data[name][sl] = rows[name]
+            data['mean2F threshold'][sl] = mean2F_th
+            for name in self.spacingName:
+                data[name][sl] = spacing[name]
+            pos += len(rows)
+        return data
+
+    def toHDU(self, name):
+        # an empty HDU is returned if no job was appended
+        if len(self.blocks) == 0:
+            return fits.BinTableHDU(name=name)
+        return fits.BinTableHDU(data=self.data, name=name)
+
+def injectionTable(injParam, searchParam):
+    """
+    Parameters:
+    - injParam: FITS_rec
+        Injection parameters of a Weave output file (HDU 2).
+
+    - searchParam: Table
+        Outlier table of the same job, only the loudest outlier is kept.
+    """
+    # only follow up the loudest one which covering the injection to save the cost
+    return Table(searchParam)[:1], injParamTable(injParam)
+
+def injParamTable(injParam):
+    injParam = Table(injParam)
+
+    # Calculate h0 from aPlus and aCross, adding it as a new column
+    aplus, across = injParam['aPlus'], injParam['aCross']
+    h0 = 0.5*(2.*aplus+2.*np.sqrt(aplus**2-across**2) )
+    injParam.add_column(h0*np.ones(len(injParam)), name='h0')
+
+    # Rename the reference time column for consistency
+    injParam.rename_column('refTime_s', 'refTime')
+    return injParam
+
+def ingestJob(weaveFilePath, mean2F_th, numTopListLimit=1000, freqDerivOrder=2, inj=False, memmap=False):
+    """
+    Reads one Weave output file and applies the mean2F threshold.
+
+    Parameters:
+    - weaveFilePath: str
+        Path to the Weave output file of the job.
+
+    - mean2F_th: float
+        The threshold value for the mean 2F statistic of this job.
+
+    - numTopListLimit: int, optional (default=1000)
+        Maximum number of top outliers to keep for the job.
+
+    - freqDerivOrder: int, optional (default=2)
+        The frequency derivative order used in the search.
+
+    - inj: bool, optional (default=False)
+        If True, also read the injection HDU and keep only the loudest outlier.
+
+    - memmap: bool, optional (default=False)
+        If True, memory-map the file so only the first numTopListLimit rows of the toplist are read.
+
+    Returns:
+    - outlier: numpy structured array
+        Toplist rows above threshold, to be passed to outlierAccumulator.append.
+
+    - spacing: dict
+        Template spacing of the job.
+
+    - saturated: bool
+        True if the number of outliers reached numTopListLimit (checked before the injection cut).
+
+    - injParam: numpy structured array or None
+        Injection parameters of the job if inj is True.
+    """
+    # toplist, spacing and injection table are read from a single open of the file
+    with rf.weaveFile(weaveFilePath, freqDerivOrder, memmap=memmap) as weave:
+        spacing = weave.spacing
+        _outlier = thresholdRows(weave.toplist, mean2F_th, numTopListLimit)
+        saturated = len(_outlier) == numTopListLimit
+
+        injParam = None
+        if inj:
+            injParam = injParamTable(weave.injection).as_array()
+            # only follow up the loudest one which covering the injection to save the cost
+            _outlier = _outlier[:1]
+    return _outlier, spacing, saturated, injParam
+
+def _ingestJobStar(args):
+    return ingestJob(*args)
+
+def ingestJobs(weaveFilePathList, mean2F_th, numTopListLimit=1000, freqDerivOrder=2, inj=False, num_cpus=1, memmap=False):
+    """
+    Reads a list of Weave output files, either serially or with a process pool.
+
+    Parameters:
+    - weaveFilePathList: list of str
+        Weave output files, in job order.
+
+    - mean2F_th: float or numpy.ndarray
+        The mean 2F threshold, either one value for all jobs or one value per job.
+
+    - numTopListLimit: int, optional (default=1000)
+        Maximum number of top outliers to keep for each job.
+
+    - freqDerivOrder: int, optional (default=2)
+        The frequency derivative order used in the search.
+
+    - inj: bool, optional (default=False)
+        If True, also read the injection HDU of each job.
+
+    - num_cpus: int, optional (default=1)
+        Number of worker processes. 1 reads the files in the current process.
+
+    - memmap: bool, optional (default=False)
+        If True, memory-map each Weave output file.
+
+    Returns:
+    - results: list
+        One (outlier, spacing, saturated, injParam) tuple per job, in the order of weaveFilePathList.
+    """
+    nJobs = len(weaveFilePathList)
+    mean2F_th = np.broadcast_to(np.asarray(mean2F_th, dtype=float), (nJobs,))
+    args = [(f, th, numTopListLimit, freqDerivOrder, inj, memmap) for f, th in zip(weaveFilePathList, mean2F_th.tolist())]
+
+    if num_cpus is None or num_cpus <= 1 or nJobs <= 1:
+        return [_ingestJobStar(a) for a in tqdm(args)]
+
+    # imap keeps the job order, so the output does not depend on the number of workers
+    chunksize = max(1, nJobs // (4*num_cpus))
+    with Pool(processes=num_cpus) as pool:
+        results = list(tqdm(pool.imap(_ingestJobStar, args, chunksize=chunksize), total=nJobs))
+    return results
+
+class topKMerger():
+    """
+    Bounded global top-K of outliers, merged from many sorted toplists with a heap.
+    Memory stays O(K) whatever the number of jobs.
+    """
+    def __init__(self, K, freqDerivOrder=2):
+        self.K = K
+        self.freqDerivOrder = freqDerivOrder
+        self.heap = []
+        self.count = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def minMean2F(self):
+        # smallest mean2F a new row has to beat to enter the top-K
+        if len(self.heap) < self.K:
+            return -np.inf
+        return self.heap[0][0]
+
+    def push(self, rows, mean2F_th, spacing, tag=None):
+        """
+        Parameters:
+        - rows: numpy structured array
+            Toplist rows of one job, sorted by mean2F in descending order.
+
+        - mean2F_th: float
+            The mean 2F threshold of the job.
+
+        - spacing: dict
+            Template spacing of the job.
+
+        - tag: optional
+            Any label kept with the rows (e.g. the 1Hz band).
+        """
+        for i in range(len(rows)):
+            mean2F = float(rows['mean2F'][i])
+            if mean2F <= self.minMean2F():
+                break # the toplist is sorted, no later row can enter
+            entry = (mean2F, self.count, rows[i:i+1].copy(), mean2F_th, spacing, tag)
+            self.count += 1
+            if len(self.heap) < self.K:
+                heapq.heappush(self.heap, entry)
+            else:
+                heapq.heapreplace(self.heap, entry)
+
+    def result(self):
+        """
+        Returns:
+        - outliers: outlierAccumulator
+            The top-K rows sorted by mean2F in descending order.
+
+        - tags: list
+            The tag of each row.
+        """
+        outliers = outlierAccumulator(self.freqDerivOrder)
+        tags = []
+        for _, _, row, mean2F_th, spacing, tag in sorted(self.heap, key=lambda e: (-e[0], e[1])):
+            outliers.append(row, mean2F_th, spacing)
+            tags.append(tag)
+        return outliers, tags
+
+def streamJob(merger, weaveFilePath, mean2F_th, numTopListLimit=1000, freqDerivOrder=2, tag=None):
+    """
+    Pushes the rows of one Weave output file into a topKMerger, reading only the needed prefix of the toplist.
+
+    Parameters:
+    - merger: topKMerger
+        The running top-K.
+
+    - weaveFilePath: str
+        Path to the Weave output file.
+
+    - mean2F_th: float
+        The mean 2F threshold of the job.
+
+    - numTopListLimit: int, optional (default=1000)
+        Maximum number of toplist rows considered.
+
+    - freqDerivOrder: int, optional (default=2)
+        The frequency derivative order used in the search.
+
+    - tag: optional
+        Label kept with the rows of this job.
+    """
+    with rf.weaveFile(weaveFilePath, freqDerivOrder, memmap=True) as weave:
+        toplist = weave.toplist
+        nRows = min(merger.K, numTopListLimit, len(toplist))
+        if nRows == 0 or toplist['mean2F'][0] <= max(mean2F_th, merger.minMean2F()):
+            return # even the loudest row of this job cannot enter
+        rows = thresholdRows(toplist[:nRows], mean2F_th, nRows)
+        merger.push(rows, mean2F_th, weave.spacing, tag)
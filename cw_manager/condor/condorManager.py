@@ -4,9 +4,37 @@ from pathlib import Path
 from ..utils import filePath as fp
 from ..utils import setup_parameter as setup
 from ..utils import utils as utils
+from ..utils import resourceEstimator as rse
 from tqdm import tqdm
 import time
 
+class weaveArgTemplate():
+    """
+    Weave argument string of a band with the constant part already formatted (see condorManager.compileWeaveArgs).
+    """
+    def __init__(self, head, const, tail, columns):
+        self.fmt = head + const + tail
+        self.columns = columns
+
+    def render(self, jobIndex, params):
+        return self.fmt.format(jobIndex, *[params[key] for key in self.columns])
+
+    def renderAll(self, param, jobIndexStart=1):
+        """
+        Renders the argument strings of all rows of a parameter table.
+
+        Parameters:
+        - param: FITS_rec or numpy structured array
+            The search parameters, one row per job.
+
+        - jobIndexStart: int, optional (default=1)
+            Job index of the first row.
+        """
+        # whole columns are converted to Python floats at once instead of indexing each row
+        columns = [np.asarray(param[key]).tolist() for key in self.columns]
+        fmt = self.fmt.format
+        return [fmt(jobIndex, *row) for jobIndex, row in enumerate(zip(*columns), jobIndexStart)]
+
 class condorManager:
     def __init__(self, target, obsDay):
         self.obsDay = obsDay
@@ -14,12 +42,11 @@ class condorManager:
         self.target = target
     
     def weaveArgs(self, freq, params, taskName, sftFiles, jobIndex, OSG=True):
-        exe = fp.weaveExecutableFilePath()
-        metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
-        
-        resultFile = fp.weaveOutputFilePath(self.target, freq, taskName, jobIndex, self.stage)
-        utils.makeDir([resultFile])
-        
+        # argument string of a single job, see compileWeaveArgs to render many jobs of a band
+        return self.compileWeaveArgs(freq, taskName, sftFiles, OSG).render(jobIndex, params)
+
+    def weaveKwargs(self):
+        # Weave options shared by all jobs of a stage
         extraStats = "coh2F_det,mean2F,coh2F_det,mean2F_det"
         if self.nSeg != 1:
             kwargs = {"semi-max-mismatch": self.setup.semiMM,
@@ -30,44 +57,71 @@ class condorManager:
             kwargs = {"semi-max-mismatch": self.setup.semiMM,
                       "toplist-limit": self.numTopList,
                       "extra-statistics": extraStats}
+        return kwargs
+
+    def compileWeaveArgs(self, freq, taskName, sftFiles, OSG=True):
+        """
+        Builds the Weave argument template of a band. Everything that is the same for all jobs of the band
+        (SFT list, metric file, mismatch and toplist settings) is formatted once here; only the output file
+        and the sky/frequency parameters are filled in per job.
+
+        Parameters:
+        - freq: int
+            The 1Hz band.
+
+        - taskName: str
+            The task name of the band.
+
+        - sftFiles: list of str
+            SFT files of the band.
+
+        - OSG: bool, optional (default=True)
+            If True, render the DAG variables of the OSG submit file, otherwise the argList of the local one.
+
+        Returns:
+        - template: weaveArgTemplate
+        """
+        metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
         
-        argList = ("")
+        # all result files of the band are in the same directory
+        resultFile = fp.weaveOutputFilePath(self.target, freq, taskName, 0, self.stage)[:-1]
+        utils.makeDir([resultFile])
+        
+        kwargs = self.weaveKwargs()
+        
+        # per-job fields are {0} (job index), {1} alpha, {2} delta, then each phase parameter and its band
+        # (literal braces of the constant parts are escaped)
+        esc = lambda text: str(text).replace('{', '{{').replace('}', '}}')
         if not OSG:
-            argList+="argList= \"--output-file={0} ".format(resultFile)
-            argList+="--sft-files={0} ".format(';'.join([s for s in sftFiles]))
-            argList+="--setup-file={0} ".format(metric)
-            
+            head = "argList= \"--output-file={0}".format(esc(resultFile)) + "{0} "
+            const = "--sft-files={0} ".format(';'.join([s for s in sftFiles]))
+            const += "--setup-file={0} ".format(metric)
             for key, value in kwargs.items():  
-                argList+="--{0}={1} ".format(key,value)
-            #argList+="--alpha={0}/{1} ".format(params['alpha'], params['dalpha'])
-            #argList+="--delta={0}/{1} ".format(params['delta'], params['ddelta'])
-            argList+="--alpha={0}/{1} ".format(params['alpha'], self.target.dalpha)
-            argList+="--delta={0}/{1} ".format(params['delta'], self.target.ddelta)
-        
+                const += "--{0}={1} ".format(key,value)
+            tail = "--alpha={{1}}/{0} ".format(esc(self.target.dalpha))
+            tail += "--delta={{2}}/{0} ".format(esc(self.target.ddelta))
             for i in range(self.freqDerivOrder+1):
-                key1, key2 = self.freqParamName[i], self.freqDerivParamName[i]
-                argList+="--{0}={1}/{2} ".format(key1, params[key1], params[key2])
-            argList+="\""
+                tail += "--{0}={{{1}}}/{{{2}}} ".format(self.freqParamName[i], 3+2*i, 4+2*i)
+            tail += "\""
         else: # using OSG computing resources (different format for .sub file)
-            argList+="OUTPUTFILE=\"{0}\" ".format(Path(resultFile).name)
-            argList+="REMAPOUTPUTFILE=\"{0}\" ".format(resultFile)
-            argList+="SETUPFILE=\"{0}\" ".format(Path(metric).name)
+            head = "OUTPUTFILE=\"{0}".format(esc(Path(resultFile).name)) + "{0}\" "
+            head += "REMAPOUTPUTFILE=\"{0}".format(esc(resultFile)) + "{0}\" "
+            const = "SETUPFILE=\"{0}\" ".format(Path(metric).name)
             sft = ';'.join([Path(s).name for s in sftFiles])
-            argList+="SFTFILES=\"{0}\" ".format(sft)
+            const += "SFTFILES=\"{0}\" ".format(sft)
             inputFiles = ', '.join([s for s in sftFiles]) + ', ' + metric 
-            argList+="TRANSFERFILES=\"{0}\" ".format(inputFiles)
-            
+            const += "TRANSFERFILES=\"{0}\" ".format(inputFiles)
             for key, value in kwargs.items():
-                argList+="{0}=\"{1}\" ".format(key.replace('-', '').upper(),value)        
-            #argList+="ALPHA=\"{0}\" DALPHA=\"{1}\" ".format(params['alpha'], params['dalpha'])
-            #argList+="DELTA=\"{0}\" DDELTA=\"{1}\" ".format(params['delta'], params['ddelta'])
-            argList+="ALPHA=\"{0}\" DALPHA=\"{1}\" ".format(params['alpha'], self.target.dalpha)
-            argList+="DELTA=\"{0}\" DDELTA=\"{1}\" ".format(params['delta'], self.target.ddelta)
+                const += "{0}=\"{1}\" ".format(key.replace('-', '').upper(),value)        
+            tail = "ALPHA=\"{{1}}\" DALPHA=\"{0}\" ".format(esc(self.target.dalpha))
+            tail += "DELTA=\"{{2}}\" DDELTA=\"{0}\" ".format(esc(self.target.ddelta))
             for i in range(self.freqDerivOrder+1):
-                key1, key2 = self.freqParamName[i], self.freqDerivParamName[i]
-                argList+="{0}=\"{1}\" ".format(key1.upper(), params[key1])
-                argList+="{0}=\"{1}\" ".format(key2.upper(), params[key2])
-        return argList
+                tail += "{0}=\"{{{1}}}\" ".format(self.freqParamName[i].upper(), 3+2*i)
+                tail += "{0}=\"{{{1}}}\" ".format(self.freqDerivParamName[i].upper(), 4+2*i)
+        columns = ['alpha', 'delta']
+        for i in range(self.freqDerivOrder+1):
+            columns += [self.freqParamName[i], self.freqDerivParamName[i]]
+        return weaveArgTemplate(head, esc(const), tail, columns)
         
     def weaveArgStr(self): 
         if self.nSeg != 1:
@@ -85,34 +139,54 @@ class condorManager:
         
         return argListString
     
-    def writeSub(self, freq, taskName, crFiles, argStr, request_memory, OSG, OSDF):
+    def writeSub(self, freq, taskName, crFiles, argStr, request_memory, OSG, OSDF, request_disk='2GB'):
         exe = fp.weaveExecutableFilePath()
         metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
         # call function to write .sub files for search
         subFileName = fp.condorSubFilePath(self.target, freq, taskName, self.stage)
         Path(subFileName).unlink(missing_ok=True)
-        wc.writeSearchSub(subFileName, exe, False, crFiles[0], crFiles[1], crFiles[2], argStr, request_memory=request_memory, request_disk='2GB', OSG=OSG, OSDF=OSDF)
+        wc.writeSearchSub(subFileName, exe, False, crFiles[0], crFiles[1], crFiles[2], argStr, request_memory=request_memory, request_disk=request_disk, OSG=OSG, OSDF=OSDF)
         return subFileName
     
-# to do: move to utils
     def memoryUsage(self, stage):
-        if 'search' in stage:
-            if '1987'in self.target.name:
-                memory = '20GB'
-            else:
-                memory = '15GB'
-                
-        elif 'follow' in stage:
-            memory = '2GB'
-        else:
-            memory = '15GB'
-        return memory
+        return utils.memoryUsage(self.target, stage)
+
+    def requestResources(self, freq, request_memory=None, request_disk=None, defaultMemory=None):
+        """
+        Fills in the request_memory and request_disk that are not given, from the resource estimator trained on
+        past runs of this target and stage (see resourceEstimator.train), or from the defaults if there is none.
+
+        Parameters:
+        - freq: int
+            The 1Hz band.
+
+        - defaultMemory: str, optional (default=None)
+            request_memory without estimator. If None, memoryUsage of the stage.
+
+        Returns:
+        - request_memory, request_disk: str
+        """
+        estimator = rse.loadEstimator(self.target, self.cohDay, self.freqDerivOrder, self.stage)
+        if estimator is not None:
+            # the highest frequency of the band has the most templates
+            if request_memory is None:
+                request_memory = estimator.requestMemory(freq+1)
+            if request_disk is None:
+                metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
+                request_disk = estimator.requestDisk(freq, self.obsDay, metric)
+        if request_memory is None:
+            request_memory = defaultMemory if defaultMemory is not None else self.memoryUsage(self.stage)
+        if request_disk is None:
+            request_disk = '2GB'
+        return request_memory, request_disk
     
     
 ###### main use function
 
-    def makeSearchDag(self, cohDay, freq, param, numTopList, stage, freqDerivOrder, request_memory=None, OSG=False, OSDF=False):
+    def makeSearchDag(self, cohDay, freq, param, numTopList, stage, freqDerivOrder, request_memory=None, OSG=False, OSDF=False, queueFromTable=False, request_disk=None):
         t0 = time.time()
+        if queueFromTable:
+            return self.makeSearchQueue(cohDay, freq, param, numTopList, stage, freqDerivOrder, request_memory, OSG, OSDF, request_disk=request_disk)
         if OSDF and not OSG:
             print('Are you sure you want to read SFTs from OSDF but not using OSG computing resources?')
         self.freqParamName, self.freqDerivParamName = utils.phaseParamName(freqDerivOrder)
@@ -121,8 +195,7 @@ class condorManager:
         self.stage = stage
         self.cohDay, self.cohTime, self.nSeg, self.obsTime, self.refTime = utils.getTimeSetup(self.target.name, self.obsDay, cohDay)
         
-        if request_memory is None:
-            request_memory = self.memoryUsage(self.stage)
+        request_memory, request_disk = self.requestResources(freq, request_memory, request_disk)
         
         # call function to write .sub files for search
         taskName = utils.taskName(self.target, self.stage, self.cohDay, self.freqDerivOrder, freq)
@@ -135,18 +208,250 @@ class condorManager:
         utils.makeDir(crFiles)
 
         argStr = self.weaveArgStr()
-        subFileName = self.writeSub(freq, taskName, crFiles, argStr, request_memory=request_memory, OSG=OSG, OSDF=OSDF)
-        for jobIndex, params in enumerate(param, 1):
-            ######################## Argument string use to write to DAG  ########################
-            argList = self.weaveArgs(freq, params, taskName, sftFiles, jobIndex, OSG)
-            # Call function from WriteCondorFiles.py which will write DAG 
-            wc.writeSearchDag(dagFileName, taskName, subFileName, jobIndex, argList)
+        subFileName = self.writeSub(freq, taskName, crFiles, argStr, request_memory=request_memory, OSG=OSG, OSDF=OSDF, request_disk=request_disk)
+        ######################## Argument string use to write to DAG  ########################
+        argLists = self.compileWeaveArgs(freq, taskName, sftFiles, OSG).renderAll(param)
+        # the DAG is written once at the end of the with block
+        with wc.dagWriter(dagFileName) as dag:
+            for jobIndex, argList in enumerate(argLists, 1):
+                dag.addJob(taskName, subFileName, jobIndex, argList)
 
         print('Finish writing {0} dag files for {1} Hz'.format(self.stage, freq))
         print('Time used = {}s'.format(time.time()-t0))
         return dagFileName
 
 
+    def makeSearchQueue(self, cohDay, freq, param, numTopList, stage, freqDerivOrder, request_memory=None, OSG=False, OSDF=False, request_disk=None):
+        """
+        Same jobs as makeSearchDag, written as one submit file with 'queue ... from' an itemdata table
+        instead of one DAG node per job. The SFT list, metric file and Weave options are written once in the
+        submit file; each line of the table only has the job index, output file and sky/frequency parameters.
+        A DAG with a single node for the submit file is also written at the usual DAG path.
+        See readCondor.validateQueueTable to check it against the per-job DAG.
+
+        Returns:
+        - dagFileName: str
+        """
+        t0 = time.time()
+        if OSDF and not OSG:
+            print('Are you sure you want to read SFTs from OSDF but not using OSG computing resources?')
+        self.freqParamName, self.freqDerivParamName = utils.phaseParamName(freqDerivOrder)
+        self.freqDerivOrder = freqDerivOrder
+        self.numTopList = numTopList
+        self.stage = stage
+        self.cohDay, self.cohTime, self.nSeg, self.obsTime, self.refTime = utils.getTimeSetup(self.target.name, self.obsDay, cohDay)
+        
+        request_memory, request_disk = self.requestResources(freq, request_memory, request_disk)
+        
+        taskName = utils.taskName(self.target, self.stage, self.cohDay, self.freqDerivOrder, freq)
+        sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
+        metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
+        resultFile = fp.weaveOutputFilePath(self.target, freq, taskName, 0, self.stage)[:-1]
+        utils.makeDir([resultFile])
+        crFiles = fp.condorRecordFilePath(freq, self.target, taskName, self.stage)
+        utils.makeDir(crFiles)
+
+        # values shared by all jobs, as submit file macros
+        macros = {}
+        if OSG:
+            macros['SETUPFILE'] = Path(metric).name
+            macros['SFTFILES'] = ';'.join([Path(s).name for s in sftFiles])
+            macros['TRANSFERFILES'] = ', '.join([s for s in sftFiles]) + ', ' + metric
+        else:
+            macros['SETUPFILE'] = metric
+            macros['SFTFILES'] = ';'.join([s for s in sftFiles])
+        for key, value in self.weaveKwargs().items():
+            macros[key.replace('-', '').upper()] = value
+        macros['DALPHA'] = self.target.dalpha
+        macros['DDELTA'] = self.target.ddelta
+
+        # per-job values, one line of the table per job (the last column must not contain spaces or commas)
+        esc = lambda text: str(text).replace('{', '{{').replace('}', '}}')
+        if OSG:
+            queueVars = ['JobID', 'OUTPUTFILE', 'REMAPOUTPUTFILE']
+            head = '{0},' + esc(Path(resultFile).name) + '{0},' + esc(resultFile) + '{0},'
+        else:
+            queueVars = ['JobID', 'OUTPUTFILE']
+            head = '{0},' + esc(resultFile) + '{0},'
+        columns = ['alpha', 'delta']
+        queueVars += ['ALPHA', 'DELTA']
+        for i in range(self.freqDerivOrder+1):
+            columns += [self.freqParamName[i], self.freqDerivParamName[i]]
+            queueVars += [self.freqParamName[i].upper(), self.freqDerivParamName[i].upper()]
+        tail = ','.join(['{{{0}}}'.format(i) for i in range(1, len(columns)+1)])
+        itemLines = weaveArgTemplate(head, '', tail, columns).renderAll(param)
+
+        itemFileName = fp.itemDataFilePath(self.target, freq, taskName, self.stage)
+        utils.makeDir([itemFileName])
+        with open(itemFileName, 'w') as itemfile:
+            itemfile.write('\n'.join(itemLines) + '\n')
+
+        subFileName = fp.queueSubFilePath(self.target, freq, taskName, self.stage)
+        exe = fp.weaveExecutableFilePath()
+        wc.writeQueueSub(subFileName, exe, False, crFiles[0], crFiles[1], crFiles[2], self.weaveArgStr(), macros, queueVars, itemFileName,
+                         request_memory=request_memory, request_disk=request_disk, OSG=OSG, OSDF=OSDF)
+
+        dagFileName = fp.dagFilePath(freq, self.target, taskName, self.stage)
+        with wc.dagWriter(dagFileName) as dag:
+            dag.addLine('JOB {0} {1}'.format(taskName, subFileName))
+
+        print('Finish writing {0} queue table ({1} jobs) for {2} Hz'.format(self.stage, len(itemLines), freq))
+        print('Time used = {}s'.format(time.time()-t0))
+        return dagFileName
+
+    def packSize(self, rowRuntime, runtimeBudget, request_cpu=1, parallel=True):
+        """
+        Number of parameter rows packed into one job so that the job runs for about runtimeBudget.
+
+        Parameters:
+        - rowRuntime: float
+            Estimated runtime of the Weave search of one row (seconds).
+
+        - runtimeBudget: float
+            Target runtime of a packed job (seconds).
+
+        - request_cpu: int, optional (default=1)
+            Number of cores of the job.
+
+        - parallel: bool, optional (default=True)
+            If True, the rows of a job run request_cpu at a time, otherwise one after the other.
+        """
+        nRows = int(runtimeBudget // rowRuntime)
+        if parallel:
+            nRows *= request_cpu
+        return max(1, nRows)
+
+    def packedArgStr(self):
+        # arguments of packedJob.py on OSG: the per-row options are in the pack table, the shared ones follow '--'
+        argStr = ["sft-files", "setup-file"] + list(self.weaveKwargs().keys())
+        argListString = "--weave=$(WEAVE) --table=$(TABLE) --pack=$(JobID) --num_cpus=$(NUMCPUS) --out=$(OUTPREFIX) --err=$(ERRPREFIX) -- "
+        for s in argStr:
+            argListString += "--{0}=$({1}) ".format(s, s.replace('-', '').upper())
+        return argListString
+
+    def makePackedSearchDag(self, cohDay, freq, param, numTopList, stage, freqDerivOrder, rowRuntime=None, runtimeBudget=3600, request_cpu=1, parallel=True, request_memory=None, OSG=False, OSDF=False):
+        """
+        Same searches as makeSearchDag, with the parameter rows grouped into packs of N rows per Condor job, N
+        given by packSize. Each job runs packedJob.py, which runs the Weave search of each row of its pack
+        (request_cpu at a time if parallel, otherwise one after the other), so the SFTs and the metric file are
+        transferred once per pack. The result of each row is still written (or remapped on OSG) to
+        weaveOutputFilePath with the index of the row, as for one job per row, and so are its stdout/stderr to the
+        condorRecordFilePath files of the row; the Condor records of a pack k end with pack<k> instead.
+
+        Parameters:
+        - rowRuntime: float, optional (default=None)
+            Estimated runtime of the Weave search of one row (seconds). If None, predicted by the resource
+            estimator of the stage (see resourceEstimator.train).
+
+        - runtimeBudget: float, optional (default=3600)
+            Target runtime of a packed job (seconds).
+
+        - request_cpu: int, optional (default=1)
+            Number of cores of each job.
+
+        - parallel: bool, optional (default=True)
+            If True, run the rows of a pack request_cpu at a time.
+
+        - request_memory: str, optional (default=None)
+            Memory of each job. If None, the memory of a single search times the number of concurrent searches.
+
+        Returns:
+        - dagFileName: str
+        """
+        t0 = time.time()
+        if OSDF and not OSG:
+            print('Are you sure you want to read SFTs from OSDF but not using OSG computing resources?')
+        self.freqParamName, self.freqDerivParamName = utils.phaseParamName(freqDerivOrder)
+        self.freqDerivOrder = freqDerivOrder
+        self.numTopList = numTopList
+        self.stage = stage
+        self.cohDay, self.cohTime, self.nSeg, self.obsTime, self.refTime = utils.getTimeSetup(self.target.name, self.obsDay, cohDay)
+
+        num_cpus = request_cpu if parallel else 1
+        estimator = rse.loadEstimator(self.target, self.cohDay, self.freqDerivOrder, self.stage)
+        if rowRuntime is None:
+            if estimator is None:
+                raise ValueError('rowRuntime is needed when no resource estimator was trained for the {0} stage'.format(self.stage))
+            _, rowRuntime = estimator.predict(freq+1)
+        if request_memory is None:
+            memory, _ = self.requestResources(freq)
+            request_memory = '{0:g}GB'.format(float(memory[:-2])*num_cpus)
+        nRows = self.packSize(rowRuntime, runtimeBudget, request_cpu, parallel)
+
+        taskName = utils.taskName(self.target, self.stage, self.cohDay, self.freqDerivOrder, freq)
+        sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
+        metric = fp.weaveSetupFilePath(self.cohTime, self.nSeg, self.freqDerivOrder)
+        resultFile = fp.weaveOutputFilePath(self.target, freq, taskName, 0, self.stage)[:-1]
+        utils.makeDir([resultFile])
+        crFiles = fp.condorRecordFilePath(freq, self.target, taskName, self.stage)
+        utils.makeDir(crFiles)
+        # stdout/stderr of each row, followed by its job index, and the records of the packs
+        outPrefix, errPrefix = crFiles[0].replace('$(JobID)', ''), crFiles[1].replace('$(JobID)', '')
+        packFiles = [f.replace('$(JobID)', 'pack$(JobID)') for f in crFiles]
+
+        # one line per row: pack index, job index and the Weave options of the row
+        # (on OSG the result is written in the scratch directory and remapped)
+        esc = lambda text: str(text).replace('{', '{{').replace('}', '}}')
+        outputFile = resultFile if not OSG else Path(resultFile).name
+        head = "{0} --output-file=" + esc(outputFile) + "{0} "
+        tail = "--alpha={{1}}/{0} ".format(esc(self.target.dalpha))
+        tail += "--delta={{2}}/{0}".format(esc(self.target.ddelta))
+        columns = ['alpha', 'delta']
+        for i in range(self.freqDerivOrder+1):
+            tail += " --{0}={{{1}}}/{{{2}}}".format(self.freqParamName[i], 3+2*i, 4+2*i)
+            columns += [self.freqParamName[i], self.freqDerivParamName[i]]
+        rows = weaveArgTemplate(head, '', tail, columns).renderAll(param)
+        nJobs = len(rows)
+        packs = [range(start, min(start+nRows, nJobs)) for start in range(0, nJobs, nRows)]
+
+        tableFileName = fp.packTableFilePath(self.target, freq, taskName, self.stage)
+        utils.makeDir([tableFileName])
+        with open(tableFileName, 'w') as table:
+            for packIndex, pack in enumerate(packs, 1):
+                for i in pack:
+                    table.write('{0} {1}\n'.format(packIndex, rows[i]))
+
+        exe = fp.packedJobExecutableFilePath()
+        subFileName = fp.condorSubFilePath(self.target, freq, taskName, self.stage)
+        Path(subFileName).unlink(missing_ok=True)
+        wc.writeSearchSub(subFileName, exe, True, packFiles[0], packFiles[1], packFiles[2], self.packedArgStr(), request_memory=request_memory,
+                          request_disk='{0}GB'.format(2*num_cpus), request_cpu=request_cpu, OSG=OSG, OSDF=OSDF, outputRemaps='$(REMAPS)')
+
+        kwargs = self.weaveKwargs()
+        dagFileName = fp.dagFilePath(freq, self.target, taskName, self.stage)
+        Path(dagFileName).unlink(missing_ok=True)
+        with wc.dagWriter(dagFileName) as dag:
+            if not OSG:
+                head = "argList=\"--weave={0} --table={1} --pack=".format(fp.weaveExecutableFilePath(), tableFileName)
+                tail = " --num_cpus={0} --out={1} --err={2} -- ".format(num_cpus, outPrefix, errPrefix)
+                tail += "--sft-files={0} --setup-file={1} ".format(';'.join(sftFiles), metric)
+                for key, value in kwargs.items():
+                    tail += "--{0}={1} ".format(key, value)
+                tail += "\""
+                for packIndex, pack in enumerate(packs, 1):
+                    dag.addJob(taskName, subFileName, packIndex, head + str(packIndex) + tail)
+            else:
+                const = "WEAVE=\"{0}\" TABLE=\"{1}\" NUMCPUS=\"{2}\" ".format(fp.weaveExecutableFilePath(), Path(tableFileName).name, num_cpus)
+                const += "OUTPREFIX=\"{0}\" ERRPREFIX=\"{1}\" ".format(Path(outPrefix).name, Path(errPrefix).name)
+                const += "SETUPFILE=\"{0}\" ".format(Path(metric).name)
+                const += "SFTFILES=\"{0}\" ".format(';'.join([Path(s).name for s in sftFiles]))
+                const += "TRANSFERFILES=\"{0}\" ".format(', '.join(sftFiles + [metric, tableFileName]))
+                for key, value in kwargs.items():
+                    const += "{0}=\"{1}\" ".format(key.replace('-', '').upper(), value)
+                for packIndex, pack in enumerate(packs, 1):
+                    # the results and the logs of the rows of the pack keep the name they would have with one job per row
+                    outputFiles, remaps = [], []
+                    for prefix in [resultFile, outPrefix, errPrefix]:
+                        outputFiles += [Path(prefix).name + str(i+1) for i in pack]
+                        remaps += ['{0}{1}={2}{1}'.format(Path(prefix).name, i+1, prefix) for i in pack]
+                    outputFiles, remaps = ','.join(outputFiles), ';'.join(remaps)
+                    argList = const + "OUTPUTFILE=\"{0}\" REMAPS=\"{1}\"".format(outputFiles, remaps)
+                    dag.addJob(taskName, subFileName, packIndex, argList)
+
+        print('Finish writing {0} dag files for {1} Hz: {2} rows in {3} jobs of {4} rows'.format(self.stage, freq, nJobs, len(packs), nRows))
+        print('Time used = {}s'.format(time.time()-t0))
+        return dagFileName
+
     ############################ have to review
     def analyzeResultArgStr(self): 
         argStr = ["target", "obsDay", "cohDay", "stage", "freq", "freqDerivOrder", "numTopList", "df1dot", "cluster"]
@@ -185,12 +490,12 @@ class condorManager:
         
         dagFileName = fp.dagFilePath(taskName, self.target, taskName, self.stage)
         Path(dagFileName).unlink(missing_ok=True)
-        for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
-            # call function to write .sub files for analyze result
-            ######################## Argument string use to write to DAG  ########################
-            argList = self.analyzeResultArgs(freq, freq+1, df1dot, cluster=cluster, OSG=False)
-            # Call function from WriteCondorFiles.py which will write DAG 
-            wc.writeSearchDag(dagFileName, taskName, subFileName, jobIndex, argList)
+        with wc.dagWriter(dagFileName) as dag:
+            for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
+                # call function to write .sub files for analyze result
+                ######################## Argument string use to write to DAG  ########################
+                argList = self.analyzeResultArgs(freq, freq+1, df1dot, cluster=cluster, OSG=False)
+                dag.addJob(taskName, subFileName, jobIndex, argList)
         print('Finish writing {0} dag files for {1} Hz'.format(self.stage, freq))
         return dagFileName
 
@@ -214,7 +519,7 @@ class condorManager:
             argList = ("--injections={{{0}}}".format(injParamStr))
         return argList
     
-    def makeInjectionDag(self, cohDay, freq, param, injParam, numTopList=1000, stage='search', request_memory='2GB', freqDerivOrder=2, injFreqDerivOrder=4, OSG=False, OSDF=False):
+    def makeInjectionDag(self, cohDay, freq, param, injParam, numTopList=1000, stage='search', request_memory=None, freqDerivOrder=2, injFreqDerivOrder=4, OSG=False, OSDF=False, request_disk=None):
         if OSDF and not OSG:
             print('Are you sure you want to read SFTs from OSDF but not using OSG computing resources?')
         self.freqParamName, self.freqDerivParamName = utils.phaseParamName(freqDerivOrder)
@@ -236,19 +541,21 @@ class condorManager:
         utils.makeDir(crFiles)
 
         argStr = self.weaveArgStr() + self.injectionArgStr()
-        subFileName = self.writeSub(freq, taskName, crFiles, argStr, request_memory=request_memory, OSG=OSG, OSDF=OSDF)
+        request_memory, request_disk = self.requestResources(freq, request_memory, request_disk, defaultMemory='2GB')
+        subFileName = self.writeSub(freq, taskName, crFiles, argStr, request_memory=request_memory, OSG=OSG, OSDF=OSDF, request_disk=request_disk)
         
         #injParamName = injParamList[str(freq)].columns.names
         injParamName = self.injParamName
-        for jobIndex, (searchParam, injParam) in enumerate(zip(param, injParam), 1):
-            ######################## Argument string use to write to DAG  ########################
-            if not OSG:
-                argList = self.weaveArgs(freq, searchParam, taskName, sftFiles, jobIndex, OSG)[:-1]
-                argList += self.injectionArg(injParamName, injParam, OSG) + '\"'
-            else:
-                argList = self.weaveArgs(freq, searchParam, taskName, sftFiles, jobIndex, OSG) + self.injectionArg(injParamName, injParam, OSG)
-            # Call function from WriteCondorFiles.py which will write DAG 
-            wc.writeSearchDag(dagFileName, taskName, subFileName, jobIndex, argList)
+        argLists = self.compileWeaveArgs(freq, taskName, sftFiles, OSG).renderAll(param)
+        with wc.dagWriter(dagFileName) as dag:
+            for jobIndex, (argList, injParam) in enumerate(zip(argLists, injParam), 1):
+                ######################## Argument string use to write to DAG  ########################
+                if not OSG:
+                    argList = argList[:-1]
+                    argList += self.injectionArg(injParamName, injParam, OSG) + '\"'
+                else:
+                    argList = argList + self.injectionArg(injParamName, injParam, OSG)
+                dag.addJob(taskName, subFileName, jobIndex, argList)
         print('Finish writing {0} dag files for {1} Hz'.format(self.stage, freq))
         return dagFileName
         
@@ -69,28 +69,30 @@ class followupManager:
         dagFileName = fp.dagFilePath('', self.target, taskName, stage)
         Path(dagFileName).unlink(missing_ok=True)
         
-        for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
-            taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
-            exe = fp.followUpExecutableFilePath()
-            local_exe = Path(exe).name
-            subFileName = fp.condorSubFilePath(self.target, freq, taskName, stage)
-            Path(subFileName).unlink(missing_ok=True)
+        # the DAG is written once at the end of the with block
+        with wc.dagWriter(dagFileName) as dag:
+            for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
+                taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+                exe = fp.followUpExecutableFilePath()
+                local_exe = Path(exe).name
+                subFileName = fp.condorSubFilePath(self.target, freq, taskName, stage)
+                Path(subFileName).unlink(missing_ok=True)
             
-            crFiles = fp.condorRecordFilePath(freq, self.target, taskName, stage)
-            utils.makeDir(crFiles)
+                crFiles = fp.condorRecordFilePath(freq, self.target, taskName, stage)
+                utils.makeDir(crFiles)
             
-            image = fp.imageFilePath(OSDF)
-            image = Path(image).name
-            sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
+                image = fp.imageFilePath(OSDF)
+                image = Path(image).name
+                sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
             
-            argList = self.followUpArgs(h0, cohDay, freq, stage, freqDerivOrder, numTopList, sftFiles, request_cpu, real, inj, cluster, workInLocalDir)
-            wc.writeSearchSub(subFileName, local_exe, True, crFiles[0], crFiles[1], crFiles[2], argList, request_memory='4GB', request_disk=request_disk, request_cpu=request_cpu, OSG=OSG, OSDF=OSDF, image=image)
+                argList = self.followUpArgs(h0, cohDay, freq, stage, freqDerivOrder, numTopList, sftFiles, request_cpu, real, inj, cluster, workInLocalDir)
+                wc.writeSearchSub(subFileName, local_exe, True, crFiles[0], crFiles[1], crFiles[2], argList, request_memory='4GB', request_disk=request_disk, request_cpu=request_cpu, OSG=OSG, OSDF=OSDF, image=image)
             
-           # call function to write .sub files for analyze result
-            ######################## Argument string use to write to DAG  ########################        
-            argList = self.transferFileArgs(exe, configFile, cohDay, freq, freqDerivOrder, stage, sftFiles, old_stage, cluster, OSG, OSDF, fromSaturatedBand)
+               # call function to write .sub files for analyze result
+                ######################## Argument string use to write to DAG  ########################        
+                argList = self.transferFileArgs(exe, configFile, cohDay, freq, freqDerivOrder, stage, sftFiles, old_stage, cluster, OSG, OSDF, fromSaturatedBand)
                              
-            # Call function from WriteCondorFiles.py which will write DAG 
-            wc.writeSearchDag(dagFileName, taskName, subFileName, jobIndex, argList)
+                dag.addJob(taskName, subFileName, jobIndex, argList)
         print('Finish writing follow-up dag from {0} stage for {1}-{2}Hz'.format(stage, fmin, fmax))
+        return dagFileName
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Runs several Weave searches in one Condor job (see condorManager.makePackedSearchDag).
+# Standalone on purpose (standard library only): it is the executable transferred to the execute node.
+#
+# Usage:
+#   packedJob.py --weave=<lalpulsar_Weave> --table=<pack table> --pack=<k> --num_cpus=<n> --out=<prefix> --err=<prefix>
+#                -- <Weave options shared by all rows>
+#
+# Each line of the pack table is '<pack index> <job index> <Weave options of the row ...>'; only the lines of pack k are run.
+# The stdout/stderr of each row go to <out prefix><job index> and <err prefix><job index>, the files a job of one row
+# would have as Condor records, so the template counts and completion-loop lines are read the same way.
+import argparse
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+def readPack(tableFileName, pack):
+    rows = []
+    with open(tableFileName) as table:
+        for line in table:
+            words = line.split()
+            if len(words) >= 2 and words[0] == str(pack):
+                rows.append((words[1], words[2:]))
+    return rows
+
+def outputFile(rowArgs):
+    for arg in rowArgs:
+        if arg.startswith('--output-file='):
+            return arg.split('=', 1)[1]
+    return None
+
+def runRow(weave, commonArgs, outPrefix, errPrefix, jobIndex, rowArgs):
+    resultFile = outputFile(rowArgs)
+    outFilePath, errFilePath = outPrefix + jobIndex, errPrefix + jobIndex
+    # a row finished before an eviction is not run again (its log files are kept, and exist for the transfer)
+    if resultFile is not None and Path(resultFile).exists():
+        print('Exists: {0}'.format(resultFile), flush=True)
+        open(outFilePath, 'a').close()
+        open(errFilePath, 'a').close()
+        return jobIndex, 0, 0.0
+    t0 = time.time()
+    command = [weave] + commonArgs + rowArgs
+    with open(outFilePath, 'w') as out, open(errFilePath, 'w') as err:
+        returncode = subprocess.run(command, stdout=out, stderr=err, stdin=subprocess.DEVNULL).returncode
+    dt = time.time() - t0
+    print('job {0}: exit status {1} after {2:.1f}s'.format(jobIndex, returncode, dt), flush=True)
+    if returncode != 0:
+        print(' '.join(shlex.quote(c) for c in command), file=sys.stderr)
+        print('see {0}'.format(errFilePath), file=sys.stderr, flush=True)
+    return jobIndex, returncode, dt
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commonArgs = []
+    if '--' in argv:
+        commonArgs = argv[argv.index('--')+1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(description='Run the Weave searches of one pack.')
+    parser.add_argument('--weave', required=True)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--pack', required=True)
+    parser.add_argument('--num_cpus', type=int, default=1)
+    parser.add_argument('--out', required=True, help='prefix of the stdout file of each row, followed by its job index')
+    parser.add_argument('--err', required=True, help='prefix of the stderr file of each row, followed by its job index')
+    args = parser.parse_args(argv)
+
+    rows = readPack(args.table, args.pack)
+    print('{0} searches in pack {1}, {2} at a time'.format(len(rows), args.pack, args.num_cpus), flush=True)
+    with ThreadPoolExecutor(max_workers=max(1, args.num_cpus)) as pool:
+        results = list(pool.map(lambda row: runRow(args.weave, commonArgs, args.out, args.err, *row), rows))
+
+    failed = [jobIndex for jobIndex, status, _ in results if status != 0]
+    print('{0} of {1} searches done in {2:.1f}s'.format(len(rows)-len(failed), len(rows), sum(dt for _, _, dt in results)), flush=True)
+    if failed:
+        print('failed jobs: {0}'.format(' '.join(failed)), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# Builder of the DAG of a whole frequency range: the DAG of each 1Hz band is written by a worker process
+# (with the usual condorManager / followUpManager / upperLimitManager functions) and the band DAGs are
+# stitched into one top-level DAG with SPLICE or SUBDAG EXTERNAL
+import os
+import time
+from multiprocessing import Pool
+from tqdm import tqdm
+from . import writeCondor as wc
+from .condorManager import condorManager
+from .followUpManager import followupManager
+from .upperLimitManager import upperLimitManager
+from ..analysis.bandDriver import loadTarget, _targetRef
+from ..genParam.initialSearchParam import initSearchParams
+from ..genParam.injectionParam1Hz import injectionParams
+from ..utils import filePath as fp
+
+def _searchBand(target, obsDay, freq, kwargs):
+    kwargs = dict(kwargs)
+    df1dot, df2dot = kwargs.pop('df1dot', 1e-9), kwargs.pop('df2dot', 1e-19)
+    balance = kwargs.pop('balance', False)
+    param = initSearchParams(freqDerivOrder=kwargs['freqDerivOrder']).genParam(target, freq, freq+1, df1dot=df1dot, df2dot=df2dot, balance=balance)
+    return condorManager(target, obsDay).makeSearchDag(freq=freq, param=param[str(freq)].data, **kwargs)
+
+def _injectionBand(target, obsDay, freq, kwargs):
+    kwargs = dict(kwargs)
+    genKwargs = {key: kwargs.pop(key) for key in ['nBands', 'nInj', 'nAmp'] if key in kwargs}
+    # range of the non-saturated band list the injection frequencies are drawn from
+    genKwargs['fmin'], genKwargs['fmax'] = kwargs.pop('nonSatFmin'), kwargs.pop('nonSatFmax')
+    for key in ['injFreqDerivOrder', 'freqDerivOrder', 'stage']:
+        if key in kwargs:
+            genKwargs[key] = kwargs[key]
+    # each band has its own generator: [seed, freq] is reproducible, no seed draws fresh entropy in every worker
+    seed = kwargs.pop('seed', None)
+    seed = None if seed is None else [seed, freq]
+    param, injParam = injectionParams(target, obsDay, kwargs['cohDay'], seed=seed).genParam(freq, **genKwargs)
+    return condorManager(target, obsDay).makeInjectionDag(freq=freq, param=param[str(freq)].data, injParam=injParam[str(freq)].data, **kwargs)
+
+def _followUpBand(target, obsDay, freq, kwargs):
+    return followupManager(target, obsDay).makeFollowUpDag(fmin=freq, fmax=freq+1, **kwargs)
+
+def _upperLimitBand(target, obsDay, freq, kwargs):
+    return upperLimitManager(target, obsDay).makeUpperLimitDag(fmin=freq, fmax=freq+1, **kwargs)
+
+# DAG of a single band, called with keyword arguments of the manager function (without freq, or fmin/fmax)
+bandBuilders = {'search': _searchBand,
+                'injection': _injectionBand,
+                'followUp': _followUpBand,
+                'upperLimit': _upperLimitBand}
+
+def _buildBand(args):
+    kind, target, obsDay, freq, kwargs = args
+    if isinstance(target, str):
+        target = loadTarget(target)
+    t0 = time.time()
+    try:
+        dagFileName = bandBuilders[kind](target, obsDay, freq, kwargs)
+    except Exception as e:
+        return freq, None, '{0}: {1}'.format(type(e).__name__, e), time.time()-t0, 0
+    return freq, dagFileName, None, time.time()-t0, os.path.getsize(dagFileName)
+
+def makeRangeDag(target, obsDay, fmin, fmax, kind, stage, num_cpus=1, mode='SPLICE', **kwargs):
+    """
+    Writes the DAG of every 1Hz band in [fmin, fmax) in a process pool and a top-level DAG including them.
+
+    Parameters:
+    - target: module
+        The search target.
+
+    - obsDay: int
+        The number of observation days.
+
+    - fmin, fmax: int
+        The 1Hz bands fmin, fmin+1, ..., fmax-1 are processed.
+
+    - kind: str
+        'search' (condorManager.makeSearchDag), 'injection' (condorManager.makeInjectionDag),
+        'followUp' (followupManager.makeFollowUpDag) or 'upperLimit' (upperLimitManager.makeUpperLimitDag).
+
+    - stage: str
+        The stage of the analysis, also passed to the band builder.
+
+    - num_cpus: int, optional (default=1)
+        Number of bands written at the same time. Each worker holds the whole DAG of its band in memory
+        (a few hundred MB for an initial search band with OSG transfer lists), which limits num_cpus.
+
+    - mode: str, optional (default='SPLICE')
+        'SPLICE' to merge the band DAGs into the top-level DAG, 'SUBDAG' to run each of them as an external sub-DAG.
+
+    - kwargs:
+        Keyword arguments of the band builder, except freq (fmin and fmax for 'followUp' and 'upperLimit').
+        'search' also takes df1dot, df2dot and balance for the parameter table (see initSearchParams.genParam); 'injection' also takes nBands, nInj,
+        nAmp of injectionParams.genParam, nonSatFmin, nonSatFmax for the range of its non-saturated
+        band list (default: fmin, fmax) and seed (the injections of a band are drawn with the seed [seed, freq]).
+
+    Returns:
+    - dagFileName: str
+        The top-level DAG.
+
+    - report: list of tuple
+        (freq, DAG file, generation time [s], DAG size [bytes]) of each band.
+
+    - failed: dict
+        Error message of each band whose DAG could not be written.
+    """
+    if kind not in bandBuilders:
+        raise ValueError('Unknown kind {0}, expected one of {1}'.format(kind, list(bandBuilders)))
+    if mode not in ('SPLICE', 'SUBDAG'):
+        raise ValueError('Unknown mode {0}, expected SPLICE or SUBDAG'.format(mode))
+    t0 = time.time()
+    kwargs['stage'] = stage
+    if kind == 'injection':
+        kwargs.setdefault('nonSatFmin', fmin)
+        kwargs.setdefault('nonSatFmax', fmax)
+    # higher bands have more jobs, so they go first and the last tasks in the pool are the short ones
+    freqs = list(range(fmin, fmax))[::-1]
+    args = [(kind, _targetRef(target), obsDay, freq, kwargs) for freq in freqs]
+
+    if num_cpus is None or num_cpus <= 1 or len(args) <= 1:
+        results = [_buildBand(a) for a in tqdm(args)]
+    else:
+        with Pool(processes=num_cpus) as pool:
+            results = list(tqdm(pool.imap_unordered(_buildBand, args, chunksize=1), total=len(args)))
+
+    report, failed = [], {}
+    for freq, dagFileName, error, dt, size in sorted(results):
+        if error is not None:
+            failed[freq] = error
+            print('Failed {0} Hz: {1}'.format(freq, error))
+        else:
+            report.append((freq, dagFileName, dt, size))
+
+    dagFileName = fp.rangeDagFilePath(target, fmin, fmax, stage)
+    with wc.dagWriter(dagFileName) as dag:
+        for freq, bandDagFileName, _, _ in report:
+            if mode == 'SPLICE':
+                dag.addLine('SPLICE band{0} {1}'.format(freq, bandDagFileName))
+            else:
+                dag.addLine('SUBDAG EXTERNAL band{0} {1}'.format(freq, bandDagFileName))
+
+    reportFileName = fp.rangeDagReportFilePath(target, fmin, fmax, stage)
+    with open(reportFileName, 'w') as file:
+        file.write('#freq(Hz)\ttime(s)\tsize(bytes)\tdag\n')
+        for freq, bandDagFileName, dt, size in report:
+            file.write('{0}\t{1:.2f}\t{2}\t{3}\n'.format(freq, dt, size, bandDagFileName))
+
+    totalSize = sum(size for _, _, _, size in report)
+    slowest = max(report, key=lambda r: r[2]) if report else None
+    print('Finish writing {0} dag for {1}-{2}Hz: {3} bands, {4} failed, {5:.1f} MB of DAG files'.format(
+        stage, fmin, fmax, len(report), len(failed), totalSize/1024**2))
+    if slowest is not None:
+        print('Slowest band: {0} Hz ({1:.1f}s); report written to {2}'.format(slowest[0], slowest[2], reportFileName))
+    print('Time used = {}s'.format(time.time()-t0))
+    return dagFileName, report, failed
@@ -0,0 +1,137 @@
+# Reader for the DAG and submit files written by writeCondor, used to check that different output modes
+# (one DAG node per job, or one submit file with 'queue ... from' a table) describe the same jobs
+import re
+
+varsPattern = re.compile(r'(\w+)\s*=\s*"((?:[^"\\]|\\.)*)"')
+macroPattern = re.compile(r'\$\((\w+)\)')
+
+def parseDag(dagFileName):
+    """
+    Returns the nodes of a DAG file as a dict: node name -> {'subFile': str, 'vars': dict}.
+    """
+    nodes = {}
+    with open(dagFileName) as dagfile:
+        for line in dagfile:
+            words = line.split(None, 2)
+            if len(words) < 2:
+                continue
+            if words[0].upper() == 'JOB':
+                nodes[words[1]] = {'subFile': line.split()[2], 'vars': {}}
+            elif words[0].upper() == 'VARS':
+                nodes[words[1]]['vars'].update(varsPattern.findall(words[2]) if len(words) > 2 else [])
+    return nodes
+
+def parseSub(subFileName):
+    """
+    Returns the commands of a submit file (keys in lower case, macros as written) and its queue statement.
+    """
+    commands = {}
+    queue = None
+    with open(subFileName) as subfile:
+        for line in subfile:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.lower().startswith('queue'):
+                queue = line[5:].strip()
+                continue
+            if '=' in line:
+                key, value = line.split('=', 1)
+                commands[key.strip()] = value.strip()
+    return commands, queue
+
+def expand(text, macros, depth=10):
+    # $(NAME) substitution as done by condor_submit; case-insensitive, unknown macros are left as they are
+    lower = {k.lower(): v for k, v in macros.items()}
+    for _ in range(depth):
+        new = macroPattern.sub(lambda m: str(lower.get(m.group(1).lower(), m.group(0))), text)
+        if new == text:
+            break
+        text = new
+    return text
+
+def jobDescription(commands, macros):
+    # the parts of a job that matter to Weave and to the file transfer
+    get = lambda key: expand(commands.get(key, ''), macros)
+    arguments = get('arguments')
+    if arguments.startswith('"') and arguments.endswith('"'):
+        arguments = arguments[1:-1]
+    return {'arguments': arguments.split(),
+            'executable': get('executable'),
+            'transfer_input_files': [s.strip() for s in get('transfer_input_files').split(',') if s.strip()],
+            'transfer_output_files': get('transfer_output_files'),
+            'transfer_output_remaps': get('transfer_output_remaps'),
+            'output': get('output'),
+            'error': get('error'),
+            'log': get('log')}
+
+def dagJobs(dagFileName):
+    """
+    Returns the jobs of a DAG with one node per job as a dict: JobID -> job description.
+    """
+    jobs = {}
+    subCache = {}
+    for name, node in parseDag(dagFileName).items():
+        if node['subFile'] not in subCache:
+            subCache[node['subFile']] = parseSub(node['subFile'])[0]
+        commands = subCache[node['subFile']]
+        macros = dict(commands)
+        macros.update(node['vars'])
+        jobs[node['vars'].get('JobID', name)] = jobDescription(commands, macros)
+    return jobs
+
+def queueJobs(subFileName):
+    """
+    Returns the jobs of a submit file with 'queue var1,var2,... from itemFile' as a dict: JobID -> job description.
+    """
+    commands, queue = parseSub(subFileName)
+    match = re.match(r'(.*?)\s+from\s+(\S+)$', queue or '')
+    if match is None:
+        raise ValueError('{0} has no "queue ... from" statement'.format(subFileName))
+    queueVars = [v.strip() for v in re.split(r'[,\s]+', match.group(1).strip()) if v.strip()]
+    itemFileName = match.group(2)
+
+    jobs = {}
+    with open(itemFileName) as itemfile:
+        for line in itemfile:
+            line = line.strip()
+            if not line:
+                continue
+            # items are split on commas and/or spaces, the last variable takes the rest of the line
+            values = re.split(r'[,\s]+', line, maxsplit=len(queueVars)-1)
+            if len(values) != len(queueVars):
+                raise ValueError('{0}: expected {1} items, got {2}: {3}'.format(itemFileName, len(queueVars), len(values), line))
+            macros = dict(commands)
+            macros.update(zip(queueVars, values))
+            jobs[macros.get('JobID')] = jobDescription(commands, macros)
+    return jobs
+
+def validateQueueTable(dagFileName, subFileName):
+    """
+    Checks that a queue-from-table submit file describes the same jobs as a DAG with one node per job.
+
+    Parameters:
+    - dagFileName: str
+        DAG written by condorManager.makeSearchDag.
+
+    - subFileName: str
+        Submit file written by condorManager.makeSearchQueue.
+
+    Returns:
+    - mismatch: list of str
+        Description of each difference, empty if both describe the same jobs.
+    """
+    dag = dagJobs(dagFileName)
+    table = queueJobs(subFileName)
+    mismatch = []
+    for jobID in sorted(set(dag) | set(table), key=lambda j: (len(str(j)), str(j))):
+        if jobID not in table:
+            mismatch.append('job {0} missing in the queue table'.format(jobID))
+        elif jobID not in dag:
+            mismatch.append('job {0} missing in the DAG'.format(jobID))
+        else:
+            for key, value in dag[jobID].items():
+                if table[jobID][key] != value:
+                    mismatch.append('job {0}: {1} differs'.format(jobID, key))
+    print('{0} jobs in the DAG, {1} in the queue table, {2} differences'.format(len(dag), len(table), len(mismatch)))
+    return mismatch
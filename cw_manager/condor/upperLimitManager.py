@@ -58,28 +58,30 @@ class upperLimitManager:
         dagFileName = fp.dagFilePath('', self.target, taskName, stage)
         Path(dagFileName).unlink(missing_ok=True)
         
-        for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
-            taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
-            exe = fp.upperLimitExecutableFilePath()
-            exe = Path(exe).name
-            subFileName = fp.condorSubFilePath(self.target, freq, taskName, stage)
-            Path(subFileName).unlink(missing_ok=True)
+        # the DAG is written once at the end of the with block
+        with wc.dagWriter(dagFileName) as dag:
+            for jobIndex, freq in tqdm(enumerate(range(fmin, fmax), 1)):
+                taskName = utils.taskName(self.target, stage, cohDay, freqDerivOrder, freq)
+                exe = fp.upperLimitExecutableFilePath()
+                exe = Path(exe).name
+                subFileName = fp.condorSubFilePath(self.target, freq, taskName, stage)
+                Path(subFileName).unlink(missing_ok=True)
             
-            crFiles = fp.condorRecordFilePath(freq, self.target, taskName, stage)
-            utils.makeDir(crFiles)
+                crFiles = fp.condorRecordFilePath(freq, self.target, taskName, stage)
+                utils.makeDir(crFiles)
             
-            image = fp.imageFilePath()
-            image = Path(image).name
-            sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
-            est_sftFiles = utils.sftEnsemble(freq, cohDay, OSDF=OSDF)
-            argList = self.upperLimitArgs(cohDay, freq, stage, freqDerivOrder, numTopList, nInj, skyUncertainty, num_cpus, sftFiles, est_sftFiles, cluster, workInLocalDir, OSDF)
-            wc.writeSearchSub(subFileName, exe, True, crFiles[0], crFiles[1], crFiles[2], argList, request_memory=request_memory, request_disk=request_disk, OSG=OSG, OSDF=OSDF, image=image)
+                image = fp.imageFilePath()
+                image = Path(image).name
+                sftFiles = utils.sftEnsemble(freq, self.obsDay, OSDF=OSDF)
+                est_sftFiles = utils.sftEnsemble(freq, cohDay, OSDF=OSDF)
+                argList = self.upperLimitArgs(cohDay, freq, stage, freqDerivOrder, numTopList, nInj, skyUncertainty, num_cpus, sftFiles, est_sftFiles, cluster, workInLocalDir, OSDF)
+                wc.writeSearchSub(subFileName, exe, True, crFiles[0], crFiles[1], crFiles[2], argList, request_memory=request_memory, request_disk=request_disk, OSG=OSG, OSDF=OSDF, image=image)
             
-           # call function to write .sub files for analyze result
-            ######################## Argument string use to write to DAG  ########################        
-            argList = self.transferFileArgs(cohDay, freq, freqDerivOrder, stage, sftFiles, est_sftFiles, cluster, OSG)
+               # call function to write .sub files for analyze result
+                ######################## Argument string use to write to DAG  ########################        
+                argList = self.transferFileArgs(cohDay, freq, freqDerivOrder, stage, sftFiles, est_sftFiles, cluster, OSG)
                              
-            # Call function from WriteCondorFiles.py which will write DAG 
-            wc.writeSearchDag(dagFileName, taskName, subFileName, jobIndex, argList)
+                dag.addJob(taskName, subFileName, jobIndex, argList)
         print('Finish writing upper limit dag from {0} stage for {1}-{2}Hz'.format(stage, fmin, fmax))
+        return dagFileName
 
@@ -1,7 +1,8 @@
+import os
 from pathlib import Path
 from ..utils import setup_parameter as setup 
 
-def writeSearchSub(subFileName, executablePath, transfer_executable, outputPath, errorPath, logPath, argListString, request_memory='15GB', request_disk='3GB', request_cpu=1, OSG=True, OSDF=False, image=None):
+def writeSearchSub(subFileName, executablePath, transfer_executable, outputPath, errorPath, logPath, argListString, request_memory='15GB', request_disk='3GB', request_cpu=1, OSG=True, OSDF=False, image=None, outputRemaps='$(OUTPUTFILE)=$(REMAPOUTPUTFILE)'):
     #Check if directory for production files exists. If not, create it.
     Path(Path(subFileName).resolve().parent).mkdir(parents=True, exist_ok=True)
     with open(subFileName, 'w') as subfile:
@@ -36,13 +37,53 @@ def writeSearchSub(subFileName, executablePath, transfer_executable, outputPath,
             subfile.write('transfer_executable={0}\n'.format(str(transfer_executable)))
             subfile.write('transfer_input_files = $(TRANSFERFILES)\n')
             subfile.write('transfer_output_files = $(OUTPUTFILE)\n')
-            subfile.write('transfer_output_remaps = "$(OUTPUTFILE)=$(REMAPOUTPUTFILE)"\n\n')
+            subfile.write('transfer_output_remaps = "{0}"\n\n'.format(outputRemaps))
             if OSDF:
                 subfile.write('use_oauth_services = scitokens\n') # using OSDF namespace to save SFT files
             #subfile.write('igwn_oauth_permissions = read:/staging \n') # using OSDF namespace to save SFT files
         subfile.write('queue 1')
     return 0
 
+def writeQueueSub(subFileName, executablePath, transfer_executable, outputPath, errorPath, logPath, argListString, macros, queueVars, itemFileName, request_memory='15GB', request_disk='3GB', request_cpu=1, OSG=True, OSDF=False, image=None):
+    # Same job description as writeSearchSub, for a submit file that queues one job per line of an itemdata file.
+    # The values shared by all jobs are written once as macros, the per-job values come from the table.
+    Path(Path(subFileName).resolve().parent).mkdir(parents=True, exist_ok=True)
+    with open(subFileName, 'w') as subfile:
+        subfile.write('universe = vanilla\n')
+        subfile.write('notification = Never\n')
+        subfile.write('request_memory = {0}\n'.format(request_memory)) 
+        subfile.write('request_disk = {0}\n'.format(request_disk))   
+        subfile.write('request_cpus = {0}\n'.format(request_cpu))
+        subfile.write('getenv = True\n')
+        subfile.write('accounting_group = {0}\n'.format(setup.accGroup))
+        subfile.write('accounting_group_user = {0}\n\n'.format(setup.user))
+        if image is not None:
+            subfile.write('MY.SingularityImage = "{}"\n\n'.format(image))
+        for key, value in macros.items():
+            subfile.write('{0} = {1}\n'.format(key, value))
+        subfile.write('\n')
+        subfile.write('output = {0}\n'.format(outputPath))
+        subfile.write('error = {0}\n'.format(errorPath))
+        subfile.write('log = {0}\n'.format(logPath))
+        subfile.write('max_retries = {0}\n'.format(2)) # Retry this job X times if non-zero exit code
+        subfile.write('periodic_release = (HoldReasonSubCode == 13)\n') # Release the job if holdReason match 
+        subfile.write('executable = {0}\n'.format(executablePath))
+        subfile.write('arguments = {0}\n\n'.format(argListString))
+        if OSG:
+            subfile.write('stream_output = True\n')
+            subfile.write('stream_error = True\n\n')
+            subfile.write('should_transfer_files = YES\n')
+            subfile.write('when_to_transfer_output = ON_SUCCESS\n')
+            subfile.write('success_exit_code = 0\n')
+            subfile.write('transfer_executable={0}\n'.format(str(transfer_executable)))
+            subfile.write('transfer_input_files = $(TRANSFERFILES)\n')
+            subfile.write('transfer_output_files = $(OUTPUTFILE)\n')
+            subfile.write('transfer_output_remaps = "$(OUTPUTFILE)=$(REMAPOUTPUTFILE)"\n\n')
+            if OSDF:
+                subfile.write('use_oauth_services = scitokens\n')
+        subfile.write('queue {0} from {1}\n'.format(','.join(queueVars), itemFileName))
+    return 0
+
 def writeSearchDag(dagFileName, jobName, subFileName, jobNum, argListString):
     #Check if directory for production files exists. If not, create it.
     Path(Path(dagFileName).resolve().parent).mkdir(parents=True, exist_ok=True)
@@ -51,3 +92,53 @@ def writeSearchDag(dagFileName, jobName, subFileName, jobNum, argListString):
         dagfile.write('VARS {0}_{1} JobID="{1}" {2}'.format(jobName, jobNum, argListString))
         dagfile.write('\n')
     return 0
+
+class dagWriter():
+    """
+    Writes a DAG file in one go: the JOB/VARS entries are collected in memory and written with a single
+    write when the writer is closed. With atomic=True the file is written under a temporary name and renamed,
+    so an interrupted run never leaves a truncated DAG.
+
+    Usage:
+        with dagWriter(dagFileName) as dag:
+            for jobIndex, argList in enumerate(argLists, 1):
+                dag.addJob(taskName, subFileName, jobIndex, argList)
+    """
+    def __init__(self, dagFileName, atomic=True):
+        self.dagFileName = str(dagFileName)
+        self.atomic = atomic
+        self.lines = []
+        self.nJobs = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # nothing is written if the DAG generation failed
+        if exc_type is None:
+            self.close()
+        return False
+
+    def addJob(self, jobName, subFileName, jobNum, argListString):
+        # same format as writeSearchDag
+        self.lines.append('JOB {0}_{1} {2}\n'.format(jobName, jobNum, subFileName))
+        self.lines.append('VARS {0}_{1} JobID="{1}" {2}\n'.format(jobName, jobNum, argListString))
+        self.nJobs += 1
+
+    def addLine(self, line):
+        # any other DAG command (SPLICE, PARENT ... CHILD ..., RETRY, ...)
+        self.lines.append(line if line.endswith('\n') else line + '\n')
+
+    def close(self):
+        if self.closed:
+            return self.dagFileName
+        Path(Path(self.dagFileName).resolve().parent).mkdir(parents=True, exist_ok=True)
+        outFileName = self.dagFileName + '.tmp' if self.atomic else self.dagFileName
+        with open(outFileName, 'w') as dagfile:
+            dagfile.write(''.join(self.lines))
+        if self.atomic:
+            os.replace(outFileName, self.dagFileName)
+        self.lines = []
+        self.closed = True
+        return self.dagFileName
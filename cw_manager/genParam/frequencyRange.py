@@ -15,6 +15,12 @@ def getNf2dot(freq, fBand, tau, df2dot=1.0e-19):
     n = bandwidth / df2dot
     return np.ceil(n).astype(int)
 
+# number of Weave jobs in a 1Hz band, one per (sub-band, f1dot segment, f2dot segment) as in initSearchParams.genParamTable
+def getNJobs(freq, fBand, tau, df1dot=1.5e-9, df2dot=1.0e-19):
+    nf1dots = getNf1dot(freq, fBand, tau, df1dot=df1dot)
+    nf2dots = getNf2dot(freq, fBand, tau, df2dot=df2dot)
+    return int(nf1dots*nf2dots/fBand)
+
 def f0BroadRange(f0, fBand):
     f0min = f0
     f0max = f0 + fBand
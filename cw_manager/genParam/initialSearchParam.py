@@ -1,6 +1,7 @@
 #Author - Damon Cheung
 from ..utils import utils as utils
 from . import frequencyRange as fr
+from . import templateCount as tc
 from tqdm import tqdm
 import numpy as np
 from astropy.io import fits
@@ -14,53 +15,117 @@ class initSearchParams:
         self.freqParamName = freqParamName[:freqDerivOrder+1]
         self.freqDerivParamName = freqDerivParamName[:freqDerivOrder+1]
         
-    def genParamTable(self, freq, nf1dots, nf2dots):
-        n = int(nf1dots*nf2dots/self.fBand)
-        data =np.recarray((n,), dtype=[(key, '>f8') for key in (self.freqParamName + self.freqDerivParamName)]) 
-        
-        for i in range(int(1.0/self.fBand)):
-            f0 = freq + i *self.fBand
-            f0min, f0max, f0band = fr.f0BroadRange(f0, self.fBand)
-            for j in range(nf1dots):
-                _f1min, _, _f1Band = fr.f1BroadRange(f0, self.fBand, self.target.tau)
-                f1Band = _f1Band/nf1dots  # divide f1dot into n segment
-                f1min = _f1min + j*f1Band
-                f1max = f1min + f1Band
-                if j == nf1dots - 1:
-                    f1max = 0.0             # to mannually set f1dot upper limit to 0 (numerical accuracy/error exits)
-                    f1Band = 0.0 - f1min
-                        
-                for k in range(nf2dots):
-                    _f2min, _, _f2Band = fr.f2BroadRange(freq, self.fBand, f1min, f1max)
-                    f2Band = _f2Band/nf2dots
-                    f2min = _f2min + k*f2Band
-                    f2max = f2min + f2Band
-                    if j == (nf1dots-1) and k == 0:
-                        f2min = 0.0
-                        f2Band = f2max    # to mannually set f2dot lower limit to 0 (numerical accuracy/error exits)
-                    
-                    
-                    idx = i * nf1dots * nf2dots + j * nf2dots + k 
-                    data[idx]['freq'], data[idx]['df'] = f0min, f0band
-                    data[idx]['f1dot'], data[idx]['df1dot'] = f1min, f1Band
-                    data[idx]['f2dot'], data[idx]['df2dot'] = f2min, f2Band
-                    
-                    # sky location
-#                    data[idx]['alpha'], data[idx]['dalpha'] = self.target.alpha, self.target.dalpha
-#                    data[idx]['delta'], data[idx]['ddelta'] = self.target.delta, self.target.ddelta
+    def genParamGrid(self, freqs, nf1dots, nf2dots, predictor=None):
+        """
+        Builds the search grid of one or several 1Hz bands in one go: for each band, sub-band (fBand) i,
+        f1dot slice j and f2dot slice k, the row i*nf1dots*nf2dots + j*nf2dots + k of the band.
+        The values are computed with the same operations as the original row-by-row loop, so the tables are identical.
+
+        Parameters:
+        - freqs: array_like of int
+            The 1Hz bands.
+
+        - nf1dots, nf2dots: array_like of int
+            Number of f1dot and f2dot slices of each band.
+
+        - predictor: templateCountPredictor, optional (default=None)
+            If given, f1dot slices of equal predicted cost instead of equal width (see genParam).
+
+        Returns:
+        - data: numpy recarray
+            The rows of all bands, band after band.
+
+        - nRows: numpy.ndarray
+            Number of rows of each band.
+        """
+        freqs = np.atleast_1d(freqs)
+        nf1dots = np.atleast_1d(nf1dots).astype(int)
+        nf2dots = np.atleast_1d(nf2dots).astype(int)
+        nSub = int(1.0/self.fBand)
+        nRows = nSub * nf1dots * nf2dots
+        for freq, n1, n2, n in zip(freqs, nf1dots, nf2dots, nRows):
+            if int(n1*n2/self.fBand) != n:
+                raise ValueError('{0} Hz: {1} f1dot x {2} f2dot slices do not fill {3} sub-bands'.format(freq, n1, n2, nSub))
+
+        # band, sub-band, f1dot slice and f2dot slice of each row
+        band = np.repeat(np.arange(len(freqs)), nRows)
+        row = np.arange(nRows.sum()) - np.repeat(np.cumsum(nRows) - nRows, nRows)
+        n1, n2, freq = nf1dots[band], nf2dots[band], freqs[band]
+        i = row // (n1*n2)
+        j = (row // n2) % n1
+        k = row % n2
+
+        f0 = freq + i *self.fBand
+        f0min, f0max, f0band = fr.f0BroadRange(f0, self.fBand)
+        if predictor is None:
+            _f1min, _, _f1Band = fr.f1BroadRange(f0, self.fBand, self.target.tau)
+            f1Band = _f1Band/n1  # divide f1dot into n segment
+            f1min = _f1min + j*f1Band
+        else:
+            # f1dot slices of equal predicted cost instead of equal width
+            f1Bounds = {}
+            for b, (_freq, _n1, _n2) in enumerate(zip(freqs, nf1dots, nf2dots)):
+                for _i in range(nSub):
+                    f1Bounds[b, _i] = predictor.f1Boundaries(_freq + _i *self.fBand, _freq, self.fBand, self.target.tau, _n1, _n2)
+            f1min = np.array([f1Bounds[b, _i][_j] for b, _i, _j in zip(band, i, j)])
+            f1Band = np.array([f1Bounds[b, _i][_j+1] for b, _i, _j in zip(band, i, j)]) - f1min
+        f1max = f1min + f1Band
+        last = j == n1 - 1
+        f1max = np.where(last, 0.0, f1max)         # to mannually set f1dot upper limit to 0 (numerical accuracy/error exits)
+        f1Band = np.where(last, 0.0 - f1min, f1Band)
+
+        # the f2dot range of each f1dot slice (a run of n2 rows), computed per slice with scalars:
+        # numpy squares arrays and scalars differently in the last bit, and the tables must not change
+        start = np.nonzero(k == 0)[0]
+        f2Range = np.array([fr.f2BroadRange(freq[r], self.fBand, f1min[r], f1max[r]) for r in start])
+        _f2min, _f2Band = f2Range[np.cumsum(k == 0) - 1][:, [0, 2]].T
+        f2Band = _f2Band/n2
+        f2min = _f2min + k*f2Band
+        f2max = f2min + f2Band
+        first = last & (k == 0)
+        f2min = np.where(first, 0.0, f2min)        # to mannually set f2dot lower limit to 0 (numerical accuracy/error exits)
+        f2Band = np.where(first, f2max, f2Band)
+
+        data = np.recarray((nRows.sum(),), dtype=[(key, '>f8') for key in (self.freqParamName + self.freqDerivParamName)])
+        values = {'freq': f0min, 'df': f0band, 'f1dot': f1min, 'df1dot': f1Band, 'f2dot': f2min, 'df2dot': f2Band}
+        for key in data.dtype.names:
+            # higher derivatives are not searched over in the initial search
+            data[key] = values.get(key, 0.0)
+        return data, nRows
+
+    def _paramTable(self, data):
+        n = len(data)
         data = Table(data)
         data.add_column(self.target.alpha*np.ones(n), name='alpha')
         data.add_column(self.target.dalpha*np.ones(n), name='dalpha')
         data.add_column(self.target.delta*np.ones(n), name='delta')
         data.add_column(self.target.ddelta*np.ones(n), name='ddelta')           
         return fits.BinTableHDU(data)
+
+    def genParamTable(self, freq, nf1dots, nf2dots, predictor=None):
+        data, _ = self.genParamGrid(freq, nf1dots, nf2dots, predictor=predictor)
+        return self._paramTable(data)
         
     # need to do, at search result stage, append the table.
-    def genParam(self, target, fmin, fmax, df1dot=1e-9, df2dot=1e-19):
+    def genParam(self, target, fmin, fmax, df1dot=1e-9, df2dot=1e-19, balance=False, predictor=None):
+        """
+        Parameters:
+        - balance: bool, optional (default=False)
+            If True, the f1dot slices of each sub-band are chosen so that all jobs have about the same predicted
+            template count (see templateCount.templateCountPredictor); the number of jobs is unchanged.
+
+        - predictor: templateCountPredictor, optional (default=None)
+            Predictor used if balance is True. If None, the template count is proportional to the volume of the job.
+        """
         self.target = target
+        if balance and predictor is None:
+            predictor = tc.templateCountPredictor(len(self.freqParamName)-1)
+        freqs = np.arange(fmin, fmax)
+        nf1dots = [fr.getNf1dot(freq, self.fBand, target.tau, df1dot=df1dot) for freq in freqs] # number of segment for f1dot range
+        nf2dots = [fr.getNf2dot(freq, self.fBand, target.tau, df2dot=df2dot) for freq in freqs] # number of segment for f2dot range
+        # the grid of the whole range is built at once, then split into the table of each band
+        data, nRows = self.genParamGrid(freqs, nf1dots, nf2dots, predictor=predictor if balance else None)
         params = {}
-        for freq in tqdm(range(fmin, fmax)):
-            nf1dots = fr.getNf1dot(freq, self.fBand, target.tau, df1dot=df1dot) # number of segment for f1dot range
-            nf2dots = fr.getNf2dot(freq, self.fBand, target.tau, df2dot=df2dot) # number of segment for f2dot range
-            params[str(freq)] = self.genParamTable(freq, nf1dots, nf2dots)
+        for freq, bandData in zip(tqdm(freqs), np.split(data, np.cumsum(nRows)[:-1])):
+            params[str(freq)] = self._paramTable(bandData)
         return params        
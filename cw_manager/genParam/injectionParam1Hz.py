@@ -7,15 +7,19 @@ from astropy.io import fits
 from . import frequencyRange as fr
 from ..analysis import readFile as rf
 from ..utils import filePath as fp
+from ..utils import spacingCache as sc
+from . import injectionSampler as ins
     
 
 class injectionParams:    
-    def __init__(self, target, obsDay, cohDay, fBand=0.1):
+    def __init__(self, target, obsDay, cohDay, fBand=0.1, seed=None):
         self.target = target
         self.cohDay= cohDay
         _, _, _, _, self.refTime = utils.getTimeSetup(self.target.name, obsDay, cohDay)
         self.fBand = fBand
         self.injParamName = utils.injParamName()
+        # the same seed gives the same injections (see injectionSampler.makeRng)
+        self.rng = ins.makeRng(seed)
         
     def upperStrainLimit(self, freq, fmin, fmax, nBands, nonSatBands, method='ULEstimation'):
         try:
@@ -39,42 +43,12 @@ class injectionParams:
             return 1e-25
         
     def getF0FromNonSatBands(self, nonSatBands, nInj):
-        p = np.ones(nonSatBands.shape)
-        p = p/p.sum() # Normalize to sum up to one
-        f0 = [np.random.choice([np.random.uniform(freq, freq+self.fBand) for freq in nonSatBands], p=p) for _ in range(nInj)]
-        return np.array(f0).reshape(nInj)
+        return ins.drawFreq(self.rng, nonSatBands, nInj, self.fBand)
 
     def genInjParamTable(self, nonSatBands, h0, freq, nInj, nAmp, freqDerivOrder):
-        freqParamName, freqDerivParamName = utils.phaseParamName(freqDerivOrder)
-        injData =np.recarray((nInj,), dtype=[(key, '>f8') for key in (self.injParamName+freqParamName[1:])]) 
-
-        for i in range(nInj):
-            injData[i]['psi'] = np.random.uniform(0,np.pi/4.0)
-            injData[i]["Alpha"], injData[i]["Delta"] = self.target.alpha, self.target.delta
-            injData[i]["refTime"] = self.refTime
-            cosi = np.random.uniform(-1,1)
-            _h0 = utils.genh0Points(i, h0, nInj, nAmp) 
-            injData[i]["aPlus"] = _h0*(1.+cosi**2)/2.
-            injData[i]["aCross"] = _h0*cosi
-            
-            # draw injection params from defined search range
-            f0 = self.getF0FromNonSatBands(nonSatBands, 1) # draw from non saturated bands in 1Hz
-            injData[i]['Freq'] = f0
-            
-            f1min, f1max, _ = fr.f1BroadRange(f0, 0, self.target.tau)
-            f1 = np.random.uniform(f1min, f1max, 1)
-            injData[i]['f1dot'] = f1
-            
-            f2min, f2max, _ = fr.f2BroadRange(f0, 0, f1, f1)
-            f2 = np.random.uniform(f2min, f2max, 1)
-            injData[i]['f2dot'] = f2
-            
-            if freqDerivOrder >= 3:
-                injData[i]['f3dot'] = fr.f3Value(f0, f1, f2)
-            
-            if freqDerivOrder >= 4:
-                injData[i]['f4dot'] = fr.f4Value(f0, f1, f2)
-            
+        # injections at the target sky position, which is the only one searched (see injectionParam1HzSky for sky sampling)
+        injData = ins.drawInjections(self.rng, self.target, self.refTime, nonSatBands, h0, nInj, nAmp, freqDerivOrder,
+                                     fBand=self.fBand)
         return fits.BinTableHDU(injData)
             
     def genSearchRangeTable(self, freq, injData, stage, freqDerivOrder):
@@ -86,10 +60,8 @@ class injectionParams:
             # sky location
             data[i]['alpha'], data[i]['dalpha'] = self.target.alpha, self.target.dalpha
             data[i]['delta'], data[i]['ddelta'] = self.target.delta, self.target.ddelta
-            # get spacing 
-            taskName = utils.taskName(self.target, stage, self.cohDay, freqDerivOrder, int(freq))
-            dataFilePath = fp.weaveOutputFilePath(self.target, int(freq), taskName, 1, stage)
-            spacing = utils.getSpacing(dataFilePath, freqDerivOrder)
+            # get spacing (header of the first job, cached after the first injection)
+            spacing = sc.defaultCache.get(self.target, stage, self.cohDay, freqDerivOrder, int(freq), 1)
                 
             # avoid the search arange to cross the sub-band bounday and hit the saturated band
             idx1, idx2 = freqParamName[0], freqDerivParamName[0]
@@ -201,39 +173,4 @@ class injectionParams:
         if nAmp !=1:    
             self.saveh0Value(injParamDict, fmin, fmax, nInj, nAmp)
         
-        return searchParamDict, injParamDict        
-"""
-    def genInjParamTable(self, nonSatBands, h0, freq, nInj, nAmp, freqDerivOrder):
-        freqParamName, freqDerivParamName = utils.phaseParamName(freqDerivOrder)
-        injData =np.recarray((nInj,), dtype=[(key, '>f8') for key in (self.injParamName+freqParamName[1:])]) 
-        
-        injData['psi'] = np.random.uniform(0, np.pi/4.0, nInj)
-        injData["Alpha"], injData["Delta"] = np.ones(nInj)*self.target.alpha, np.ones(nInj)*self.target.delta
-        injData["refTime"] = np.ones(nInj)*self.refTime
-        
-        cosi = np.random.uniform(-1,1, nInj)
-        h0 = utils.genh0Points(range(nInj), h0, nInj, nAmp) 
-        injData["aPlus"] = h0*(1.+cosi**2)/2.
-        injData["aCross"] = h0*cosi
-        
-        # draw injection params from defined search range
-        f0 = self.getF0FromNonSatBands(nonSatBands, nInj) # draw from non saturated bands in 1Hz
-        injData['Freq'] = f0
-        
-        f1min, f1max, _ = fr.f1BroadRange(f0, 0, self.target.tau)
-        f1 = np.random.uniform(f1min, f1max)
-        injData['f1dot'] = f1    
-        
-        f2min, f2max, _ = fr.f2BroadRange(f0, 0, f1, f1)
-        f2 = np.random.uniform(f2min, f2max)
-        injData['f2dot'] = f2
-            
-        if freqDerivOrder >= 3:
-            injData['f3dot'] = fr.f3Value(f0, f1, f2)
-            
-        if freqDerivOrder >= 4:
-            injData['f4dot'] = fr.f4Value(f0, f1, f2)
-                
-        return fits.BinTableHDU(injData)
-
-"""
+        return searchParamDict, injParamDict
@@ -9,56 +9,25 @@ from . import frequencyRange as fr
 from ..analysis import readFile as rf
 from ..utils import filePath as fp
 from pathlib import Path    
+from . import injectionSampler as ins
 
 class injectionParams:    
-    def __init__(self, target, obsDay, cohDay, fBand=0.1):
+    def __init__(self, target, obsDay, cohDay, fBand=0.1, seed=None):
         self.target = target
         self.cohDay= cohDay
         _, _, _, _, self.refTime = utils.getTimeSetup(self.target.name, obsDay, cohDay)
         self.fBand = fBand
         self.injParamName = utils.injParamName()
+        # the same seed gives the same injections (see injectionSampler.makeRng)
+        self.rng = ins.makeRng(seed)
         
     def getF0FromNonSatBands(self, nonSatBands, nInj):
-        p = np.ones(nonSatBands.shape)
-        p = p/p.sum() # Normalize to sum up to one
-        f0 = [np.random.choice([np.random.uniform(freq, freq+self.fBand) for freq in nonSatBands], p=p) for _ in range(nInj)]
-        return np.array(f0).reshape(nInj)
+        return ins.drawFreq(self.rng, nonSatBands, nInj, self.fBand)
 
     def genInjParamTable(self, nonSatBands, h0, freq, nInj, nAmp, freqDerivOrder, skyUncertainty):
-        freqParamName, freqDerivParamName = utils.phaseParamName(freqDerivOrder)
-        injData =np.recarray((nInj,), dtype=[(key, '>f8') for key in (self.injParamName+freqParamName[1:])]) 
-
-        for i in range(nInj):
-            injData[i]['psi'] = np.random.uniform(0,np.pi/4.0)
-            # alpha is uniformly distributed in [0, 2pi]
-            injData[i]["Alpha"] = np.random.uniform(self.target.alpha-skyUncertainty, self.target.alpha+skyUncertainty)
-            # sin(delta) is uniformly distributed in [-1, 1]
-            sinDelta = np.random.uniform(np.sin(self.target.delta-skyUncertainty), np.sin(self.target.delta+skyUncertainty))
-            injData[i]["Delta"] = np.arcsin(sinDelta)
-            injData[i]["refTime"] = self.refTime
-            cosi = np.random.uniform(-1,1)
-            _h0 = utils.genh0Points(i, h0, nInj, nAmp) 
-            injData[i]["aPlus"] = _h0*(1.+cosi**2)/2.
-            injData[i]["aCross"] = _h0*cosi
-            
-            # draw injection params from defined search range
-            f0 = self.getF0FromNonSatBands(nonSatBands, 1) # draw from non saturated bands in 1Hz
-            injData[i]['Freq'] = f0
-            
-            f1min, f1max, _ = fr.f1BroadRange(f0, 0, self.target.tau)
-            f1 = np.random.uniform(f1min, f1max, 1)
-            injData[i]['f1dot'] = f1
-            
-            f2min, f2max, _ = fr.f2BroadRange(f0, 0, f1, f1)
-            f2 = np.random.uniform(f2min, f2max, 1)
-            injData[i]['f2dot'] = f2
-            
-            if freqDerivOrder >= 3:
-                injData[i]['f3dot'] = fr.f3Value(f0, f1, f2)
-            
-            if freqDerivOrder >= 4:
-                injData[i]['f4dot'] = fr.f4Value(f0, f1, f2)
-            
+        # alpha is uniform and sin(delta) is uniform within skyUncertainty of the target
+        injData = ins.drawInjections(self.rng, self.target, self.refTime, nonSatBands, h0, nInj, nAmp, freqDerivOrder,
+                                     fBand=self.fBand, skyUncertainty=skyUncertainty)
         return fits.BinTableHDU(injData)
             
     def genSearchRangeTable(self, dataFilePath, freq, injData, stage, freqDerivOrder):
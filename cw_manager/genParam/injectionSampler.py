@@ -0,0 +1,98 @@
+# Batched draw of the injection parameters of a band, shared by injectionParam1Hz and injectionParam1HzSky
+import numpy as np
+from . import frequencyRange as fr
+from ..utils import utils as utils
+
+def makeRng(seed=None):
+    """
+    Random generator of the injections. seed can be an int, a sequence of ints (e.g. [seed, freq] for one
+    generator per band of a campaign) or None for fresh entropy from the OS.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+def drawFreq(rng, nonSatBands, nInj, fBand=0.1):
+    # a non-saturated sub-band is chosen uniformly, then the frequency uniformly in it
+    nonSatBands = np.atleast_1d(nonSatBands)
+    if nonSatBands.size == 0:
+        raise ValueError('No non-saturated sub-band to draw the injections from')
+    band = nonSatBands[rng.integers(0, nonSatBands.size, nInj)]
+    return rng.uniform(band, band+fBand)
+
+def drawSky(rng, alpha, delta, nInj, skyUncertainty=0):
+    # alpha uniform in [alpha-skyUncertainty, alpha+skyUncertainty] and sin(delta) uniform in the matching range
+    if skyUncertainty == 0:
+        return alpha*np.ones(nInj), delta*np.ones(nInj)
+    _alpha = rng.uniform(alpha-skyUncertainty, alpha+skyUncertainty, nInj)
+    sinDelta = rng.uniform(np.sin(delta-skyUncertainty), np.sin(delta+skyUncertainty), nInj)
+    return _alpha, np.arcsin(sinDelta)
+
+def drawInjections(rng, target, refTime, nonSatBands, h0, nInj, nAmp, freqDerivOrder, fBand=0.1, skyUncertainty=0):
+    """
+    Draws nInj injections of a band at once.
+
+    Parameters:
+    - rng: numpy.random.Generator
+        See makeRng; the same seed gives the same injections.
+
+    - target: module
+        The search target (alpha, delta, tau).
+
+    - refTime: float
+        Reference time of the injections.
+
+    - nonSatBands: array_like
+        Start of the non-saturated sub-bands the frequencies are drawn from.
+
+    - h0: float
+        Injected strain amplitude, or the upper limit estimate scaled by the amplitude ladder if nAmp != 1.
+
+    - nInj: int
+        Number of injections.
+
+    - nAmp: int
+        Number of amplitudes of the ladder (see utils.genh0Points), nInj/nAmp consecutive injections per amplitude.
+
+    - freqDerivOrder: int
+        Frequency derivative order of the injections; f3dot and f4dot follow from f0, f1dot and f2dot.
+
+    - fBand: float, optional (default=0.1)
+        Width of the sub-bands.
+
+    - skyUncertainty: float, optional (default=0)
+        Half width of the sky region the injections are drawn from (radian); 0 injects at the target position.
+
+    Returns:
+    - injData: numpy recarray
+        Columns utils.injParamName() and the frequency parameters (Freq, f1dot, ...).
+    """
+    freqParamName, _ = utils.phaseParamName(freqDerivOrder)
+    injData = np.recarray((nInj,), dtype=[(key, '>f8') for key in (utils.injParamName()+freqParamName[1:])])
+
+    injData['psi'] = rng.uniform(0, np.pi/4.0, nInj)
+    injData['Alpha'], injData['Delta'] = drawSky(rng, target.alpha, target.delta, nInj, skyUncertainty)
+    injData['refTime'] = refTime
+    cosi = rng.uniform(-1, 1, nInj)
+    _h0 = utils.genh0Points(np.arange(nInj), h0, nInj, nAmp)
+    injData['aPlus'] = _h0*(1.+cosi**2)/2.
+    injData['aCross'] = _h0*cosi
+
+    # draw injection params from defined search range
+    f0 = drawFreq(rng, nonSatBands, nInj, fBand)
+    injData['Freq'] = f0
+
+    f1min, f1max, _ = fr.f1BroadRange(f0, 0, target.tau)
+    f1 = rng.uniform(f1min, f1max)
+    injData['f1dot'] = f1
+
+    f2min, f2max, _ = fr.f2BroadRange(f0, 0, f1, f1)
+    f2 = rng.uniform(f2min, f2max)
+    injData['f2dot'] = f2
+
+    if freqDerivOrder >= 3:
+        injData['f3dot'] = fr.f3Value(f0, f1, f2)
+
+    if freqDerivOrder >= 4:
+        injData['f4dot'] = fr.f4Value(f0, f1, f2)
+    return injData
@@ -0,0 +1,181 @@
+# Template-count predictor of Weave jobs, used to split each 1Hz band into jobs of about equal cost
+import numpy as np
+from pathlib import Path
+from astropy.io import fits
+from . import frequencyRange as fr
+from ..utils import setup_parameter as setup
+
+def semicoherentMetric(metricFile, freqDerivOrder):
+    """
+    Reads the frequency/spindown block of the semicoherent metric from a Weave setup file.
+
+    The reduced supersky coordinates of the metric are (n_a, n_b, f1dot, ..., fsdot, freq), i.e. the
+    spindowns follow the two sky coordinates and the frequency is last.
+
+    Returns:
+    - metric: numpy.ndarray, shape (freqDerivOrder+1, freqDerivOrder+1), or None if the file has no such metric
+        Metric in the order (freq, f1dot, ..., f{freqDerivOrder}dot).
+    """
+    if metricFile is None or not Path(metricFile).exists():
+        return None
+    with fits.open(metricFile) as hdul:
+        names = [hdu.name.lower() for hdu in hdul]
+        if 'semi_rssky_metric' not in names:
+            return None
+        g = np.array(hdul[names.index('semi_rssky_metric')].data, dtype=float)
+    g = g.reshape(int(np.sqrt(g.size)), -1)
+    index = [g.shape[0]-1] + [1+s for s in range(1, freqDerivOrder+1)]
+    return g[np.ix_(index, index)]
+
+class templateCountPredictor():
+    """
+    Predicts the number of semicoherent templates of a job from its parameter-space box. The lattice of a
+    job covers its box padded by the extent of one template in each dimension, so the count is modelled as
+
+        nTemplates = scale * prod_i (width_i + extent_i)
+
+    with extent_i = 2 sqrt(mismatch (g^-1)_ii) from the semicoherent metric g when a Weave setup file is given
+    (scale = sqrt(det g) / mismatch^(d/2) up to the lattice thickness), or from the template spacing of a
+    previous Weave output otherwise. Without either, the count is proportional to the volume of the box, which
+    is enough to balance the jobs of a band. calibrate() fits the scale to the counts of jobs that have run.
+    """
+    def __init__(self, freqDerivOrder=2, extent=None, scale=1.0):
+        """
+        Parameters:
+        - freqDerivOrder: int, optional (default=2)
+            Frequency derivative order of the search.
+
+        - extent: list of float, optional (default=None)
+            Extent of a template in (freq, f1dot, ...). If None, no padding.
+
+        - scale: float, optional (default=1.0)
+            Templates per unit padded volume.
+        """
+        self.freqDerivOrder = freqDerivOrder
+        self.extent = np.zeros(freqDerivOrder+1) if extent is None else np.asarray(extent, dtype=float)
+        self.scale = scale
+
+    @classmethod
+    def fromMetricFile(cls, metricFile, freqDerivOrder=2, mismatch=setup.semiMM):
+        """
+        Predictor from the semicoherent metric of a Weave setup file (see filePath.weaveSetupFilePath).
+        Falls back to the volume model if the file has no semicoherent metric.
+        """
+        g = semicoherentMetric(metricFile, freqDerivOrder)
+        if g is None:
+            print('No semicoherent metric in {0}, template count proportional to the volume.'.format(metricFile))
+            return cls(freqDerivOrder)
+        extent = 2 * np.sqrt(mismatch * np.diag(np.linalg.inv(g)))
+        scale = np.sqrt(np.linalg.det(g)) / mismatch**((freqDerivOrder+1)/2)
+        return cls(freqDerivOrder, extent, scale)
+
+    @classmethod
+    def fromSpacing(cls, spacing, freqDerivOrder=2):
+        """
+        Predictor from the template spacing of a Weave output (see utils.getSpacing or spacingCache).
+        """
+        _spacing = [spacing[key] for key in ['df', 'df1dot', 'df2dot', 'df3dot', 'df4dot'][:freqDerivOrder+1]]
+        return cls(freqDerivOrder, extent=_spacing, scale=1.0/np.prod(_spacing))
+
+    def predict(self, widths):
+        """
+        Parameters:
+        - widths: array_like, shape (..., freqDerivOrder+1)
+            Widths of the job boxes in (freq, f1dot, ...).
+
+        Returns:
+        - nTemplates: numpy.ndarray
+        """
+        widths = np.abs(np.asarray(widths, dtype=float))
+        return self.scale * np.prod(widths + self.extent, axis=-1)
+
+    def predictTable(self, param):
+        # template count of each row of a parameter table (columns df, df1dot, ...)
+        names = ['df', 'df1dot', 'df2dot', 'df3dot', 'df4dot'][:self.freqDerivOrder+1]
+        return self.predict(np.column_stack([param[key] for key in names]))
+
+    def calibrate(self, param, nTemplates):
+        """
+        Fits the scale to the template counts of jobs that have run (e.g. resultManager._readTemplateCount).
+        """
+        predicted = self.predictTable(param) / self.scale
+        nTemplates = np.asarray(nTemplates, dtype=float)
+        self.scale = float(np.sum(predicted * nTemplates) / np.sum(predicted**2))
+        return self
+
+    def f1Cost(self, f1min, f1max, freq, fBand, nf2dots):
+        # predicted template count of one job of an f1dot slice, with the f2dot range of the slice cut in nf2dots
+        f2min, f2max, f2Band = fr.f2BroadRange(freq, fBand, f1min, f1max)
+        widths = [fBand, f1max - f1min, f2Band/nf2dots] + [0.0]*(self.freqDerivOrder-2)
+        return float(self.predict(widths[:self.freqDerivOrder+1]))
+
+    def f1Boundaries(self, f0, freq, fBand, tau, nf1dots, nf2dots, rtol=1e-6):
+        """
+        Boundaries of nf1dots f1dot slices of the f1dot range of sub-band f0, chosen so that every job of the
+        band has about the same predicted template count (instead of equal widths).
+
+        Parameters:
+        - f0: float
+            Start of the sub-band (the f1dot range depends on it).
+
+        - freq: int
+            The 1Hz band (the f2dot range of a slice is computed with it, as in initSearchParams).
+
+        - fBand: float
+            Width of the sub-band.
+
+        - tau: float
+            Characteristic age of the target.
+
+        - nf1dots, nf2dots: int
+            Number of f1dot slices, and of f2dot slices in each f1dot slice.
+
+        Returns:
+        - boundaries: numpy.ndarray, shape (nf1dots+1,)
+            From the lower end of the f1dot range to 0.
+        """
+        f1min, f1max, _ = fr.f1BroadRange(f0, fBand, tau)
+        f1min, f1max = float(f1min), float(f1max)
+        if nf1dots == 1:
+            return np.array([f1min, f1max])
+
+        def nextBoundary(a, target):
+            # end of the slice starting at a whose cost is target (the cost grows with the width)
+            if self.f1Cost(a, f1max, freq, fBand, nf2dots) <= target:
+                return f1max
+            lo, hi = a, f1max
+            for _ in range(100):
+                mid = 0.5*(lo + hi)
+                if self.f1Cost(a, mid, freq, fBand, nf2dots) < target:
+                    lo = mid
+                else:
+                    hi = mid
+                if hi - lo <= rtol * (f1max - f1min) * 1e-3:
+                    break
+            return 0.5*(lo + hi)
+
+        def boundaries(target):
+            b = [f1min]
+            for _ in range(nf1dots-1):
+                b.append(nextBoundary(b[-1], target))
+            return b
+
+        # the target cost is adjusted until the last slice costs the same as the others
+        lo = 0.0
+        hi = self.f1Cost(f1min, f1max, freq, fBand, nf2dots)
+        for _ in range(200):
+            target = 0.5*(lo + hi)
+            b = boundaries(target)
+            last = self.f1Cost(b[-1], f1max, freq, fBand, nf2dots)
+            if last > target:
+                lo = target
+            else:
+                hi = target
+            if hi - lo <= rtol * hi:
+                break
+        return np.array(boundaries(hi) + [f1max])
+
+def imbalance(nTemplates):
+    # ratio of the largest to the mean job cost of a band; 1 for perfectly balanced jobs
+    nTemplates = np.asarray(nTemplates, dtype=float)
+    return float(nTemplates.max() / nTemplates.mean())
@@ -0,0 +1,264 @@
+# Clustering engine for outliers, using a KD-tree in spacing-normalized coordinates
+# Gives the same clusters as the original O(N^2) loop (kept below as bruteForceClustering for reference and benchmark)
+import os
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+
+def bruteForceClustering(coords, spacing, loudness, nSpacing):
+    """
+    Original implementation of utils.clustering: for each centre, the distance to every outlier is computed
+    in each dimension and the dimension-wise matches are intersected. O(N^2 d).
+    """
+    sorted_indices = np.argsort(-loudness)
+    sorted_coords = coords[sorted_indices]
+    sorted_spacing = spacing[sorted_indices]
+
+    centers_idx = []
+    cluster_size = []
+    cluster_member = []
+    processed_indices = set()
+
+    for i, (center, gridsize) in enumerate(zip(sorted_coords, sorted_spacing)):
+        if sorted_indices[i] in processed_indices:
+            continue
+
+        within_dim_indices = []
+        for dim in range(coords.shape[1]):
+            r0 = nSpacing * gridsize[dim]
+            distances_dim = np.abs(coords[:, dim] - center[dim])
+            within_dim = np.where(distances_dim <= r0)[0]
+            within_dim_indices.append(within_dim)
+
+        within_r0_indices = within_dim_indices[0]
+        for dim_indices in within_dim_indices[1:]:
+            within_r0_indices = np.intersect1d(within_r0_indices, dim_indices)
+
+        processed_indices.update(within_r0_indices)
+        centers_idx.append(sorted_indices[i])
+        cluster_size.append(len(within_r0_indices))
+        cluster_member.append(within_r0_indices)
+
+    return np.array(centers_idx), np.array(cluster_size), cluster_member
+
+def clusterOutliers(coords, spacing, loudness, nSpacing, returnLabels=False):
+    """
+    Greedy clustering from the loudest outlier: each unclustered outlier, in order of decreasing loudness, becomes
+    a centre and its cluster is every outlier within nSpacing times the centre's spacing in each dimension.
+
+    Parameters:
+    - coords: numpy.ndarray, shape (N, d)
+        Phase parameters of the outliers (freq, f1dot, ...).
+
+    - spacing: numpy.ndarray, shape (N, d)
+        Template spacing of each outlier (df, df1dot, ...).
+
+    - loudness: numpy.ndarray, shape (N,)
+        The mean2F of each outlier.
+
+    - nSpacing: float
+        Half-width of the cluster box in units of the spacing.
+
+    - returnLabels: bool, optional (default=False)
+        If True, also return the centre of each outlier.
+
+    Returns:
+    - centers_idx: numpy.ndarray
+        Index of each cluster centre, from the loudest.
+
+    - cluster_size: numpy.ndarray
+        Number of outliers in the box of each centre (outliers already in an earlier cluster are counted too).
+
+    - cluster_member: list of numpy.ndarray
+        Sorted indices of the outliers in the box of each centre.
+
+    - center_of: numpy.ndarray, only if returnLabels is True
+        Index of the centre of each outlier, i.e. the loudest centre whose box contains it.
+    """
+    # the exact test below uses the input dtypes, as in the loop
+    coords = np.asarray(coords)
+    spacing = np.asarray(spacing)
+    loudness = np.asarray(loudness)
+    n, d = coords.shape
+
+    # the tree is built on coordinates in units of the typical spacing; the box of each centre is covered by a
+    # Chebyshev ball of the largest normalized half-width, slightly inflated, then filtered exactly as in the loop
+    _coords = coords.astype(float)
+    _spacing = np.abs(spacing.astype(float))
+    scale = np.median(_spacing, axis=0) if n else np.ones(d)
+    scale[~(scale > 0)] = 1.0
+    origin = _coords.min(axis=0) if n else np.zeros(d)
+    tree = cKDTree((_coords - origin) / scale)
+    radius = (nSpacing * _spacing / scale).max(axis=1)
+    radius = radius * (1 + 1e-9) + 1e-6
+
+    sorted_indices = np.argsort(-loudness)
+    processed = np.zeros(n, dtype=bool)
+    center_of = np.full(n, -1, dtype=np.int64)
+    centers_idx = []
+    cluster_size = []
+    cluster_member = []
+
+    for ci in sorted_indices:
+        if processed[ci]:
+            continue
+        candidates = np.array(tree.query_ball_point(tree.data[ci], radius[ci], p=np.inf), dtype=np.int64)
+        r0 = nSpacing * spacing[ci]
+        inside = np.all(np.abs(coords[candidates] - coords[ci]) <= r0, axis=1)
+        members = np.sort(candidates[inside])
+
+        # outliers in several boxes belong to the loudest centre
+        center_of[members[~processed[members]]] = ci
+        processed[members] = True
+        centers_idx.append(ci)
+        cluster_size.append(len(members))
+        cluster_member.append(members)
+
+    if returnLabels:
+        return np.array(centers_idx), np.array(cluster_size), cluster_member, center_of
+    return np.array(centers_idx), np.array(cluster_size), cluster_member
+
+class streamingClusterer():
+    """
+    Clusters outliers that arrive in chunks (e.g. the chunks of a follow-up), so the clustered file of all chunks
+    is written without reading the chunk files again. The greedy clustering depends on the loudness order of all
+    outliers, so merging the centres of each chunk cannot reproduce it (a loud outlier of a later chunk can take
+    over the box of an earlier centre); the rows of the outliers are kept instead, and clustered once in result().
+    This gives the same clusters as clustering all outliers at once, with the memory of the outlier rows, which
+    the ensemble of the chunk files without clustering needs as well.
+    """
+    def __init__(self, paramName, spacingName, nSpacing):
+        """
+        Parameters:
+        - paramName: list of str
+            Columns of the phase parameters (e.g. ['freq', 'f1dot', 'f2dot']).
+
+        - spacingName: list of str
+            Columns of the spacing of each phase parameter (e.g. ['df', 'df1dot', 'df2dot']).
+
+        - nSpacing: float
+            Half-width of the cluster box in units of the spacing.
+        """
+        self.paramName = paramName
+        self.spacingName = spacingName
+        self.nSpacing = nSpacing
+        # outliers of each chunk, and the index of the first chunk not saved yet (see save)
+        self.chunks = []
+        self.nSaved = 0
+        self.nOutliers = 0
+        self.clusters = None
+
+    def __len__(self):
+        return self.result()[1].size
+
+    def push(self, data):
+        """
+        Parameters:
+        - data: numpy structured array
+            Outliers of a chunk, with the phase parameter, spacing and 'mean2F' columns.
+        """
+        if data is None or len(data) == 0:
+            return
+        data = np.array(data)
+        if self.chunks:
+            data = data.astype(self.chunks[0].dtype)
+        self.chunks.append(data)
+        self.nOutliers += len(data)
+        self.clusters = None
+
+    def result(self):
+        """
+        Returns:
+        - centers: numpy structured array or None
+            The cluster centres, from the loudest.
+
+        - cluster_size: numpy.ndarray
+            Number of outliers in the box of each centre, as in clusterOutliers.
+        """
+        if self.clusters is None:
+            if not self.chunks:
+                self.clusters = None, np.zeros(0, dtype=np.int64)
+            else:
+                data = np.concatenate(self.chunks)
+                coords = np.column_stack([data[key] for key in self.paramName])
+                spacing = np.column_stack([data[key] for key in self.spacingName])
+                centers_idx, cluster_size, _ = clusterOutliers(coords, spacing, data['mean2F'], self.nSpacing)
+                self.clusters = data[centers_idx], cluster_size
+        return self.clusters
+
+    def save(self, filePath):
+        # outliers pushed since the last save (possibly none), to resume a follow-up after the chunks already
+        # analyzed (see runJournal); written under a temporary name, so an interrupted run never leaves a truncated file
+        pushed = self.chunks[self.nSaved:]
+        tmpFilePath = str(filePath) + '.tmp.npy'
+        np.save(tmpFilePath, np.concatenate(pushed) if pushed else np.zeros(0))
+        os.replace(tmpFilePath, filePath)
+        self.nSaved = len(self.chunks)
+
+    def load(self, filePathList):
+        # outliers saved by the chunks of an interrupted run, in chunk order
+        for filePath in filePathList:
+            self.push(np.load(filePath))
+        self.nSaved = len(self.chunks)
+
+def syntheticOutliers(nOutliers, freqDerivOrder=2, nCluster=None, seed=0):
+    # outliers scattered around a few loud sources, with a spacing typical of a 1Hz band search
+    rng = np.random.default_rng(seed)
+    d = freqDerivOrder + 1
+    nCluster = max(1, nOutliers // 20) if nCluster is None else nCluster
+    gridsize = np.array([5e-6, 2e-11, 1e-20, 1e-29, 1e-38])[:d]
+    centers = rng.uniform(0, 1, (nCluster, d)) * gridsize * np.sqrt(nOutliers) * 10
+    which = rng.integers(0, nCluster, nOutliers)
+    coords = centers[which] + rng.normal(0, 2, (nOutliers, d)) * gridsize
+    spacing = gridsize * rng.uniform(0.8, 1.2, (nOutliers, 1))
+    loudness = rng.uniform(5, 20, nOutliers)
+    return coords, spacing, loudness
+
+def benchmark(nOutliers=(1000, 5000, 20000), freqDerivOrder=2, nSpacing=3.0, seed=0):
+    """
+    Times clusterOutliers against bruteForceClustering on synthetic outliers and checks the results are identical.
+
+    Returns:
+    - results: list of tuple
+        (nOutliers, brute-force time [s], engine time [s], identical) for each size.
+    """
+    results = []
+    for n in np.atleast_1d(nOutliers):
+        coords, spacing, loudness = syntheticOutliers(int(n), freqDerivOrder, seed=seed)
+        t0 = time.time()
+        ref = bruteForceClustering(coords, spacing, loudness, nSpacing)
+        t1 = time.time()
+        new = clusterOutliers(coords, spacing, loudness, nSpacing)
+        t2 = time.time()
+        identical = (np.array_equal(ref[0], new[0]) and np.array_equal(ref[1], new[1])
+                     and all(np.array_equal(a, b) for a, b in zip(ref[2], new[2])))
+        print('{0} outliers: loop {1:.2f}s, engine {2:.2f}s ({3:.0f}x), identical = {4}'.format(
+            n, t1-t0, t2-t1, (t1-t0)/max(t2-t1, 1e-9), identical))
+        results.append((int(n), t1-t0, t2-t1, identical))
+    return results
+
+def checkStreaming(nOutliers=3000, nChunk=10, nCluster=40, freqDerivOrder=2, nSpacing=3.0, seed=0):
+    """
+    Pushes synthetic outliers to a streamingClusterer in nChunk chunks and checks its clusters are those of
+    clusterOutliers on all outliers at once.
+
+    Returns:
+    - identical: bool
+    """
+    coords, spacing, loudness = syntheticOutliers(nOutliers, freqDerivOrder, nCluster=nCluster, seed=seed)
+    paramName = ['p{}'.format(i) for i in range(freqDerivOrder+1)]
+    spacingName = ['d{}'.format(i) for i in range(freqDerivOrder+1)]
+    data = np.zeros(nOutliers, dtype=[(key, 'f8') for key in paramName + spacingName + ['mean2F']])
+    for i in range(freqDerivOrder+1):
+        data[paramName[i]], data[spacingName[i]] = coords[:, i], spacing[:, i]
+    data['mean2F'] = loudness
+
+    clusterer = streamingClusterer(paramName, spacingName, nSpacing)
+    for chunk in np.array_split(data, nChunk):
+        clusterer.push(chunk)
+    centers, cluster_size = clusterer.result()
+    centers_idx, ref_size, _ = clusterOutliers(coords, spacing, loudness, nSpacing)
+    identical = np.array_equal(centers, data[centers_idx]) and np.array_equal(cluster_size, ref_size)
+    print('{0} outliers in {1} chunks: {2} clusters streamed, {3} at once, identical = {4}'.format(
+        nOutliers, nChunk, len(cluster_size), len(ref_size), identical))
+    return identical
@@ -1,6 +1,8 @@
 # This file contains all file path used in the Weave-based SNR search pipeline
 # Please put all file path in this file for better maintanace in the future
 from . import setup_parameter as setup
+from pathlib import Path
+import os
 
 
 ############################################ Core file
@@ -9,11 +11,20 @@ def weaveExecutableFilePath():
     filePath = '/cvmfs/software.igwn.org/conda/envs/igwn-py39-20231212/bin/lalpulsar_Weave'
     return filePath
 
+# Weave run by the local executor (pipelineTools); CW_MANAGER_WEAVE overrides it, e.g. with analysis/fakeWeave.py for offline tests
+def localWeaveExecutableFilePath():
+    return os.environ.get('CW_MANAGER_WEAVE', weaveExecutableFilePath())
+
 # path for python main program for the followUp process
 def followUpExecutableFilePath():
     filePath = setup.homeDir + 'followUp.py'
     return filePath
 
+# runner of the packed search jobs, shipped with the package (see condorManager.makePackedSearchDag)
+def packedJobExecutableFilePath():
+    filePath = str(Path(__file__).resolve().parent.parent / 'condor' / 'packedJob.py')
+    return filePath
+
 # path for python main program for the injectionFollow process
 def injFollowUpExecutableFilePath():
     filePath = setup.homeDir + 'followInjection.py'
@@ -47,6 +58,11 @@ def sftFilePath(obsDay, freq, detector='H1', OSDF=False):
         filePath = rootDir+'SFTs/narrowBand_age300yr/{0}days/L1/{1}/'.format(obsDay, int(freq))
     return filePath
 
+# index of the SFT files of an obsDay (see sftIndex)
+def sftIndexFilePath(obsDay):
+    filePath = setup.homeDir + 'SFTIndex/sftIndex_{0}days.json'.format(obsDay)
+    return filePath
+
 def estimateUpperLimitExcutable():
     filePath = '/cvmfs/software.igwn.org/conda/envs/igwn-py39-20231212/bin/lalpulsar_ComputeFstatMCUpperLimit'
     return filePath
@@ -68,6 +84,36 @@ def condorSubFilePath(target, freq, taskName, stage):
     filePath = setup.homeDir + 'condorFiles/{0}/{1}/{2}/{3}.sub'.format(stage, target.name, freq, taskName)
     return filePath
 
+# submit file queuing all jobs of a band from an itemdata table
+def queueSubFilePath(target, freq, taskName, stage):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{2}/{3}_queue.sub'.format(stage, target.name, freq, taskName)
+    return filePath
+
+# itemdata table of a submit file using 'queue ... from' (one line per job)
+def itemDataFilePath(target, freq, taskName, stage):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{2}/{3}_items.txt'.format(stage, target.name, freq, taskName)
+    return filePath
+
+# table of the Weave parameters of each row of the packed search jobs
+def packTableFilePath(target, freq, taskName, stage):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{2}/{3}_pack.txt'.format(stage, target.name, freq, taskName)
+    return filePath
+
+# top-level DAG of a frequency range, including the DAG of each band (see rangeDagBuilder.makeRangeDag)
+def rangeDagFilePath(target, fmin, fmax, stage):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{1}_{0}_{2}-{3}Hz.dag'.format(stage, target.name, fmin, fmax)
+    return filePath
+
+# generation time and size of the DAG of each band of a range
+def rangeDagReportFilePath(target, fmin, fmax, stage):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{1}_{0}_{2}-{3}Hz_dagReport.txt'.format(stage, target.name, fmin, fmax)
+    return filePath
+
+# memory/runtime estimator trained from past runs (see resourceEstimator)
+def resourceModelFilePath(target, stage, cohDay, freqDerivOrder):
+    filePath = setup.homeDir + 'condorFiles/{0}/{1}/{1}_{0}_TCoh{2}_O{3}_resourceModel.json'.format(stage, target.name, cohDay, freqDerivOrder)
+    return filePath
+
 # path for condor to submit another DAG
 def SubmitCondorSubFilePath(target, freq, stage):
     filePath = setup.homeDir + 'condorFiles/{0}/{1}/{2}/{3}.sub'.format(stage, target.name, freq, 'submit')
@@ -100,6 +146,16 @@ def outlierFilePath(target, freq, taskName, stage, cluster=False):
          filePath = setup.homeDir + 'results/{0}/{1}/{2}/{3}/Outliers/{4}_outlier_clustered.fts'.format(stage, target.name, setup.sftSource, freq, taskName)
     return filePath
 
+# manifest of the Weave output files ingested into the outlier file (see analysis/bandManifest.py)
+def outlierManifestFilePath(target, freq, taskName, stage):
+    filePath = setup.homeDir + 'results/{0}/{1}/{2}/{3}/Outliers/{4}_outlier_manifest.json'.format(stage, target.name, setup.sftSource, freq, taskName)
+    return filePath
+
+# journal of the local Weave jobs of a task, to resume an interrupted run (see analysis/runJournal.py)
+def runJournalFilePath(target, freq, taskName, stage):
+    filePath = setup.homeDir + 'results/{0}/{1}/{2}/{3}/Result/{4}_journal.jsonl'.format(stage, target.name, setup.sftSource, freq, taskName)
+    return filePath
+
 # file to save the outlier after analyzing the weave result file
 def outlierFromSaturatedFilePath(target, freq, taskName, stage):
     filePath = setup.homeDir + 'results/{0}/{1}/{2}/{3}/Outliers/{4}_LoudestOutlierFromSaturated.fts'.format(stage, target.name, setup.sftSource, freq, taskName)
@@ -119,6 +175,21 @@ def outlierInfoFilePath(target, freq, taskName, stage, cluster=False):
         filePath = setup.homeDir + 'results/{0}/{1}/{2}/{3}/Outliers/{4}_clustered_info.txt'.format(stage, target.name, setup.sftSource, freq, taskName)      
     return filePath 
 
+# file to save the number of outliers and saturated jobs of each sub-band over a frequency range (freq, outliers, saturated)
+def infoSummaryFilePath(target, fmin, fmax, stage):
+    filePath = setup.homeDir + 'results/{0}/{1}/{2}/Summary/{1}_{0}_{3}-{4}Hz_infoSummary.txt'.format(stage, target.name, setup.sftSource, fmin, fmax)
+    return filePath
+
+# file to save the list of non-saturated sub-bands chosen in a frequency range
+def nonSaturatedBandFilePath(target, fmin, fmax, nBands, stage):
+    filePath = setup.homeDir + 'results/{0}/{1}/{2}/Summary/{1}_{0}_{3}-{4}Hz_nonSaturatedBand_{5}.txt'.format(stage, target.name, setup.sftSource, fmin, fmax, nBands)
+    return filePath
+
+# file to save the list of saturated sub-bands in a frequency range
+def saturatedBandFilePath(target, fmin, fmax, nBands, stage):
+    filePath = setup.homeDir + 'results/{0}/{1}/{2}/Summary/{1}_{0}_{3}-{4}Hz_saturatedBand_{5}.txt'.format(stage, target.name, setup.sftSource, fmin, fmax, nBands)
+    return filePath
+
 def imageFilePath(OSDF=False):
     if OSDF:    
         filePath = 'osdf:///igwn/cit/staging/hoitim.cheung/images/'
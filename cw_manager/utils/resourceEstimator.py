@@ -0,0 +1,176 @@
+# Memory, runtime and disk estimator of Weave jobs, trained from the condor .out files of past runs
+import glob
+import json
+import math
+import os
+import numpy as np
+from pathlib import Path
+from . import filePath as fp
+from . import utils as utils
+from . import sftIndex as si
+from ..analysis import readFile as rf
+
+def collectSamples(target, cohDay, freqDerivOrder, stage, freqList):
+    """
+    Reads the template count, peak memory and runtime of every finished job of the given bands.
+
+    Parameters:
+    - target: module
+        The search target.
+
+    - cohDay: int
+        The number of coherent observation days.
+
+    - freqDerivOrder: int
+        The frequency derivative order used in the search.
+
+    - stage: str
+        The stage of the analysis.
+
+    - freqList: list of int
+        The 1Hz bands to read.
+
+    Returns:
+    - samples: numpy structured array
+        One row per job with the columns freq, nTemplates, memory [MB], runtime [s] and outputSize [bytes].
+    """
+    rows = []
+    for freq in freqList:
+        taskName = utils.taskName(target, stage, cohDay, freqDerivOrder, freq)
+        outPattern = fp.condorRecordFilePath(freq, target, taskName, stage)[0].replace('$(JobID)', '*')
+        for outFilePath in glob.glob(outPattern):
+            jobIndex = outFilePath.rsplit('.', 1)[-1]
+            if not jobIndex.isdigit():
+                continue
+            # the readers print the file name and return None for unfinished jobs
+            nTemp = rf.readTemplateCount(outFilePath)
+            memory = rf.readMemoryUsage(outFilePath)
+            runtime = rf.readRunTime(outFilePath)
+            if nTemp is None or memory is None or runtime is None:
+                continue
+            resultFile = fp.weaveOutputFilePath(target, freq, taskName, int(jobIndex), stage)
+            size = os.path.getsize(resultFile) if Path(resultFile).exists() else 0
+            rows.append((freq, nTemp, memory, runtime, size))
+    dtype = [('freq', 'f8'), ('nTemplates', 'f8'), ('memory', 'f8'), ('runtime', 'f8'), ('outputSize', 'f8')]
+    return np.array(rows, dtype=dtype)
+
+def _fitLogLinear(features, y):
+    # least squares of log(y) on [1, log(features)...]; returns the coefficients and the largest residual
+    A = np.column_stack([np.ones(len(y))] + [np.log(f) for f in features])
+    coeff = np.linalg.lstsq(A, np.log(y), rcond=None)[0]
+    residual = np.log(y) - A @ coeff
+    return coeff.tolist(), float(residual.max())
+
+class resourceEstimator():
+    """
+    Log-linear models of the Weave peak memory and runtime of a job as functions of its semicoherent template
+    count and band frequency, and of the template count of a job as a function of the band frequency (used when
+    the template count of a new band is not known yet). The predictions are raised by the largest residual of
+    the training jobs and by a safety margin, so every training job would have fitted in its request.
+
+    A trained estimator is saved per target, stage, cohDay and freqDerivOrder (see filePath.resourceModelFilePath)
+    and used by condorManager when request_memory is not given.
+    """
+    minSamples = 10
+
+    def __init__(self, margin=0.2):
+        """
+        Parameters:
+        - margin: float, optional (default=0.2)
+            Relative safety margin added to the predicted memory, runtime and disk.
+        """
+        self.margin = margin
+        self.model = None
+
+    def fit(self, samples):
+        """
+        Parameters:
+        - samples: numpy structured array
+            Training jobs, see collectSamples.
+        """
+        samples = samples[(samples['nTemplates'] > 0) & (samples['memory'] > 0) & (samples['runtime'] > 0)]
+        if len(samples) < self.minSamples:
+            raise ValueError('{0} finished jobs, at least {1} are needed to train the estimator'.format(len(samples), self.minSamples))
+        freq, nTemp = samples['freq'], samples['nTemplates']
+        # a single band gives no handle on the frequency dependence
+        features = [nTemp, freq] if np.ptp(freq) > 0 else [nTemp]
+        self.model = {'features': len(features),
+                      'memory': _fitLogLinear(features, samples['memory']),
+                      'runtime': _fitLogLinear(features, samples['runtime']),
+                      'nTemplates': _fitLogLinear([freq], nTemp) if np.ptp(freq) > 0 else ([float(np.log(nTemp).mean())], 0.0),
+                      'outputSize': float(samples['outputSize'].max()),
+                      'nSamples': len(samples)}
+        return self
+
+    def _predict(self, name, freq, nTemplates):
+        coeff, residual = self.model[name]
+        x = [1.0, math.log(nTemplates), math.log(freq)][:self.model['features']+1]
+        return math.exp(sum(c*v for c, v in zip(coeff, x)) + residual) * (1 + self.margin)
+
+    def templateCount(self, freq):
+        # typical template count of a job of the band, from the fit over the training bands
+        coeff, _ = self.model['nTemplates']
+        x = [1.0, math.log(freq)][:len(coeff)]
+        return math.exp(sum(c*v for c, v in zip(coeff, x)))
+
+    def predict(self, freq, nTemplates=None):
+        """
+        Returns the predicted peak memory [MB] and runtime [s] of a job, including the margin.
+
+        Parameters:
+        - freq: float
+            The band frequency.
+
+        - nTemplates: float, optional (default=None)
+            The semicoherent template count of the job. If None, the typical count of the band is used.
+        """
+        if nTemplates is None:
+            nTemplates = self.templateCount(freq)
+        return self._predict('memory', freq, nTemplates), self._predict('runtime', freq, nTemplates)
+
+    def requestMemory(self, freq, nTemplates=None):
+        # condor request_memory, rounded up to the next 0.5GB
+        memory, _ = self.predict(freq, nTemplates)
+        return '{0:g}GB'.format(math.ceil(memory / 1024 * 2) / 2)
+
+    def requestDisk(self, freq, obsDay, metricFile=None):
+        # condor request_disk: the SFTs of the band, the metric file and the largest Weave output seen
+        size = sum(si.defaultIndex.span(freq, obsDay, detector)[0] for detector in si.detectors)
+        if metricFile is not None and Path(metricFile).exists():
+            size += os.path.getsize(metricFile)
+        size = (size + self.model['outputSize']) * (1 + self.margin)
+        return '{0}GB'.format(max(1, math.ceil(size / 1024**3)))
+
+    def save(self, filePath):
+        Path(filePath).parent.mkdir(parents=True, exist_ok=True)
+        with open(filePath, 'w') as file:
+            json.dump({'margin': self.margin, 'model': self.model}, file, indent=1)
+
+    @classmethod
+    def load(cls, filePath):
+        # returns None if no estimator was trained
+        try:
+            with open(filePath) as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            return None
+        estimator = cls(margin=content['margin'])
+        estimator.model = content['model']
+        return estimator
+
+def train(target, cohDay, freqDerivOrder, stage, freqList, margin=0.2):
+    """
+    Trains the estimator on the finished jobs of the given bands and saves it for the DAG writers.
+
+    Returns:
+    - estimator: resourceEstimator
+    """
+    samples = collectSamples(target, cohDay, freqDerivOrder, stage, freqList)
+    estimator = resourceEstimator(margin).fit(samples)
+    filePath = fp.resourceModelFilePath(target, stage, cohDay, freqDerivOrder)
+    estimator.save(filePath)
+    print('Resource estimator trained on {0} jobs, saved to {1}'.format(len(samples), filePath))
+    return estimator
+
+def loadEstimator(target, cohDay, freqDerivOrder, stage):
+    return resourceEstimator.load(fp.resourceModelFilePath(target, stage, cohDay, freqDerivOrder))
@@ -0,0 +1,165 @@
+# Persistent index of the narrow-band SFT files, so the SFT list of a band is not globbed again for every DAG
+import json
+import os
+from pathlib import Path
+from . import filePath as fp
+
+detectors = ['H1', 'L1']
+
+def sftSpan(name):
+    # GPS start and duration from the SFT naming convention (...-<GPS start>-<duration>.sft), None if not found
+    try:
+        start, span = Path(name).stem.split('-')[-2:]
+        return int(start), int(span)
+    except ValueError:
+        return None, None
+
+def scanDir(sftDir):
+    """
+    Returns the SFT files of a directory and the directory mtime, or None if the directory does not exist.
+
+    Returns:
+    - entry: dict
+        {'dir': str, 'mtime': float, 'files': list of [name, size, GPS start, duration]}, files sorted by name.
+    """
+    try:
+        mtime = os.stat(sftDir).st_mtime
+        files = []
+        with os.scandir(sftDir) as it:
+            for f in it:
+                if f.name.endswith('.sft') and f.is_file():
+                    files.append([f.name, f.stat().st_size, *sftSpan(f.name)])
+    except FileNotFoundError:
+        return None
+    files.sort()
+    return {'dir': str(sftDir), 'mtime': mtime, 'files': files}
+
+class sftIndex():
+    """
+    Index of the SFT files of each (obsDay, freq, detector), built with one walk of the SFT tree of an obsDay
+    and kept in a JSON file (see filePath.sftIndexFilePath). Each band records the file names, sizes and GPS
+    spans and the mtime of its directory; a band whose directory mtime changed is scanned again on access.
+
+    The local SFT directory is indexed when it exists, otherwise the OSDF one. osdf:// URLs are returned from
+    the file names of either; local paths only for a band indexed from its local directory.
+    """
+    def __init__(self):
+        self.bands = {}
+        self.loaded = set()
+
+    def _key(self, obsDay, freq, detector):
+        return '{0}/{1}/{2}'.format(obsDay, int(freq), detector)
+
+    def _sourceDir(self, obsDay, freq, detector):
+        localDir = fp.sftFilePath(obsDay, freq, detector=detector, OSDF=False)
+        if Path(localDir).is_dir():
+            return localDir
+        return fp.sftFilePath(obsDay, freq, detector=detector, OSDF=True)
+
+    def load(self, obsDay):
+        # the index file of an obsDay is read once per process, or built if it does not exist
+        if obsDay in self.loaded:
+            return
+        self.loaded.add(obsDay)
+        indexFilePath = fp.sftIndexFilePath(obsDay)
+        try:
+            with open(indexFilePath) as file:
+                self.bands.update(json.load(file))
+        except (OSError, ValueError):
+            self.build(obsDay)
+
+    def build(self, obsDay):
+        """
+        Indexes every band of an obsDay with a single walk of the SFT tree and saves the index.
+        """
+        bands = {}
+        for detector in detectors:
+            # local bands first, the OSDF copy is only indexed for bands missing locally
+            for OSDF in (False, True):
+                # the root of the tree is the parent of the band directories
+                root = Path(fp.sftFilePath(obsDay, 0, detector=detector, OSDF=OSDF)).parent
+                if not root.is_dir():
+                    continue
+                with os.scandir(root) as it:
+                    for d in it:
+                        key = self._key(obsDay, d.name, detector) if d.name.isdigit() else None
+                        if key is None or key in bands or not d.is_dir():
+                            continue
+                        entry = scanDir(fp.sftFilePath(obsDay, d.name, detector=detector, OSDF=OSDF))
+                        if entry is not None:
+                            bands[key] = entry
+        prefix = '{0}/'.format(obsDay)
+        self.bands = {k: v for k, v in self.bands.items() if not k.startswith(prefix)}
+        self.bands.update(bands)
+        self.loaded.add(obsDay)
+        self.save(obsDay)
+        print('SFT index of {0} days: {1} band directories'.format(obsDay, len(bands)))
+
+    def save(self, obsDay):
+        # written to a temporary file and renamed, so a concurrent reader never sees a truncated index
+        indexFilePath = fp.sftIndexFilePath(obsDay)
+        Path(indexFilePath).parent.mkdir(parents=True, exist_ok=True)
+        prefix = '{0}/'.format(obsDay)
+        content = {k: v for k, v in self.bands.items() if k.startswith(prefix)}
+        tmpFilePath = '{0}.{1}.tmp'.format(indexFilePath, os.getpid())
+        with open(tmpFilePath, 'w') as file:
+            json.dump(content, file)
+        os.replace(tmpFilePath, indexFilePath)
+
+    def entry(self, obsDay, freq, detector):
+        """
+        Returns the index entry of a band (see scanDir), scanning its directory again if it changed.
+        """
+        self.load(obsDay)
+        key = self._key(obsDay, freq, detector)
+        entry = self.bands.get(key)
+        sourceDir = self._sourceDir(obsDay, freq, detector)
+        # a band indexed from OSDF is indexed again once its local directory exists
+        if entry is not None and entry['dir'] == sourceDir:
+            try:
+                if os.stat(entry['dir']).st_mtime == entry['mtime']:
+                    return entry
+            except FileNotFoundError:
+                pass
+        entry = scanDir(sourceDir)
+        if entry is None:
+            entry = {'dir': None, 'mtime': None, 'files': []}
+            self.bands.pop(key, None)
+        else:
+            self.bands[key] = entry
+            self.save(obsDay)
+        return entry
+
+    def files(self, freq, obsDay, OSDF=False):
+        """
+        Returns the SFT files of a band, H1 then L1, as local paths or as osdf:// URLs (same as utils.sftEnsemble).
+        """
+        lst = []
+        for detector in detectors:
+            entry = self.entry(obsDay, freq, detector)
+            names = [f[0] for f in entry['files']]
+            if not OSDF:
+                # a band only found in the OSDF tree has no local files (as the glob of the local directory)
+                sftDir = fp.sftFilePath(obsDay, freq, detector=detector, OSDF=False)
+                if entry['dir'] == str(sftDir):
+                    lst += [str(Path(sftDir) / name) for name in names]
+            else:
+                # '/osdf/...' mount path to 'osdf:///...' URL
+                sftDir = fp.sftFilePath(obsDay, freq, detector=detector, OSDF=True)
+                lst += ['osdf://' + str(Path(sftDir) / name)[5:] for name in names]
+        return lst
+
+    def span(self, freq, obsDay, detector):
+        # total size (bytes) and GPS span (first start, last end) of the SFTs of a band
+        files = self.entry(obsDay, freq, detector)['files']
+        size = sum(f[1] for f in files)
+        starts = [f[2] for f in files if f[2] is not None]
+        ends = [f[2] + f[3] for f in files if f[2] is not None]
+        return size, (min(starts), max(ends)) if starts else (None, None)
+
+    def clear(self):
+        self.bands = {}
+        self.loaded = set()
+
+# shared index used by utils.sftEnsemble
+defaultIndex = sftIndex()
@@ -0,0 +1,127 @@
+# Cached template spacing of Weave output files, read from the raw primary header cards only
+import numpy as np
+from pathlib import Path
+from astropy.io import fits
+from . import filePath as fp
+from . import utils as utils
+
+blockSize = 2880 # size of a FITS header block
+cardSize = 80    # size of a FITS header card
+
+def readHeaderCards(filePath, keywords):
+    """
+    Reads the requested keywords from the primary header of a FITS file without building the HDU.
+
+    Parameters:
+    - filePath: str
+        Path to the FITS file.
+
+    - keywords: list of str
+        Keywords to read, e.g. 'NSEMITMPL NU0DOT' or 'PROGARG FREQ' (HIERARCH keywords without the prefix).
+
+    Returns:
+    - cards: dict
+        Value of each requested keyword found in the header.
+    """
+    keywords = set(k.upper() for k in keywords)
+    cards = {}
+    with open(filePath, 'rb') as file:
+        while True:
+            block = file.read(blockSize)
+            if len(block) < blockSize:
+                break
+            for i in range(0, blockSize, cardSize):
+                image = block[i:i+cardSize].decode('ascii', errors='replace')
+                if image[:8] == 'END     ':
+                    return cards
+                # cheap check on the raw image before astropy parses the card
+                name = image.split('=', 1)[0].strip()
+                if name.startswith('HIERARCH '):
+                    name = name[9:].strip()
+                if name.upper() in keywords:
+                    card = fits.Card.fromstring(image)
+                    cards[card.keyword.upper()] = card.value
+    return cards
+
+def spacingKeywords(freqDerivOrder):
+    freqParamName, _ = utils.phaseParamName(freqDerivOrder)
+    keywords = ['NSEMITMPL NU{0}DOT'.format(i) for i in range(len(freqParamName))]
+    keywords += ['PROGARG {0}'.format(name).upper() for name in freqParamName]
+    return keywords
+
+def getSpacingFast(dataFilePath, freqDerivOrder):
+    # same result as utils.getSpacing, reading only the needed header cards
+    cards = readHeaderCards(dataFilePath, spacingKeywords(freqDerivOrder))
+    return utils.spacingFromHeader(cards, freqDerivOrder)
+
+class spacingCache():
+    def __init__(self):
+        self.cache = {}
+
+    def _key(self, target, stage, cohDay, freqDerivOrder, freq, jobIndex):
+        return (target.name, stage, cohDay, freqDerivOrder, freq, jobIndex)
+
+    def get(self, target, stage, cohDay, freqDerivOrder, freq, jobIndex, workInLocalDir=False):
+        """
+        Returns the spacing dict of one job, reading its header only on the first call.
+
+        Parameters:
+        - target: module
+            The search target.
+
+        - stage: str
+            The stage of the analysis (e.g. 'search').
+
+        - cohDay: int
+            The number of coherent observation days.
+
+        - freqDerivOrder: int
+            The frequency derivative order used in the search.
+
+        - freq: int
+            The 1Hz band.
+
+        - jobIndex: int
+            Index of the job within the band (starting from 1).
+
+        - workInLocalDir: bool, optional (default=False)
+            If True, read the Weave output file from the local directory.
+        """
+        key = self._key(target, stage, cohDay, freqDerivOrder, freq, jobIndex)
+        if key not in self.cache:
+            taskName = utils.taskName(target, stage, cohDay, freqDerivOrder, freq)
+            dataFilePath = fp.weaveOutputFilePath(target, freq, taskName, jobIndex, stage)
+            if workInLocalDir:
+                dataFilePath = Path(dataFilePath).name
+            self.cache[key] = getSpacingFast(dataFilePath, freqDerivOrder)
+        return self.cache[key]
+
+    def getBand(self, target, stage, cohDay, freqDerivOrder, freq, nJobs, workInLocalDir=False):
+        """
+        Returns the spacing of all jobs in a 1Hz band as a structured array.
+
+        Parameters:
+        - nJobs: int or list of int
+            Number of jobs in the band (jobs 1..nJobs), or an explicit list of job indices.
+
+        The other parameters are the same as in get().
+
+        Returns:
+        - spacing: numpy structured array
+            One row per job with the column 'jobIndex' and one column per spacing parameter (df, df1dot, ...).
+        """
+        jobIndexList = range(1, nJobs+1) if np.isscalar(nJobs) else nJobs
+        _, dfn = utils.phaseParamName(freqDerivOrder)
+        spacing = np.zeros(len(jobIndexList), dtype=[('jobIndex', '>i8')] + [(key, '>f8') for key in dfn])
+        for i, jobIndex in enumerate(jobIndexList):
+            _spacing = self.get(target, stage, cohDay, freqDerivOrder, freq, jobIndex, workInLocalDir)
+            spacing[i]['jobIndex'] = jobIndex
+            for key in dfn:
+                spacing[i][key] = _spacing[key]
+        return spacing
+
+    def clear(self):
+        self.cache = {}
+
+# shared cache used by the analysis code
+defaultCache = spacingCache()
@@ -4,9 +4,11 @@ from . import setup_parameter as setup
 from pathlib import Path
 from . import filePath as fp
 from astropy.io import fits
+from . import clusterEngine as ce
+from . import sftIndex as si
 
 # Clusters outliers based on spatial proximity in phase parameter space, guided by loudness
-def clustering(data, freqDerivOrder):
+def clustering(data, freqDerivOrder, returnLabels=False):
     """
     Parameters:
     - data: astropy Table
@@ -15,6 +17,9 @@ def clustering(data, freqDerivOrder):
 
     - freqDerivOrder: int
         Frequency derivative order, which defines the number of phase parameters and the dimensionality of the clustering space.
+
+    - returnLabels: bool, optional (default=False)
+        If True, also return the index of the cluster centre of each outlier.
     """
     # Extract phase parameter names and spacing names according to the frequency derivative order
     fn, dfn = phaseParamName(freqDerivOrder)
@@ -27,51 +32,12 @@ def clustering(data, freqDerivOrder):
     # Retrieve loudness values to sort by intensity
     loudness = data['mean2F']
 
-    # Sort data by loudness in descending order, ensuring clusters start from the loudest point
-    sorted_indices = np.argsort(-loudness)
-    sorted_coords = _data[sorted_indices]
-    sorted_loudness = loudness[sorted_indices]
-    sorted_spacing = _spacing[sorted_indices]
-
-    # Initialize list for keeping track of loudest samples and their respective spheres
-    centers_idx = []
-    cluster_size = []
-    cluster_member = []
-    # Set to keep track of processed indices
-    processed_indices = set()
-
-    # Loop over sorted samples (from loudest to least loud)
-    for i, (center, gridsize) in enumerate(zip(sorted_coords, sorted_spacing)):
-        if sorted_indices[i] in processed_indices:
-            continue  # Skip already processed samples
-
-        # Initialize list for dimension-wise indices
-        within_dim_indices = []
-
-        # Compute distances in each dimension separately and find indices within radius r0
-        for dim in range(freqDerivOrder+1):
-            r0 = setup.cluster_nSpacing * gridsize[dim]
-            distances_dim = np.abs(_data[:, dim] - center[dim])
-            within_dim = np.where(distances_dim <= r0)[0]
-            within_dim_indices.append(within_dim)
-
-        # Combine the conditions (intersection of all dimensions)
-        within_r0_indices = within_dim_indices[0]
-        for dim_indices in within_dim_indices[1:]:
-            within_r0_indices = np.intersect1d(within_r0_indices, dim_indices)
-
-        processed_indices.update(within_r0_indices)  # Mark all samples within this sphere as processed
-        centers_idx.append(sorted_indices[i])
-        cluster_size.append(len(within_r0_indices))
-        cluster_member.append(within_r0_indices)
-
-    # Convert lists to arrays
-    centers_idx = np.array(centers_idx)
-    cluster_size = np.array(cluster_size)
+    # Greedy clustering from the loudest outlier, with a KD-tree instead of a scan of all outliers per centre
+    result = ce.clusterOutliers(_data, _spacing, loudness, setup.cluster_nSpacing, returnLabels=returnLabels)
 
     # Display the number of clusters formed
-    print('{} outliers are grouped to {} clusters.'.format(data.size, centers_idx.size))
-    return centers_idx, cluster_size, cluster_member
+    print('{} outliers are grouped to {} clusters.'.format(data.size, result[0].size))
+    return result
 
 def getBinTable(target, freq, cohDay, freqDerivOrder, stage, extname, cluster, workInLocalDir):
     _taskName = taskName(target, stage, cohDay, freqDerivOrder, freq)
@@ -91,13 +57,8 @@ def getHeader(target, freq, cohDay, freqDerivOrder, stage, cluster, workInLocalD
 
 
 def sftEnsemble(freq, obsDay, OSDF=False):
-    H1path = Path(fp.sftFilePath(obsDay, freq, detector='H1', OSDF=OSDF))
-    L1path = Path(fp.sftFilePath(obsDay, freq, detector='L1', OSDF=OSDF))
-    if not OSDF:
-        lst = [str(s) for s in H1path.glob("*.sft")] + [str(s) for s in L1path.glob("*.sft")]
-    else:
-        lst = ['osdf://'+str(s)[5:] for s in H1path.glob("*.sft")] + ['osdf://'+str(s)[5:] for s in L1path.glob("*.sft")]     
-    return lst
+    # SFT files of a band from the persistent SFT index, the directories are only scanned when they changed
+    return si.defaultIndex.files(freq, obsDay, OSDF=OSDF)
 
 def makeDir(filenames):
     for name in filenames:
@@ -118,12 +79,17 @@ def injParamName():
     #return ["Alpha", "Delta", "refTime", "h0", "cosi", "psi", "Freq"]
     return ["Alpha", "Delta", "refTime", "aPlus", "aCross", "psi", "Freq"]
 
-def memoryUsage(self, stage):
+# default request_memory of a Weave job, when no resource estimator was trained (see resourceEstimator)
+def memoryUsage(target, stage):
     if 'search' in stage:
-        memory = '10GB'
-                
+        if '1987' in target.name:
+            memory = '20GB'
+        else:
+            memory = '15GB'
     elif 'follow' in stage:
         memory = '2GB'
+    else:
+        memory = '15GB'
     return memory
     
     
@@ -132,6 +98,10 @@ def getSpacing(dataFilePath, freqDerivOrder):
     file = fits.open(dataFilePath)
     metaData = file[0].header
     file.close()
+    return spacingFromHeader(metaData, freqDerivOrder)
+
+# parse the template spacing from the primary header of a Weave output file
+def spacingFromHeader(metaData, freqDerivOrder):
     freqParamName, freqBandWidthName = phaseParamName(freqDerivOrder)
     n = len(freqParamName)
 
@@ -163,7 +133,7 @@ def genh0Points(i, h0, nInj, nAmp):
         injPerPoint = int (nInj/nAmp)
         factor = [0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9] # Vela v1 and G347 (new)
         #factor = [0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8] # (new2)
-        return h0 * np.array([factor[int(ii/injPerPoint)] for ii in i] )
+        return h0 * np.array(factor)[i // injPerPoint]
     else:
         return h0
 
@@ -7,6 +7,11 @@ setup(
     install_requires=[
     "numpy", "astropy", "pathlib", "tqdm", "scipy", "pyfstat" 
     ],
+    entry_points={
+        'console_scripts': [
+            'cw_writeSearchResultRange=cw_manager.analysis.bandDriver:main',
+        ],
+    },
     author='Damon Cheung',
     author_email='damoncht@umich.edu',
     description='A package to manage: to create condor jobs and analysis the data for directed search of continuous gravitational wave signalsr',